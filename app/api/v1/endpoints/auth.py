@@ -1,25 +1,38 @@
 # app/api/v1/endpoints/auth.py
-from fastapi import APIRouter, Depends, HTTPException, status, Depends
+from fastapi import APIRouter, Depends, HTTPException, status, Depends, File, Query, Request, UploadFile
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import OAuth2PasswordRequestForm
-from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
 from datetime import timedelta
+from typing import List, Optional
+import anyio
+import asyncio
+import orjson
+import time
 
-from app.db.database import get_db
+from app.db.database import AsyncSessionLocal, SessionLocal, get_async_db
 from app.crud import user as crud_user
+from app.crud import user_import
+from app.crud import refresh_token as crud_refresh_token
 from app.api.v1 import schemas
 from app.core import security
 from app.core.config import settings
+from app.core.rate_limit import check_login_rate_limit, record_login_failure
 
 from app.core.security import get_current_user
-from app.db import models
+from app.db.models import UserRole
 
-# Importar el cliente de notificaciones
-from notification_client import send_welcome_email_async
+# Despachador del outbox de notificaciones de bienvenida
+from app.notifications.outbox import outbox_dispatcher
 
 router = APIRouter()  # ✅ solo una vez
 
+# Todos los endpoints son `async def` y usan una AsyncSession: no ocupan hilos del
+# threadpool de Starlette mientras esperan a la base de datos, y bcrypt se ejecuta
+# en el pool dedicado de hashing (app/core/hashing.py).
 @router.post("/register", response_model=schemas.UserOut)
-def register_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
+async def register_user(user_in: schemas.UserCreate, db: AsyncSession = Depends(get_async_db)):
     # Validar que el correo tenga el dominio @unal.edu.co
     if not user_in.email.lower().endswith("@unal.edu.co"):
         raise HTTPException(
@@ -27,62 +40,192 @@ def register_user(user_in: schemas.UserCreate, db: Session = Depends(get_db)):
             detail="Solo se permiten correos con dominio @unal.edu.co"
         )
 
-    db_user = crud_user.get_user_by_email(db, email=user_in.email)
+    db_user = await crud_user.get_user_by_email_async(db, email=user_in.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Crear el usuario en la base de datos
-    new_user = crud_user.create_user(db=db, user=user_in)
+    new_user = await crud_user.create_user_async(db=db, user=user_in)
     
     # Verificar que el usuario se creó correctamente
     if not new_user:
         raise HTTPException(status_code=500, detail="Failed to create user")
     
-    # Enviar notificación de bienvenida de forma asíncrona
-    try:
-        send_welcome_email_async(
-            user_id=new_user.id,  # Pasar el ID real del usuario
-            user_name=new_user.name,
-            user_email=new_user.email,
-            user_role=new_user.role  # Pasar el rol del usuario
-        )
-        print(f"✅ Notificación de bienvenida enviada para usuario ID {new_user.id}: {new_user.email}")
-    except Exception as e:
-        print(f"⚠️ Error enviando notificación de bienvenida: {e}")
-        # No fallar el registro si la notificación falla
+    # La notificación de bienvenida quedó en el outbox con el usuario; se avisa al
+    # despachador para que la envíe sin esperar al siguiente sondeo
+    outbox_dispatcher.wake()
     
     return new_user
 
+def _token_response(user, refresh_token: str) -> dict:
+    access_token = security.create_access_token(
+        data={
+            "sub": user.email,
+            "role": user.role,
+            "uid": user.id,
+            "ver": security.token_version(user.credential_version, user.role),
+        },
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+    )
+    return {"access_token": access_token, "token_type": "bearer", "refresh_token": refresh_token}
+
 @router.post("/login", response_model=schemas.Token)
-def login_for_access_token(db: Session = Depends(get_db), form_data: OAuth2PasswordRequestForm = Depends()):
-    user = crud_user.authenticate_user(db, email=form_data.username, password=form_data.password)
+async def login_for_access_token(request: Request, db: AsyncSession = Depends(get_async_db), form_data: OAuth2PasswordRequestForm = Depends()):
+    # Se rechaza antes de buscar al usuario o verificar la contraseña: un intento bloqueado no cuesta un bcrypt
+    client_ip = request.client.host if request.client else None
+    retry_after = await check_login_rate_limit(client_ip, form_data.username)
+    if retry_after:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Demasiados intentos de inicio de sesión, intente más tarde",
+            headers={"Retry-After": str(int(retry_after))},
+        )
+    user = await crud_user.authenticate_user_async(db, email=form_data.username, password=form_data.password)
     if not user:
+        # Solo los fallos gastan cupo: los logins correctos detrás de una misma IP no se bloquean entre sí
+        await record_login_failure(client_ip, form_data.username)
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Incorrect email or password",
             headers={"WWW-Authenticate": "Bearer"},
         )
-    access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-    access_token = security.create_access_token(
-        data={"sub": user.email, "role": user.role}, expires_delta=access_token_expires
+    refresh_token = await crud_refresh_token.create_refresh_token_async(db, user)
+    return _token_response(user, refresh_token)
+
+# Renueva la sesión sin contraseña ni bcrypt: canjea el token de refresco por un par nuevo
+@router.post("/refresh", response_model=schemas.Token)
+async def refresh_access_token(body: schemas.RefreshRequest, db: AsyncSession = Depends(get_async_db)):
+    rotated = await crud_refresh_token.rotate_refresh_token_async(db, body.refresh_token)
+    if rotated is None:
+        raise HTTPException(
+            status_code=status.HTTP_401_UNAUTHORIZED,
+            detail="Token de refresco inválido o expirado",
+            headers={"WWW-Authenticate": "Bearer"},
+        )
+    user, refresh_token = rotated
+    return _token_response(user, refresh_token)
+
+# Validación de tokens de usuario para otros servicios (gateways): un lote por petición.
+# No requiere autenticación propia: solo devuelve claims que ya lleva el token a quien lo
+# presenta, comprobando además firma, expiración, revocación y versión de credenciales.
+@router.post("/introspect", response_model=schemas.IntrospectResponse, response_model_exclude_none=True)
+async def introspect(body: schemas.IntrospectRequest, db: AsyncSession = Depends(get_async_db)):
+    if len(body.tokens) > settings.INTROSPECT_MAX_TOKENS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Como máximo {settings.INTROSPECT_MAX_TOKENS} tokens por petición"
+        )
+
+    now = time.time()
+    ttl = settings.INTROSPECT_RESULT_TTL
+    results = []
+    for result in await security.introspect_tokens(db, body.tokens):
+        if result is None:
+            results.append({"active": False})
+            continue
+        payload, principal = result
+        exp = payload.get("exp")
+        if isinstance(exp, (int, float)):
+            ttl = min(ttl, int(exp - now))
+        results.append({
+            "active": True, "sub": principal.email, "uid": principal.id, "role": principal.role, "exp": exp,
+        })
+    ttl = max(ttl, 0)
+    # Un token activo deja de serlo al expirar: la respuesta no se reutiliza más allá del primer `exp`
+    return ORJSONResponse(
+        {"results": results, "ttl": ttl},
+        headers={"Cache-Control": f"private, max-age={ttl}"},
     )
-    return {"access_token": access_token, "token_type": "bearer"}
 
-@router.get("/users/")
-def get_all_users(
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)  # Aquí se protege
+# /users/ y /user usan la ruta de lectura proyectada de app/crud/user.py: filas con
+# solo las columnas de UserOut serializadas directamente a JSON con orjson, sin
+# instanciar modelos ORM ni validar con pydantic. `response_model` se mantiene
+# para documentar la respuesta en OpenAPI.
+_NDJSON_CHUNK_ROWS = 500
+
+async def _users_ndjson(after_id: Optional[int], role: Optional[str]):
+    # La sesión se abre dentro del generador: las dependencias con yield se cierran
+    # antes de que termine de enviarse una StreamingResponse
+    async with AsyncSessionLocal() as db:
+        chunk = []
+        async for user in crud_user.stream_users_async(db, after_id=after_id, role=role):
+            chunk.append(orjson.dumps(user))
+            if len(chunk) == _NDJSON_CHUNK_ROWS:
+                yield b"\n".join(chunk) + b"\n"
+                chunk = []
+        if chunk:
+            yield b"\n".join(chunk) + b"\n"
+
+@router.get("/users/", response_model=List[schemas.UserOut])
+async def get_all_users(
+    after_id: Optional[int] = Query(None, description="Cursor: devuelve usuarios con id mayor a este valor"),
+    limit: int = Query(100, ge=1, le=1000),
+    role: Optional[UserRole] = None,
+    format: str = Query("json", pattern="^(json|ndjson)$", description="ndjson transmite todos los usuarios fila a fila"),
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.Principal = Depends(get_current_user)  # Aquí se protege
 ):
-    return crud_user.get_all_users(db)
+    role_value = role.value if role else None
+    if format == "ndjson":
+        return StreamingResponse(_users_ndjson(after_id, role_value), media_type="application/x-ndjson")
+
+    # Se pide una fila de más para saber si existe una página siguiente
+    users = await crud_user.get_users_page_async(db, after_id=after_id, limit=limit + 1, role=role_value)
+    headers = {}
+    if len(users) > limit:
+        users = users[:limit]
+        headers["X-Next-Cursor"] = str(users[-1]["id"])
+    return ORJSONResponse(users, headers=headers)
 
 @router.get("/user", response_model=schemas.UserOut)
-def get_user_by_email(
+async def get_user_by_email(
     email: str,
-    db: Session = Depends(get_db),
-    current_user: models.User = Depends(get_current_user)  # Protección con token
+    db: AsyncSession = Depends(get_async_db),
+    current_user: schemas.Principal = Depends(get_current_user)  # Protección con token
 ):
-    db_user = crud_user.get_user_by_email(db, email=email)
+    db_user = await crud_user.get_user_out_by_email_async(db, email=email)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
     
-    return db_user
+    return ORJSONResponse(db_user)
+
+# Importaciones en curso en este worker: cada una ocupa un hilo del threadpool y parte del pool de hashing
+_import_slots = asyncio.Semaphore(settings.USER_IMPORT_MAX_CONCURRENT)
+
+def _hash_in_shared_pool(passwords: List[str]) -> List[str]:
+    # Desde el hilo de la importación: el hash se hace en el pool de hashing de la API
+    return anyio.from_thread.run(user_import.hash_passwords_async, passwords)
+
+def _run_import(content: str, fmt: str) -> schemas.ImportReport:
+    # La importación usa el motor síncrono: COPY necesita la conexión de psycopg2
+    db = SessionLocal()
+    try:
+        return user_import.import_users(
+            db, user_import.parse_rows(content, fmt), hash_passwords=_hash_in_shared_pool
+        )
+    finally:
+        db.close()
+
+@router.post("/users/import", response_model=schemas.ImportReport)
+async def import_users(
+    file: UploadFile = File(..., description="CSV (name,email,password,role) o NDJSON"),
+    format: Optional[str] = Query(None, pattern="^(csv|ndjson)$", description="Por defecto se deduce de la extensión"),
+    current_user: schemas.Principal = Depends(get_current_user)
+):
+    """
+    Importación masiva de usuarios (solo administradores).
+    Para decenas de miles de usuarios es preferible el script `import_users.py`.
+    """
+    if current_user.role != UserRole.administrador.value:
+        raise HTTPException(status_code=403, detail="Solo los administradores pueden importar usuarios")
+
+    if _import_slots.locked():
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+            detail="Ya hay una importación en curso, intente más tarde",
+            headers={"Retry-After": "10"},
+        )
+    async with _import_slots:
+        fmt = format or ("ndjson" if (file.filename or "").endswith((".ndjson", ".jsonl")) else "csv")
+        content = (await file.read()).decode("utf-8-sig")
+        return await run_in_threadpool(_run_import, content, fmt)
@@ -0,0 +1,22 @@
+# app/api/v1/endpoints/well_known.py
+from fastapi import APIRouter, Request, Response
+
+from app.core.config import settings
+from app.core.keys import key_ring
+
+router = APIRouter()
+
+
+# Claves públicas para que otros servicios verifiquen los tokens sin compartir secretos.
+# El documento está precalculado en el anillo de claves; con ETag los consumidores
+# revalidan con un 304 sin cuerpo.
+@router.get("/.well-known/jwks.json", include_in_schema=False)
+async def jwks(request: Request):
+    body, etag = key_ring.jwks()
+    headers = {
+        "Cache-Control": f"public, max-age={settings.JWKS_MAX_AGE}, stale-while-revalidate=60",
+        "ETag": etag,
+    }
+    if request.headers.get("if-none-match") == etag:
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
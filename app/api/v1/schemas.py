@@ -1,6 +1,6 @@
 # app/api/v1/schemas.py
 from pydantic import BaseModel, EmailStr
-from typing import Optional
+from typing import List, Optional
 from app.db.models import UserRole
 
 # Schema para la creación de un usuario
@@ -24,6 +24,46 @@ class UserOut(BaseModel):
 class Token(BaseModel):
     access_token: str
     token_type: str
+    refresh_token: Optional[str] = None
+
+class RefreshRequest(BaseModel):
+    refresh_token: str
 
 class TokenData(BaseModel):
-    email: Optional[EmailStr] = None
\ No newline at end of file
+    email: Optional[EmailStr] = None
+
+# Identidad autenticada que devuelve `get_current_user` (sin consultar la contraseña)
+class Principal(BaseModel):
+    id: int
+    email: str
+    role: str
+    token_version: str
+
+# Schemas para la introspección de tokens por lotes
+class IntrospectRequest(BaseModel):
+    tokens: List[str]
+
+class IntrospectResult(BaseModel):
+    active: bool
+    sub: Optional[str] = None
+    uid: Optional[int] = None
+    role: Optional[str] = None
+    exp: Optional[int] = None
+
+class IntrospectResponse(BaseModel):
+    results: List[IntrospectResult]
+    ttl: int  # Segundos durante los que se pueden reutilizar los resultados
+
+# Schemas para la importación masiva de usuarios
+class ImportRowError(BaseModel):
+    row: int
+    email: Optional[str] = None
+    error: str
+
+class ImportReport(BaseModel):
+    total: int
+    created: int
+    failed: int
+    errors: List[ImportRowError]
+    elapsed_seconds: float
+    users_per_sec: float
@@ -0,0 +1,57 @@
+# app/core/bloom.py
+"""
+Filtro de Bloom: conjunto probabilístico compacto.
+
+`might_contain` nunca da falsos negativos (si un elemento se añadió, siempre
+devuelve True) y da falsos positivos con probabilidad ~`fp_rate` mientras no se
+supere la capacidad. Con un 1 % de falsos positivos ocupa ~1.2 bytes por elemento.
+"""
+import hashlib
+import math
+
+
+class BloomFilter:
+    """
+    Vector de bits con `k` posiciones por elemento, derivadas por doble hashing
+    de un único digest BLAKE2b de 128 bits.
+    """
+
+    __slots__ = ("capacity", "fp_rate", "size", "hashes", "count", "_bits")
+
+    def __init__(self, capacity: int, fp_rate: float = 0.01):
+        self.capacity = max(1, capacity)
+        self.fp_rate = fp_rate
+        self.size = max(8, int(math.ceil(-self.capacity * math.log(fp_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, round(self.size / self.capacity * math.log(2)))
+        self.count = 0
+        self._bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str):
+        digest = hashlib.blake2b(item.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return [(h1 + i * h2) % self.size for i in range(self.hashes)]
+
+    def add(self, item: str) -> None:
+        bits = self._bits
+        for position in self._positions(item):
+            bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def might_contain(self, item: str) -> bool:
+        bits = self._bits
+        for position in self._positions(item):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    __contains__ = might_contain
+
+    @property
+    def full(self) -> bool:
+        """True cuando se superó la capacidad y la tasa de falsos positivos empieza a crecer."""
+        return self.count > self.capacity
+
+    @property
+    def nbytes(self) -> int:
+        return len(self._bits)
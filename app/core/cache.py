@@ -0,0 +1,493 @@
+# app/core/cache.py
+"""
+Cachés del servicio.
+
+`TTLCache` es la caché en memoria del proceso (L1) con expiración por entrada
+y desalojo LRU. Opcionalmente se respalda en un `CacheBackend` compartido (L2)
+entre los workers de gunicorn, que además difunde las invalidaciones por
+pub/sub para que todas las L1 se mantengan coherentes.
+"""
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from app.core.config import settings
+from app.metrics.prometheus import CACHE_BACKEND_ERRORS, CACHE_EVICTIONS, CACHE_HITS, CACHE_MISSES
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+InvalidationCallback = Callable[[str, str], None]
+
+# Nombre de caché de la invalidación que se entrega al volver a escuchar el canal
+# tras un corte: las invalidaciones publicadas mientras tanto se perdieron, así
+# que cada suscriptor descarta todo lo que tenga en memoria.
+ALL_CACHES = "*"
+
+
+class CacheBackend:
+    """
+    Interfaz del almacén compartido entre workers.
+
+    Esta implementación base es el backend por defecto, solo en memoria: no
+    guarda nada fuera de la L1 de cada caché y entrega las invalidaciones a los
+    suscriptores del mismo proceso.
+    """
+
+    def __init__(self):
+        self._subscribers: List[InvalidationCallback] = []
+
+    def get(self, key: str) -> Optional[bytes]:
+        return None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        pass
+
+    def delete(self, key: str) -> None:
+        pass
+
+    async def get_async(self, key: str) -> Optional[bytes]:
+        return self.get(key)
+
+    async def set_async(self, key: str, value: str, ttl: float) -> None:
+        self.set(key, value, ttl)
+
+    async def delete_async(self, key: str) -> None:
+        self.delete(key)
+
+    async def incr_async(self, key: str, previous_key: str, ttl: float) -> Optional[Tuple[int, int]]:
+        """
+        Incrementa el contador `key` (que expira a los `ttl` segundos) y devuelve
+        (nuevo valor, valor de `previous_key`). None si no hay almacén compartido.
+        Lo usan los limitadores de ventana deslizante de app/core/rate_limit.py.
+        """
+        return None
+
+    async def counts_async(self, key: str, previous_key: str) -> Optional[Tuple[int, int]]:
+        """Como `incr_async`, pero solo lee los dos contadores."""
+        return None
+
+    def publish_invalidation(self, cache_name: str, key: str) -> None:
+        self._dispatch(cache_name, key)
+
+    async def publish_invalidation_async(self, cache_name: str, key: str) -> None:
+        self.publish_invalidation(cache_name, key)
+
+    def subscribe(self, callback: InvalidationCallback) -> None:
+        """
+        Registra `callback(cache_name, key)` para cada invalidación recibida.
+        No abre conexiones: las invalidaciones de otros procesos llegan después de `start()`.
+        """
+        self._subscribers.append(callback)
+
+    def start(self) -> None:
+        """Empieza a escuchar las invalidaciones de otros procesos (lo llama el lifespan)."""
+        pass
+
+    @property
+    def listening(self) -> bool:
+        """True mientras llegan las invalidaciones publicadas por otros procesos."""
+        return False
+
+    def close(self) -> None:
+        pass
+
+    def _dispatch(self, cache_name: str, key: str) -> None:
+        for callback in self._subscribers:
+            try:
+                callback(cache_name, key)
+            except Exception as e:
+                logger.error(f"Error procesando invalidación de caché {cache_name}:{key}: {e}")
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Backend compartido sobre Redis (o cualquier servidor compatible).
+    Las invalidaciones se publican en un canal pub/sub que escucha cada worker.
+    Si Redis no responde (CACHE_REDIS_SOCKET_TIMEOUT, CACHE_REDIS_CONNECT_TIMEOUT),
+    las lecturas se tratan como fallos de caché y las escrituras se descartan.
+    El código asíncrono usa los métodos `_async`, que no bloquean el event loop.
+    """
+
+    CHANNEL = "unxchange:auth:cache-invalidation"
+    RECONNECT_SECONDS = 1.0
+
+    def __init__(self, client, async_client=None, prefix: str = "unxchange:auth:"):
+        super().__init__()
+        self.client = client
+        self.async_client = async_client
+        self.prefix = prefix
+        self._listener: Optional[threading.Thread] = None
+        self._stopping = threading.Event()
+        self._listening = False
+
+    @classmethod
+    def from_url(cls, url: str) -> "RedisCacheBackend":
+        try:
+            import redis
+            import redis.asyncio
+        except ImportError:
+            raise RuntimeError("CACHE_BACKEND=redis requiere instalar el paquete `redis`")
+        timeouts = {
+            "socket_timeout": settings.CACHE_REDIS_SOCKET_TIMEOUT,
+            "socket_connect_timeout": settings.CACHE_REDIS_CONNECT_TIMEOUT,
+        }
+        # El listener de pub/sub espera con su propio timeout y no falla cuando el canal está inactivo
+        return cls(redis.Redis.from_url(url, **timeouts), redis.asyncio.Redis.from_url(url, **timeouts))
+
+    def get(self, key: str) -> Optional[bytes]:
+        try:
+            return self.client.get(self.prefix + key)
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels(operation="get").inc()
+            logger.warning(f"Error leyendo {key} de la caché compartida: {e}")
+            return None
+
+    def set(self, key: str, value: str, ttl: float) -> None:
+        try:
+            self.client.set(self.prefix + key, value, px=int(ttl * 1000))
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels(operation="set").inc()
+            logger.warning(f"Error escribiendo {key} en la caché compartida: {e}")
+
+    def delete(self, key: str) -> None:
+        try:
+            self.client.delete(self.prefix + key)
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels(operation="delete").inc()
+            logger.warning(f"Error borrando {key} de la caché compartida: {e}")
+
+    async def get_async(self, key: str) -> Optional[bytes]:
+        if self.async_client is None:
+            return self.get(key)
+        try:
+            return await self.async_client.get(self.prefix + key)
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels(operation="get").inc()
+            logger.warning(f"Error leyendo {key} de la caché compartida: {e}")
+            return None
+
+    async def set_async(self, key: str, value: str, ttl: float) -> None:
+        if self.async_client is None:
+            return self.set(key, value, ttl)
+        try:
+            await self.async_client.set(self.prefix + key, value, px=int(ttl * 1000))
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels(operation="set").inc()
+            logger.warning(f"Error escribiendo {key} en la caché compartida: {e}")
+
+    async def delete_async(self, key: str) -> None:
+        if self.async_client is None:
+            return self.delete(key)
+        try:
+            await self.async_client.delete(self.prefix + key)
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels(operation="delete").inc()
+            logger.warning(f"Error borrando {key} de la caché compartida: {e}")
+
+    async def incr_async(self, key: str, previous_key: str, ttl: float) -> Optional[Tuple[int, int]]:
+        # Una sola ida y vuelta: INCR + PEXPIRE del contador actual y GET del anterior
+        try:
+            client = self.async_client or self.client
+            pipe = client.pipeline(transaction=False)
+            pipe.incr(self.prefix + key)
+            pipe.pexpire(self.prefix + key, int(ttl * 1000))
+            pipe.get(self.prefix + previous_key)
+            result = pipe.execute()
+            if self.async_client is not None:
+                result = await result
+            current, _, previous = result
+            return int(current), int(previous or 0)
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels(operation="incr").inc()
+            logger.warning(f"Error incrementando {key} en la caché compartida: {e}")
+            return None
+
+    async def counts_async(self, key: str, previous_key: str) -> Optional[Tuple[int, int]]:
+        try:
+            keys = (self.prefix + key, self.prefix + previous_key)
+            if self.async_client is not None:
+                current, previous = await self.async_client.mget(keys)
+            else:
+                current, previous = self.client.mget(keys)
+            return int(current or 0), int(previous or 0)
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels(operation="get").inc()
+            logger.warning(f"Error leyendo {key} de la caché compartida: {e}")
+            return None
+
+    def publish_invalidation(self, cache_name: str, key: str) -> None:
+        try:
+            self.client.publish(self.CHANNEL, json.dumps([cache_name, key]))
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels(operation="publish").inc()
+            logger.warning(f"Error publicando invalidación de {cache_name}:{key}: {e}")
+            # Al menos el proceso actual queda coherente
+            self._dispatch(cache_name, key)
+
+    async def publish_invalidation_async(self, cache_name: str, key: str) -> None:
+        if self.async_client is None:
+            return self.publish_invalidation(cache_name, key)
+        try:
+            await self.async_client.publish(self.CHANNEL, json.dumps([cache_name, key]))
+        except Exception as e:
+            CACHE_BACKEND_ERRORS.labels(operation="publish").inc()
+            logger.warning(f"Error publicando invalidación de {cache_name}:{key}: {e}")
+            self._dispatch(cache_name, key)
+
+    def start(self) -> None:
+        """
+        Escucha el canal en un hilo que se reconecta cada RECONNECT_SECONDS
+        mientras Redis no esté disponible; nunca falla por un Redis caído.
+        """
+        if self._listener is None:
+            self._stopping.clear()
+            self._listener = threading.Thread(target=self._listen, name="cache-invalidation", daemon=True)
+            self._listener.start()
+
+    def _listen(self) -> None:
+        missed = False
+        while not self._stopping.is_set():
+            pubsub = self.client.pubsub(ignore_subscribe_messages=True)
+            try:
+                pubsub.subscribe(self.CHANNEL)
+                self._listening = True
+                if missed:
+                    logger.info("Canal de invalidaciones recuperado; se vacían las cachés locales")
+                    self._dispatch(ALL_CACHES, "")
+                    missed = False
+                while not self._stopping.is_set():
+                    message = pubsub.get_message(timeout=1.0)
+                    if message is not None:
+                        self._on_message(message)
+            except Exception as e:
+                self._listening = False
+                CACHE_BACKEND_ERRORS.labels(operation="subscribe").inc()
+                # Un aviso por corte, no uno por reintento
+                log = logger.debug if missed else logger.warning
+                log(f"Error escuchando invalidaciones de la caché compartida: {e}")
+                missed = True
+                self._stopping.wait(self.RECONNECT_SECONDS)
+            finally:
+                try:
+                    pubsub.close()
+                except Exception:
+                    pass
+        self._listening = False
+
+    @property
+    def listening(self) -> bool:
+        return self._listening
+
+    def _on_message(self, message) -> None:
+        try:
+            cache_name, key = json.loads(message["data"])
+        except (TypeError, ValueError) as e:
+            logger.warning(f"Invalidación de caché ilegible: {e}")
+            return
+        self._dispatch(cache_name, key)
+
+    def close(self) -> None:
+        if self._listener is not None:
+            self._stopping.set()
+            self._listener.join(timeout=2.0)
+            self._listener = None
+
+
+_cache_backend: Optional[CacheBackend] = None
+
+def get_cache_backend() -> CacheBackend:
+    """
+    Backend compartido según `CACHE_BACKEND` ("memory" o "redis"). Uno por proceso.
+    """
+    global _cache_backend
+    if _cache_backend is None:
+        if settings.CACHE_BACKEND == "redis":
+            _cache_backend = RedisCacheBackend.from_url(settings.CACHE_REDIS_URL)
+        else:
+            _cache_backend = CacheBackend()
+    return _cache_backend
+
+
+class TTLCache:
+    """
+    Caché acotada a `maxsize` entradas; cada entrada expira a los `ttl` segundos.
+    Cuando se llena, se desaloja la entrada usada hace más tiempo.
+    Es segura para usarse desde varios hilos. Los aciertos, fallos y desalojos
+    se publican en Prometheus con el label `cache=name`.
+
+    Con `backend`, los fallos locales se consultan en el almacén compartido
+    (las claves deben ser `str` y los valores serializables con `dumps`/`loads`)
+    y `delete` invalida la entrada en todos los workers. Con `share_values=False`
+    los valores no salen del proceso y el backend solo difunde las invalidaciones
+    (para datos que no deben guardarse en el almacén compartido).
+    """
+
+    def __init__(
+        self,
+        maxsize: int,
+        ttl: float,
+        name: str = "default",
+        backend: Optional[CacheBackend] = None,
+        dumps: Callable[[Any], str] = json.dumps,
+        loads: Callable[[Any], Any] = json.loads,
+        share_values: bool = True,
+    ):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.name = name
+        self.backend = backend
+        # Almacén de valores (L2); None si solo se comparten las invalidaciones
+        self._store = backend if share_values else None
+        self._dumps = dumps
+        self._loads = loads
+        self._data: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self._hits = CACHE_HITS.labels(cache=name)
+        self._misses = CACHE_MISSES.labels(cache=name)
+        self._evicted_size = CACHE_EVICTIONS.labels(cache=name, reason="size")
+        self._evicted_expired = CACHE_EVICTIONS.labels(cache=name, reason="expired")
+        if backend is not None:
+            backend.subscribe(self._on_invalidation)
+
+    # --- L1: memoria del proceso ---
+
+    def _get_local(self, key: Hashable) -> Any:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return _MISSING
+            expires_at, value = item
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                self._evicted_expired.inc()
+                return _MISSING
+            self._data.move_to_end(key)
+            return value
+
+    def _set_local(self, key: Hashable, value: Any, ttl: float) -> None:
+        expires_at = time.monotonic() + ttl
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self._evicted_size.inc()
+
+    def _delete_local(self, key: Hashable) -> None:
+        with self._lock:
+            self._data.pop(key, None)
+
+    def _on_invalidation(self, cache_name: str, key: str) -> None:
+        if cache_name == self.name:
+            self._delete_local(key)
+        elif cache_name == ALL_CACHES:
+            self.clear()
+
+    def _shared_key(self, key: Hashable) -> str:
+        return f"{self.name}:{key}"
+
+    # --- API pública ---
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self._get_local(key)
+        if value is _MISSING and self._store is not None:
+            raw = self._store.get(self._shared_key(key))
+            if raw is not None:
+                value = self._loads(raw)
+                self._set_local(key, value, self.ttl)
+        return self._count(value, default)
+
+    async def get_async(self, key: Hashable, default: Any = None) -> Any:
+        value = self._get_local(key)
+        if value is _MISSING and self._store is not None:
+            raw = await self._store.get_async(self._shared_key(key))
+            if raw is not None:
+                value = self._loads(raw)
+                self._set_local(key, value, self.ttl)
+        return self._count(value, default)
+
+    def _count(self, value: Any, default: Any) -> Any:
+        if value is _MISSING:
+            self._misses.inc()
+            return default
+        self._hits.inc()
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self._set_local(key, value, ttl)
+        if self._store is not None:
+            self._store.set(self._shared_key(key), self._dumps(value), ttl)
+
+    async def set_async(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        ttl = self.ttl if ttl is None else ttl
+        self._set_local(key, value, ttl)
+        if self._store is not None:
+            await self._store.set_async(self._shared_key(key), self._dumps(value), ttl)
+
+    def delete(self, key: Hashable) -> None:
+        self._delete_local(key)
+        if self._store is not None:
+            self._store.delete(self._shared_key(key))
+        if self.backend is not None:
+            self.backend.publish_invalidation(self.name, key)
+
+    async def delete_async(self, key: Hashable) -> None:
+        self._delete_local(key)
+        if self._store is not None:
+            await self._store.delete_async(self._shared_key(key))
+        if self.backend is not None:
+            await self.backend.publish_invalidation_async(self.name, key)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    async def get_or_load(self, key: Hashable, loader: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Devuelve el valor en caché o lo obtiene con `await loader()`.
+        Los fallos concurrentes para la misma clave comparten una única carga
+        (single-flight). Los resultados `None` no se guardan.
+        """
+        value = await self.get_async(key)
+        if value is not None:
+            return value
+
+        future = self._inflight.get(key)
+        if future is not None:
+            try:
+                return await asyncio.shield(future)
+            except asyncio.CancelledError:
+                if not future.cancelled():
+                    raise
+                # Se canceló la petición que hacía la carga: se intenta de nuevo
+                return await self.get_or_load(key, loader)
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            value = await loader()
+            if value is not None:
+                await self.set_async(key, value)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as exc:
+            future.set_exception(exc)
+            future.exception()  # Evita el aviso de "exception was never retrieved"
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        future.set_result(value)
+        return value
+
+    def __len__(self) -> int:
+        return len(self._data)
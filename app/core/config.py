@@ -1,12 +1,120 @@
 # # # app/core/config.py
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     DATABASE_URL: str
+    # URL para el motor asíncrono; si no se define se deriva de DATABASE_URL
+    ASYNC_DATABASE_URL: Optional[str] = None
     SECRET_KEY: str
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 30
     ALGORITHM: str = "HS256"
 
+    # --- Claves de firma de los JWT (app/core/keys.py); solo con ALGORITHM RS256 o ES256 ---
+    JWT_KEYS_DIR: Optional[str] = None  # <kid>.pem (privada) y <kid>.pub.pem (solo verificación)
+    JWT_ACTIVE_KID: Optional[str] = None  # por defecto, la clave privada con el kid mayor
+    JWT_KEYS_RELOAD_SECONDS: float = 60.0
+    JWKS_MAX_AGE: int = 3600  # Cache-Control de /.well-known/jwks.json
+    JWT_BACKEND: str = "jose"  # "jose" (python-jose) o "pyjwt" (más rápido, requiere PyJWT)
+
+    # --- Caché de tokens ya verificados (TOKEN_CACHE_SIZE=0 la desactiva) ---
+    TOKEN_CACHE_SIZE: int = 10000  # Los tokens válidos se guardan hasta su `exp`
+    TOKEN_CACHE_NEGATIVE_TTL: float = 5.0  # Segundos que se recuerda un token rechazado
+
+    # --- Tokens de refresco (/api/v1/auth/refresh) ---
+    REFRESH_TOKEN_EXPIRE_DAYS: int = 14  # Cada rotación renueva el plazo
+    REFRESH_TOKEN_CLEANUP_INTERVAL: float = 3600.0  # Segundos entre limpiezas de tokens caducados
+    REFRESH_TOKEN_CLEANUP_BATCH: int = 1000  # Filas borradas por transacción
+
+    # --- Límite de intentos de login (ventana deslizante; con CACHE_BACKEND=redis se comparte entre workers) ---
+    LOGIN_RATE_LIMIT_ENABLED: bool = True
+    LOGIN_RATE_LIMIT_PER_IP: int = 20
+    LOGIN_RATE_LIMIT_IP_WINDOW: float = 60.0  # Segundos
+    LOGIN_RATE_LIMIT_PER_EMAIL: int = 10
+    LOGIN_RATE_LIMIT_EMAIL_WINDOW: float = 300.0  # Segundos
+    RATE_LIMIT_MAX_KEYS: int = 100000  # Claves (IPs o emails) recordadas por limitador y proceso
+
+    # --- Filtro de Bloom de emails registrados (login sin consulta para emails inexistentes) ---
+    EMAIL_FILTER_ENABLED: bool = True
+    EMAIL_FILTER_FP_RATE: float = 0.01
+    EMAIL_FILTER_SYNC_SECONDS: float = 1.0  # Como mucho una consulta incremental por segundo
+    EMAIL_FILTER_REBUILD_SECONDS: float = 3600.0  # Reconstrucción completa periódica (también descarta las bajas)
+
+    # --- Validación de tokens en get_current_user ---
+    # "database": consulta al usuario en cada petición
+    # "cached": consulta al usuario como mucho cada AUTH_PRINCIPAL_CACHE_TTL segundos
+    # "stateless": confía en los claims firmados del token y no toca la base de datos
+    AUTH_TOKEN_VALIDATION: str = "database"
+    AUTH_PRINCIPAL_CACHE_TTL: int = 30
+    AUTH_PRINCIPAL_CACHE_SIZE: int = 10000
+
+    # --- Introspección de tokens por lotes (/api/v1/auth/introspect) ---
+    INTROSPECT_MAX_TOKENS: int = 100
+    INTROSPECT_RESULT_TTL: int = 30  # Máximo que el llamador puede reutilizar la respuesta
+
+    # --- Caché de usuarios en app/crud/user.py (USER_CACHE_TTL=0 la desactiva) ---
+    USER_CACHE_SIZE: int = 10000
+    USER_CACHE_TTL: int = 30
+
+    # --- Caché compartida entre workers: "memory" (solo en proceso) o "redis" ---
+    CACHE_BACKEND: str = "memory"
+    CACHE_REDIS_URL: Optional[str] = None  # p. ej. redis://localhost:6379/0
+    # Segundos máximos por operación y por conexión: si Redis no responde, se trata como un fallo de caché
+    CACHE_REDIS_SOCKET_TIMEOUT: float = 0.25
+    CACHE_REDIS_CONNECT_TIMEOUT: float = 0.25
+
+    # --- Notificaciones de bienvenida (outbox transaccional) ---
+    NOTIFICATIONS_URL: str = "http://backend-notifications:8001"
+    NOTIFICATION_OUTBOX_ENABLED: bool = True  # Arranca el despachador en cada worker
+    NOTIFICATION_BATCH_SIZE: int = 20  # Mutaciones por petición GraphQL
+    NOTIFICATION_POLL_INTERVAL: float = 2.0  # Segundos entre consultas cuando no hay pendientes
+    NOTIFICATION_MAX_ATTEMPTS: int = 8
+    NOTIFICATION_RETRY_BASE_SECONDS: float = 2.0  # Backoff exponencial: base * 2^intentos
+    NOTIFICATION_RETRY_MAX_SECONDS: float = 600.0
+    NOTIFICATION_TIMEOUT: float = 10.0  # Plazo máximo de cada llamada, en segundos
+    NOTIFICATION_MAX_CONNECTIONS: int = 10  # Conexiones keep-alive por worker
+    NOTIFICATION_HTTP2: bool = True  # Requiere el paquete `h2`; si falta se usa HTTP/1.1
+    NOTIFICATION_BREAKER_FAILURES: int = 5  # Fallos seguidos que abren el circuito
+    NOTIFICATION_BREAKER_RESET_SECONDS: float = 30.0  # Tiempo abierto antes de la llamada de prueba
+
+    # --- Pool de conexiones (aplica a los motores síncrono y asíncrono, por worker) ---
+    DB_POOL_SIZE: int = 5
+    DB_MAX_OVERFLOW: int = 10
+    DB_POOL_TIMEOUT: float = 30.0  # Segundos de espera por una conexión libre
+    DB_POOL_RECYCLE: int = 1800  # Segundos antes de reciclar una conexión (-1 desactiva)
+    DB_POOL_PRE_PING: bool = True  # Descarta conexiones caídas antes de usarlas
+    DB_POOL_USE_LIFO: bool = False  # LIFO deja inactivas las conexiones sobrantes para que expiren
+
+    # --- Esquema y coste del hash de contraseñas ---
+    PASSWORD_HASH_SCHEME: str = "bcrypt"  # "bcrypt" o "argon2" (argon2id, requiere argon2-cffi)
+    PASSWORD_HASH_COST: Optional[int] = None  # rounds de bcrypt o time_cost de argon2; None calibra al arrancar
+    PASSWORD_HASH_TARGET_MS: float = 250.0  # Tiempo objetivo de una verificación al calibrar
+    ARGON2_MEMORY_COST: int = 19456  # KiB por hash (19 MiB)
+    ARGON2_PARALLELISM: int = 1
+
+    # --- Ejecutor dedicado para el hashing de contraseñas ---
+    PASSWORD_HASH_EXECUTOR: str = "thread"  # "thread" o "process" (evita el GIL)
+    PASSWORD_HASH_WORKERS: int = 4
+    PASSWORD_HASH_MAX_PENDING: int = 64  # Operaciones en cola antes de responder 503
+    USER_IMPORT_MAX_CONCURRENT: int = 1  # Importaciones por API simultáneas por worker (429 si se supera)
+
+    # --- Métricas HTTP de Prometheus ---
+    METRICS_MAX_ENDPOINTS: int = 100  # Plantillas de ruta distintas antes de agruparlas en "other"
+    METRICS_CACHE_SECONDS: float = 1.0  # Reutiliza la exposición de /metrics durante este tiempo (0 desactiva)
+
+    # --- Trazas por etapa (app/core/tracing.py); los histogramas por etapa siempre se publican ---
+    TRACING_EXPORTER: str = "none"  # "none", "file" (JSON Lines en formato OTLP) o "memory"
+    TRACING_FILE: str = "traces.jsonl"
+    TRACING_SAMPLE_RATE: float = 0.05  # Fracción de peticiones con spans
+
+    # --- CORS (las cabeceras se precalculan al arrancar; en el entorno, listas JSON) ---
+    CORS_ALLOW_ORIGINS: List[str] = ["*"]  # Lista vacía desactiva el middleware CORS
+    CORS_ALLOW_CREDENTIALS: bool = True
+    CORS_ALLOW_METHODS: List[str] = ["*"]
+    CORS_ALLOW_HEADERS: List[str] = ["*"]
+    CORS_EXPOSE_HEADERS: List[str] = ["X-Next-Cursor", "Retry-After"]
+    CORS_MAX_AGE: int = 600  # Segundos que el navegador guarda la respuesta del preflight
+
     class Config:
         env_file = ".env"
     
@@ -0,0 +1,105 @@
+# app/core/hashing.py
+"""
+Ejecutor dedicado para el trabajo de hashing de contraseñas (bcrypt).
+
+El hashing y la verificación de contraseñas son operaciones costosas en CPU.
+Si se ejecutan en el threadpool por defecto de Starlette, una ráfaga de
+registros o logins puede ocupar todos sus hilos y dejar en cola peticiones
+baratas como `/` o `/metrics`. Este módulo ofrece un pool propio, acotado y
+configurable (hilos o procesos), con control de admisión: si la cola está
+llena se rechaza la operación de inmediato en lugar de acumular latencia.
+"""
+import asyncio
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Optional
+
+from app.core.config import settings
+from app.core.tracing import record_stage
+from app.metrics.prometheus import (
+    PASSWORD_HASH_QUEUE_DEPTH,
+    PASSWORD_HASH_REJECTED,
+    PASSWORD_HASH_WAIT_SECONDS,
+)
+
+
+class HashingOverloaded(Exception):
+    """
+    Se lanza cuando la cola del ejecutor de hashing está llena.
+    """
+
+
+def _run_timed(fn: Callable, submitted_at: float, *args):
+    """
+    Ejecuta `fn` dentro del worker y devuelve también el tiempo que la
+    operación esperó en cola. Se define a nivel de módulo para que sea
+    serializable cuando se usa un pool de procesos.
+    """
+    waited = time.monotonic() - submitted_at
+    return waited, fn(*args)
+
+
+class PasswordHashExecutor:
+    """
+    Pool acotado para operaciones de hashing con rechazo rápido cuando está lleno.
+    """
+
+    def __init__(self, kind: str = "thread", workers: int = 4, max_pending: int = 64):
+        if kind not in ("thread", "process"):
+            raise ValueError(f"Tipo de ejecutor de hashing no soportado: {kind}")
+        self.kind = kind
+        self.workers = workers
+        self.max_pending = max_pending
+        self._pending = 0
+        self._executor: Optional[Executor] = None
+
+    def _get_executor(self) -> Executor:
+        # El pool se crea de forma perezosa para no lanzar hilos ni procesos al importar
+        if self._executor is None:
+            if self.kind == "process":
+                self._executor = ProcessPoolExecutor(max_workers=self.workers)
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.workers, thread_name_prefix="password-hash"
+                )
+        return self._executor
+
+    @property
+    def pending(self) -> int:
+        return self._pending
+
+    async def run(self, fn: Callable, *args):
+        """
+        Ejecuta `fn(*args)` en el pool dedicado.
+        Lanza `HashingOverloaded` si ya hay `max_pending` operaciones en curso o en cola.
+        """
+        if self._pending >= self.max_pending:
+            PASSWORD_HASH_REJECTED.inc()
+            raise HashingOverloaded()
+
+        self._pending += 1
+        PASSWORD_HASH_QUEUE_DEPTH.set(self._pending)
+        try:
+            loop = asyncio.get_running_loop()
+            waited, result = await loop.run_in_executor(
+                self._get_executor(), _run_timed, fn, time.monotonic(), *args
+            )
+            PASSWORD_HASH_WAIT_SECONDS.observe(waited)
+            record_stage("hash.queue_wait", waited, executor=self.kind)
+            return result
+        finally:
+            self._pending -= 1
+            PASSWORD_HASH_QUEUE_DEPTH.set(self._pending)
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Instancia global del ejecutor
+password_hash_executor = PasswordHashExecutor(
+    kind=settings.PASSWORD_HASH_EXECUTOR,
+    workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING,
+)
@@ -0,0 +1,149 @@
+# app/core/keys.py
+"""
+Anillo de claves para firmar y verificar los JWT.
+
+Con ALGORITHM=HS256 (por defecto) se usa SECRET_KEY como clave simétrica única.
+Con RS256 o ES256 las claves se leen de JWT_KEYS_DIR:
+
+- `<kid>.pem`:     clave privada; puede firmar y verificar.
+- `<kid>.pub.pem`: solo clave pública; verifica tokens de una clave retirada o
+                   publica de antemano una clave que aún no firma.
+
+Firma la clave JWT_ACTIVE_KID (o, si no se define, la clave privada con el `kid`
+mayor en orden alfabético, p. ej. fechas como 2025-07-01). Las claves se parsean
+una sola vez y se guardan como objetos ya construidos; el directorio se relee
+cada JWT_KEYS_RELOAD_SECONDS y solo se vuelven a parsear los archivos modificados.
+
+Rotación sin cortes:
+1. Añadir `<nuevo>.pub.pem` y esperar a que caduque la caché del JWKS en los consumidores.
+2. Reemplazarlo por `<nuevo>.pem` y fijar JWT_ACTIVE_KID=<nuevo>.
+3. Pasar la clave anterior a `<anterior>.pub.pem` y borrarla cuando expiren sus tokens.
+"""
+import hashlib
+import logging
+import os
+import threading
+import time
+from typing import Dict, Optional, Tuple
+
+import orjson
+from jose import jwk
+from jose.backends.base import Key
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+ASYMMETRIC_ALGORITHMS = ("RS256", "ES256")
+
+
+class KeyRing:
+    """
+    Claves de firma y verificación indexadas por `kid`, con el JWKS precalculado.
+    """
+
+    def __init__(self, algorithm: str, keys_dir: Optional[str] = None, active_kid: Optional[str] = None,
+                 reload_interval: float = 60.0):
+        self.algorithm = algorithm
+        self.keys_dir = keys_dir
+        self.active_kid = active_kid
+        self.reload_interval = reload_interval
+        self._lock = threading.Lock()
+        self._files: Dict[str, Tuple[float, Key, bool]] = {}  # ruta -> (mtime, clave, es privada)
+        self._signing: Optional[Tuple[Optional[str], Key]] = None
+        self._verifying: Dict[Optional[str], Key] = {}
+        self._jwks = b'{"keys":[]}'
+        self._jwks_etag = ""
+        self._checked_at = 0.0
+
+        if algorithm in ASYMMETRIC_ALGORITHMS:
+            if not keys_dir:
+                raise RuntimeError(f"ALGORITHM={algorithm} requiere JWT_KEYS_DIR con las claves en PEM")
+            self.reload()
+        else:
+            # Clave simétrica: no se publica en el JWKS
+            key = jwk.construct(settings.SECRET_KEY, algorithm)
+            self._signing = (None, key)
+            self._verifying = {None: key}
+            self._update_jwks([])
+
+    @property
+    def asymmetric(self) -> bool:
+        return self.algorithm in ASYMMETRIC_ALGORITHMS
+
+    def _maybe_reload(self) -> None:
+        if self.asymmetric and time.monotonic() - self._checked_at >= self.reload_interval:
+            try:
+                self.reload()
+            except Exception as e:
+                # Se siguen usando las claves cargadas hasta que el directorio vuelva a ser válido
+                logger.error(f"Error recargando las claves JWT de {self.keys_dir}: {e}")
+
+    def reload(self) -> None:
+        """Relee JWT_KEYS_DIR; solo parsea los archivos nuevos o modificados."""
+        with self._lock:
+            self._checked_at = time.monotonic()
+            files = {}
+            for name in sorted(os.listdir(self.keys_dir)):
+                if not name.endswith(".pem"):
+                    continue
+                path = os.path.join(self.keys_dir, name)
+                mtime = os.path.getmtime(path)
+                cached = self._files.get(path)
+                if cached is not None and cached[0] == mtime:
+                    files[path] = cached
+                    continue
+                with open(path, "rb") as f:
+                    key = jwk.construct(f.read(), self.algorithm)
+                files[path] = (mtime, key, not name.endswith(".pub.pem"))
+
+            private, public = {}, {}
+            for path, (_, key, is_private) in files.items():
+                name = os.path.basename(path)
+                kid = name[: -len(".pub.pem")] if name.endswith(".pub.pem") else name[: -len(".pem")]
+                if is_private:
+                    private[kid] = key
+                    public[kid] = key.public_key()
+                else:
+                    public.setdefault(kid, key)
+
+            active_kid = self.active_kid or (max(private) if private else None)
+            if active_kid not in private:
+                raise RuntimeError(f"No hay clave privada `{active_kid}.pem` en {self.keys_dir} para firmar")
+
+            self._files = files
+            self._signing = (active_kid, private[active_kid])
+            self._verifying = public
+            self._update_jwks([
+                dict(key.to_dict(), kid=kid, use="sig", alg=self.algorithm) for kid, key in sorted(public.items())
+            ])
+
+    def _update_jwks(self, keys) -> None:
+        self._jwks = orjson.dumps({"keys": keys})
+        self._jwks_etag = '"' + hashlib.sha256(self._jwks).hexdigest()[:32] + '"'
+
+    def signing_key(self) -> Tuple[Optional[str], Key]:
+        """(`kid`, clave) con la que se firman los tokens nuevos."""
+        self._maybe_reload()
+        return self._signing
+
+    def verification_key(self, kid: Optional[str]) -> Optional[Key]:
+        """Clave para verificar un token con este `kid` (None si no se conoce)."""
+        self._maybe_reload()
+        if not self.asymmetric:
+            return self._verifying[None]
+        return self._verifying.get(kid)
+
+    def jwks(self) -> Tuple[bytes, str]:
+        """JWKS serializado y su ETag."""
+        self._maybe_reload()
+        return self._jwks, self._jwks_etag
+
+
+# Anillo global de claves
+key_ring = KeyRing(
+    algorithm=settings.ALGORITHM,
+    keys_dir=settings.JWT_KEYS_DIR,
+    active_kid=settings.JWT_ACTIVE_KID,
+    reload_interval=settings.JWT_KEYS_RELOAD_SECONDS,
+)
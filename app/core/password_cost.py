@@ -0,0 +1,69 @@
+# app/core/password_cost.py
+"""
+Esquema y coste del hash de contraseñas: contexto de passlib y calibración.
+
+Solo depende de passlib y de la configuración, para que el proceso maestro de
+gunicorn (gunicorn.conf.py) pueda calibrar el coste una vez por despliegue sin
+importar la aplicación.
+"""
+import math
+import time
+
+from passlib import hash as passlib_hash
+from passlib.context import CryptContext
+
+from app.core.config import settings
+
+# El esquema por defecto es PASSWORD_HASH_SCHEME; los demás siguen verificándose pero
+# quedan obsoletos, así que `needs_update` los detecta, igual que los hashes con un
+# coste menor que el configurado, y se re-hashean en el siguiente login (ver authenticate_user).
+SCHEMES = ("bcrypt", "argon2")
+# Coste por defecto (sin calibrar) y mínimo que la calibración nunca rebaja
+DEFAULT_COST = {"bcrypt": 12, "argon2": 3}
+MIN_COST = {"bcrypt": 10, "argon2": 2}
+MAX_COST = {"bcrypt": 16, "argon2": 10}
+
+def build_password_context(scheme: str, cost: int) -> CryptContext:
+    """
+    Contexto de passlib con `scheme` como esquema por defecto y `cost` como
+    rounds de bcrypt o time_cost de argon2id.
+    """
+    if scheme not in SCHEMES:
+        raise ValueError(f"Esquema de hash de contraseñas no soportado: {scheme}")
+    if scheme == "argon2" and not passlib_hash.argon2.has_backend():
+        raise RuntimeError("PASSWORD_HASH_SCHEME=argon2 requiere instalar el paquete `argon2-cffi`")
+    # Solo se re-hashean los hashes con un coste menor que `cost`: los de coste mayor
+    # (de un host más rápido o de un despliegue anterior) se aceptan tal cual, así dos
+    # máquinas calibradas con costes distintos no se re-hashean mutuamente las contraseñas
+    options = {
+        f"{scheme}__rounds": cost,
+        f"{scheme}__min_rounds": cost,
+        f"{scheme}__max_rounds": MAX_COST[scheme],
+    }
+    if scheme == "argon2":
+        options.update(
+            argon2__type="ID",
+            argon2__memory_cost=settings.ARGON2_MEMORY_COST,
+            argon2__parallelism=settings.ARGON2_PARALLELISM,
+        )
+    return CryptContext(schemes=[scheme] + [s for s in SCHEMES if s != scheme], deprecated="auto", **options)
+
+def calibrate_password_cost(scheme: str, target_seconds: float) -> int:
+    """
+    Mide el hash con el coste mínimo y devuelve el mayor coste cuya duración
+    estimada no supera `target_seconds`, sin bajar del mínimo seguro.
+    El tiempo de bcrypt se duplica con cada round; el de argon2 crece linealmente con time_cost.
+    """
+    min_cost = MIN_COST[scheme]
+    handler = build_password_context(scheme, min_cost).handler(scheme)
+    samples = []
+    for _ in range(3):
+        start = time.perf_counter()
+        handler.hash("calibración del coste de hash")
+        samples.append(time.perf_counter() - start)
+    elapsed = sorted(samples)[1]
+    if scheme == "bcrypt":
+        cost = min_cost + int(math.log2(max(target_seconds / elapsed, 1.0)))
+    else:
+        cost = int(min_cost * target_seconds / elapsed)
+    return max(min_cost, min(cost, MAX_COST[scheme]))
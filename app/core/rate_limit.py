@@ -0,0 +1,174 @@
+# app/core/rate_limit.py
+"""
+Limitadores de ventana deslizante para frenar ataques de fuerza bruta en `/login`.
+
+Solo cuentan los intentos fallidos (y los rechazados por el propio límite): los
+logins correctos no gastan cupo, así que muchos usuarios legítimos detrás de la
+misma IP (NAT de la universidad, proxy corporativo) no se bloquean entre sí. Un
+login correcto tampoco borra los contadores: si lo hiciera, un atacante con una
+cuenta propia podría vaciar el contador de su IP entre dos intentos.
+
+Cada clave (IP o email) guarda solo dos contadores: el de la ventana fija actual
+y el de la anterior. El número de intentos en la última ventana se estima
+ponderando el contador anterior por la fracción de ventana que aún solapa:
+
+    estimado = anterior * (1 - transcurrido / ventana) + actual
+
+Así cada intento cuesta O(1) en tiempo y memoria, sin guardar marcas de tiempo.
+Las claves se guardan en un LRU acotado a RATE_LIMIT_MAX_KEYS: un ataque con
+millones de IPs o emails desaloja las claves más antiguas en lugar de agotar la
+memoria. Con CACHE_BACKEND=redis los contadores se comparten entre workers; si
+Redis no responde se usa el contador local del proceso.
+"""
+import asyncio
+import math
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from app.core.cache import CacheBackend, get_cache_backend
+from app.core.config import settings
+from app.metrics.prometheus import RATE_LIMIT_DECISIONS
+
+_COUNT_MASK = (1 << 20) - 1  # Los contadores se saturan en ~1 millón de intentos por ventana
+
+
+class SlidingWindowLimiter:
+    """
+    Permite como mucho `limit` fallos por clave en cualquier ventana de `window` segundos.
+    `check` consulta el límite antes del intento y `failed` registra el fallo. Los
+    intentos rechazados también cuentan: mientras dure el ataque, la clave sigue bloqueada.
+    """
+
+    def __init__(self, name: str, limit: int, window: float, maxsize: int = 100000,
+                 backend: Optional[CacheBackend] = None):
+        self.name = name
+        self.limit = limit
+        self.window = window
+        self.maxsize = maxsize
+        self.backend = backend
+        # clave -> índice de la ventana actual y los dos contadores empaquetados en un solo
+        # entero (en lugar de una tupla); el orden del OrderedDict es el del último intento
+        self._data: "OrderedDict[str, int]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._allowed = RATE_LIMIT_DECISIONS.labels(limiter=name, decision="allowed")
+        self._rejected = RATE_LIMIT_DECISIONS.labels(limiter=name, decision="rejected")
+
+    @staticmethod
+    def _unpack(packed: Optional[int], index: int) -> Tuple[int, int]:
+        """(actual, anterior) de la ventana `index` a partir del entero guardado."""
+        if packed is None:
+            return 0, 0
+        last_index, last_previous, last_current = packed >> 40, (packed >> 20) & _COUNT_MASK, packed & _COUNT_MASK
+        if last_index == index:
+            return last_current, last_previous
+        if last_index == index - 1:
+            return 0, last_current
+        return 0, 0
+
+    def _counts_local(self, key: str, index: int) -> Tuple[int, int]:
+        with self._lock:
+            return self._unpack(self._data.get(key), index)
+
+    def _incr_local(self, key: str, index: int) -> Tuple[int, int]:
+        with self._lock:
+            current, previous = self._unpack(self._data.pop(key, None), index)
+            current = min(current + 1, _COUNT_MASK)
+            self._data[key] = (index << 40) | (previous << 20) | current
+            if len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return current, previous
+
+    async def _counts(self, key: str, index: int, increment: bool) -> Tuple[int, int]:
+        counts = None
+        if self.backend is not None:
+            prefix = f"ratelimit:{self.name}:{key}:"
+            if increment:
+                counts = await self.backend.incr_async(f"{prefix}{index}", f"{prefix}{index - 1}", 2 * self.window)
+            else:
+                counts = await self.backend.counts_async(f"{prefix}{index}", f"{prefix}{index - 1}")
+        if counts is None:
+            counts = self._incr_local(key, index) if increment else self._counts_local(key, index)
+        return counts
+
+    async def check(self, key: str) -> float:
+        """
+        Comprueba si `key` puede intentarlo sin pasarse del límite. Devuelve 0 si
+        se permite (sin contar nada) o, si se rechaza, registra el intento y
+        devuelve los segundos que conviene esperar antes de reintentar (para `Retry-After`).
+        """
+        now = time.time()
+        index = int(now // self.window)
+        elapsed = now - index * self.window
+        current, previous = await self._counts(key, index, increment=False)
+        # El propio intento, si falla, también contará
+        if previous * (1 - elapsed / self.window) + current + 1 <= self.limit:
+            self._allowed.inc()
+            return 0.0
+        current, previous = await self._counts(key, index, increment=True)
+        self._rejected.inc()
+        return max(1.0, math.ceil(self._retry_after(previous, current, elapsed)))
+
+    async def failed(self, key: str) -> None:
+        """Registra un intento fallido de `key`."""
+        await self._counts(key, int(time.time() // self.window), increment=True)
+
+    def _retry_after(self, previous: int, current: int, elapsed: float) -> float:
+        """Segundos hasta que un nuevo intento quepa en el límite, si no llegan otros antes."""
+        room = self.limit - 1  # el propio reintento también cuenta
+        if current <= room and previous > 0:
+            # Dentro de esta ventana, cuando el peso del contador anterior baje lo suficiente
+            return self.window * (1 - (room - current) / previous) - elapsed
+        # En la siguiente ventana, cuando el contador actual (ya como anterior) pese lo suficiente
+        return self.window - elapsed + max(0.0, self.window * (1 - room / current))
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+def _shared_backend() -> Optional[CacheBackend]:
+    # El backend "memory" no guarda nada fuera del proceso: los contadores locales bastan
+    return get_cache_backend() if settings.CACHE_BACKEND == "redis" else None
+
+
+# Logins fallidos por IP de origen y por email (normalizado) del formulario
+login_ip_limiter = SlidingWindowLimiter(
+    "login_ip",
+    limit=settings.LOGIN_RATE_LIMIT_PER_IP,
+    window=settings.LOGIN_RATE_LIMIT_IP_WINDOW,
+    maxsize=settings.RATE_LIMIT_MAX_KEYS,
+    backend=_shared_backend(),
+)
+login_email_limiter = SlidingWindowLimiter(
+    "login_email",
+    limit=settings.LOGIN_RATE_LIMIT_PER_EMAIL,
+    window=settings.LOGIN_RATE_LIMIT_EMAIL_WINDOW,
+    maxsize=settings.RATE_LIMIT_MAX_KEYS,
+    backend=_shared_backend(),
+)
+
+
+async def check_login_rate_limit(ip: Optional[str], email: str) -> float:
+    """
+    Aplica los límites de login. Devuelve 0 si el intento puede continuar o los
+    segundos de espera si se rechaza. Se llama antes de buscar al usuario y de
+    verificar la contraseña, así que un intento rechazado no cuesta un bcrypt.
+    """
+    if not settings.LOGIN_RATE_LIMIT_ENABLED:
+        return 0.0
+    if ip:
+        retry_after = await login_ip_limiter.check(ip)
+        if retry_after:
+            return retry_after
+    return await login_email_limiter.check(email.strip().lower())
+
+
+async def record_login_failure(ip: Optional[str], email: str) -> None:
+    """Cuenta un login con credenciales incorrectas en los límites por IP y por email."""
+    if not settings.LOGIN_RATE_LIMIT_ENABLED:
+        return
+    failures = [login_email_limiter.failed(email.strip().lower())]
+    if ip:
+        failures.append(login_ip_limiter.failed(ip))
+    await asyncio.gather(*failures)
@@ -1,18 +1,52 @@
 # app/core/security.py
+import hashlib
+import hmac
+import logging
+import os
+import time
 from datetime import datetime, timedelta
-from typing import Optional
-from jose import JWTError, jwt
-from passlib.context import CryptContext
+from typing import Dict, Iterable, List, Optional, Tuple
+from jose import JWTError
 from .config import settings
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
-from jose import JWTError, jwt
 from app.db import models
-from sqlalchemy.orm import Session
-from app.db.database import get_db
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.db.database import get_async_db
+from app.core.hashing import password_hash_executor
+from app.core.password_cost import DEFAULT_COST, build_password_context, calibrate_password_cost
+from app.core.cache import TTLCache, get_cache_backend
+from app.api.v1.schemas import Principal
+from app.core.tracing import span
+from app.core.keys import key_ring
+from app.core.jwt_backend import jwt_backend
+from app.metrics.prometheus import PASSWORD_HASH_COST
 
-# Para el hashing de contraseñas
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+logger = logging.getLogger(__name__)
+
+# Para el hashing de contraseñas (esquema, coste y calibración en app/core/password_cost.py)
+pwd_context = build_password_context(
+    settings.PASSWORD_HASH_SCHEME, settings.PASSWORD_HASH_COST or DEFAULT_COST[settings.PASSWORD_HASH_SCHEME]
+)
+
+def configure_password_hashing() -> int:
+    """
+    Reconstruye `pwd_context` con PASSWORD_HASH_COST o, si no está definido, con el
+    coste calibrado para PASSWORD_HASH_TARGET_MS en esta máquina. Se llama al arrancar;
+    con gunicorn el maestro ya lo calibró una vez y los workers heredan el valor.
+    """
+    global pwd_context
+    scheme = settings.PASSWORD_HASH_SCHEME
+    cost = settings.PASSWORD_HASH_COST
+    if cost is None:
+        cost = calibrate_password_cost(scheme, settings.PASSWORD_HASH_TARGET_MS / 1000)
+        logger.info(f"Coste de {scheme} calibrado en {cost} para ~{settings.PASSWORD_HASH_TARGET_MS:.0f} ms")
+        # Los workers del pool de procesos que arranquen con `spawn` leen el mismo coste
+        os.environ["PASSWORD_HASH_COST"] = str(cost)
+    pwd_context = build_password_context(scheme, cost)
+    PASSWORD_HASH_COST.labels(scheme=scheme).set(cost)
+    return cost
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
     return pwd_context.verify(plain_password, hashed_password)
@@ -20,6 +54,34 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
 
+def verify_and_update_password(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Verifica la contraseña y, si el hash usa un esquema obsoleto o un coste menor
+    que el configurado, devuelve también el nuevo hash (si no, None).
+    """
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+def dummy_verify_password() -> bool:
+    """
+    Verifica contra un hash ficticio con el esquema y coste actuales. Se usa cuando
+    el usuario no existe para que la respuesta tarde lo mismo que con una contraseña
+    incorrecta y no revele qué emails están registrados. Siempre devuelve False.
+    """
+    return pwd_context.dummy_verify()
+
+# Versiones asíncronas: ejecutan el hash en el pool dedicado de hashing
+async def verify_password_async(plain_password: str, hashed_password: str) -> bool:
+    return await password_hash_executor.run(verify_password, plain_password, hashed_password)
+
+async def get_password_hash_async(password: str) -> str:
+    return await password_hash_executor.run(get_password_hash, password)
+
+async def verify_and_update_password_async(plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+    return await password_hash_executor.run(verify_and_update_password, plain_password, hashed_password)
+
+async def dummy_verify_password_async() -> bool:
+    return await password_hash_executor.run(dummy_verify_password)
+
 # Para la creación y verificación de tokens JWT
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
     to_encode = data.copy()
@@ -27,31 +89,235 @@ def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
         expire = datetime.utcnow() + expires_delta
     else:
         expire = datetime.utcnow() + timedelta(minutes=15)
-    to_encode.update({"exp": expire})
-    encoded_jwt = jwt.encode(to_encode, settings.SECRET_KEY, algorithm=settings.ALGORITHM)
+    to_encode.update({"exp": expire, "iat": datetime.utcnow()})
+    with span("auth.jwt_sign"):
+        kid, key = key_ring.signing_key()
+        headers = {"kid": kid} if kid is not None else None
+        encoded_jwt = jwt_backend.encode(to_encode, key, settings.ALGORITHM, headers)
     return encoded_jwt
 
 
+# Tokens ya verificados, por digest del token: los clientes reutilizan el mismo token
+# durante toda su vigencia y así la firma se comprueba una sola vez por proceso.
+# Los tokens válidos se guardan hasta su `exp`; los rechazados, TOKEN_CACHE_NEGATIVE_TTL.
+token_cache = TTLCache(
+    maxsize=settings.TOKEN_CACHE_SIZE, ttl=settings.TOKEN_CACHE_NEGATIVE_TTL, name="token"
+) if settings.TOKEN_CACHE_SIZE > 0 else None
+
+
+def _verify_access_token(token: str) -> dict:
+    key = key_ring.verification_key(jwt_backend.get_unverified_header(token).get("kid"))
+    if key is None:
+        raise JWTError("Clave de firma desconocida")
+    return jwt_backend.decode(token, key, settings.ALGORITHM)
+
+
+def decode_access_token(token: str) -> dict:
+    """
+    Verifica la firma y la expiración del token con la clave de su `kid`
+    (ya parseada en el anillo de claves) y devuelve los claims.
+    Lanza JWTError si el token no es válido.
+    """
+    if token_cache is None:
+        return _verify_access_token(token)
+
+    digest = hashlib.blake2b(token.encode(), digest_size=16).digest()
+    cached = token_cache.get(digest)
+    if cached is not None:
+        if isinstance(cached, str):
+            raise JWTError(cached)
+        return dict(cached)
+
+    try:
+        payload = _verify_access_token(token)
+    except JWTError as e:
+        token_cache.set(digest, str(e) or "Token inválido")
+        raise
+    exp = payload.get("exp")
+    if isinstance(exp, (int, float)):
+        ttl = min(exp - time.time(), settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60)
+        if ttl > 0:
+            token_cache.set(digest, payload, ttl=ttl)
+    return dict(payload)
+
+
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/v1/login")  # ruta de login
 
 
+def token_version(credential_version: int, role: str) -> str:
+    """
+    Versión de las credenciales del usuario que se incluye en el token (claim `ver`).
+    Cambia al cambiar la contraseña (`credential_version`) o el rol, lo que invalida
+    los tokens anteriores; el re-hash de la contraseña no la cambia.
+    """
+    digest = hmac.new(
+        settings.SECRET_KEY.encode(), f"{credential_version}:{role}".encode(), hashlib.sha256
+    )
+    return digest.hexdigest()[:16]
+
+def principal_from_user(user: models.User) -> Principal:
+    return Principal(
+        id=user.id,
+        email=user.email,
+        role=user.role,
+        token_version=token_version(user.credential_version, user.role),
+    )
+
+
+# Caché de identidades validadas (modo "cached") y registro de revocaciones.
+# Una revocación vale lo que dura un token: pasado ese tiempo ya no quedan tokens previos.
+principal_cache = TTLCache(
+    maxsize=settings.AUTH_PRINCIPAL_CACHE_SIZE,
+    ttl=settings.AUTH_PRINCIPAL_CACHE_TTL,
+    name="principal",
+    backend=get_cache_backend(),
+    dumps=lambda principal: principal.model_dump_json(),
+    loads=Principal.model_validate_json,
+)
+_revocations = TTLCache(
+    maxsize=settings.AUTH_PRINCIPAL_CACHE_SIZE, ttl=settings.ACCESS_TOKEN_EXPIRE_MINUTES * 60, name="revocation"
+)
+
+def _on_cache_invalidation(cache_name: str, key: str) -> None:
+    # La invalidación de una identidad en otro worker también revoca aquí sus tokens previos
+    if cache_name == principal_cache.name:
+        _revocations.set(key, int(time.time()))
+
+get_cache_backend().subscribe(_on_cache_invalidation)
+
+def invalidate_principal(email: str) -> None:
+    """
+    Debe llamarse cuando cambia un usuario (alta, cambio de contraseña o rol, baja).
+    Descarta su identidad en caché y rechaza en este proceso los tokens emitidos antes.
+    """
+    principal_cache.delete(email)
+    _revocations.set(email, int(time.time()))
+
+async def invalidate_principal_async(email: str) -> None:
+    """Como `invalidate_principal`, sin bloquear el event loop con la caché compartida."""
+    _revocations.set(email, int(time.time()))
+    await principal_cache.delete_async(email)
+
+
+async def _load_principal(db: AsyncSession, email: str) -> Optional[Principal]:
+    result = await db.execute(
+        select(models.User).where(models.USER_EMAIL_KEY == models.normalize_email(email)).limit(1)
+    )
+    user = result.scalars().first()
+    return principal_from_user(user) if user is not None else None
+
+
+_PRINCIPAL_COLUMNS = (models.User.id, models.User.email, models.User.role, models.User.credential_version)
+
+async def _load_principals(db: AsyncSession, emails: Iterable[str]) -> Dict[str, Principal]:
+    # Una sola consulta IN para todo el lote, solo con las columnas de la identidad
+    result = await db.execute(
+        select(*_PRINCIPAL_COLUMNS).where(models.USER_EMAIL_KEY.in_({models.normalize_email(email) for email in emails}))
+    )
+    return {row.email: principal_from_user(row) for row in result}
+
+
+def _token_claims(token: str) -> Optional[dict]:
+    """Claims de un token con firma válida, vigente y no revocado; None en otro caso."""
+    try:
+        payload = decode_access_token(token)
+    except JWTError:
+        return None
+    username = payload.get("sub")
+    if username is None:
+        return None
+    revoked_at = _revocations.get(username)
+    if revoked_at is not None and payload.get("iat", 0) < revoked_at:
+        return None
+    return payload
+
+
+def _stateless_principal(payload: dict, mode: str) -> Optional[Principal]:
+    # Modo "stateless": los claims firmados bastan. Los tokens emitidos antes de
+    # incluir `uid`/`ver` se validan contra la base de datos hasta que expiren.
+    if mode == "stateless" and "uid" in payload and "ver" in payload:
+        return Principal(
+            id=payload["uid"], email=payload["sub"], role=payload.get("role"), token_version=payload["ver"]
+        )
+    return None
+
+
+def _is_current(payload: dict, principal: Principal) -> bool:
+    # Un token emitido con credenciales anteriores ya no es válido
+    return "ver" not in payload or payload["ver"] == principal.token_version
+
+
 # Verifica el token y devuelve al usuario actual
-def get_current_user(token: str = Depends(oauth2_scheme), db: Session = Depends(get_db)):
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_async_db)):
     credentials_exception = HTTPException(
         status_code=status.HTTP_401_UNAUTHORIZED,
         detail="No se pudo validar las credenciales",
         headers={"WWW-Authenticate": "Bearer"},
     )
-    try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
-        username: str = payload.get("sub")
-        if username is None:
-            raise credentials_exception
-    except JWTError:
+    with span("auth.jwt_verify"):
+        payload = _token_claims(token)
+    if payload is None:
         raise credentials_exception
+    username: str = payload["sub"]
 
-    user = db.query(models.User).filter(models.User.email == username).first()
-    if user is None:
+    mode = settings.AUTH_TOKEN_VALIDATION
+    principal = _stateless_principal(payload, mode)
+    if principal is not None:
+        return principal
+
+    with span("auth.principal_lookup", mode=mode):
+        principal = await principal_cache.get_async(username) if mode != "database" else None
+        if principal is None:
+            principal = await _load_principal(db, username)
+            if principal is None:
+                raise credentials_exception
+            if mode != "database":
+                await principal_cache.set_async(username, principal)
+
+    if not _is_current(payload, principal):
         raise credentials_exception
-    return user
\ No newline at end of file
+    return principal
+
+
+async def introspect_tokens(db: AsyncSession, tokens: List[str]) -> List[Optional[Tuple[dict, Principal]]]:
+    """
+    Valida un lote de tokens con las mismas reglas que `get_current_user`.
+    Las firmas se verifican en una sola pasada (con la caché de tokens verificados)
+    y los usuarios que no resuelven los claims ni la caché de identidades se cargan
+    con una única consulta IN. Devuelve, en el orden recibido, (claims, identidad)
+    para cada token activo o None para cada token inactivo.
+    """
+    mode = settings.AUTH_TOKEN_VALIDATION
+    with span("auth.jwt_verify", tokens=len(tokens)):
+        payloads = [_token_claims(token) for token in tokens]
+
+    stateless = [_stateless_principal(payload, mode) if payload is not None else None for payload in payloads]
+    needed = {
+        payload["sub"] for payload, principal in zip(payloads, stateless)
+        if payload is not None and principal is None
+    }
+    principals: Dict[str, Principal] = {}
+    if needed:
+        with span("auth.principal_lookup", mode=mode, users=len(needed)):
+            if mode != "database":
+                for email in needed:
+                    principal = await principal_cache.get_async(email)
+                    if principal is not None:
+                        principals[email] = principal
+            missing = needed - principals.keys()
+            if missing:
+                loaded = await _load_principals(db, missing)
+                principals.update(loaded)
+                if mode != "database":
+                    for email, principal in loaded.items():
+                        await principal_cache.set_async(email, principal)
+
+    results: List[Optional[Tuple[dict, Principal]]] = []
+    for payload, principal in zip(payloads, stateless):
+        if payload is not None and principal is None:
+            principal = principals.get(payload["sub"])
+            if principal is not None and not _is_current(payload, principal):
+                principal = None
+        results.append((payload, principal) if principal is not None else None)
+    return results
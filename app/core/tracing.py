@@ -0,0 +1,287 @@
+# app/core/tracing.py
+"""
+Trazas por etapa del camino crítico de autenticación.
+
+`span("auth.verify_password")` mide una etapa (búsqueda en base de datos,
+bcrypt, firma del JWT, espera en el pool de hashing...). Cada etapa siempre
+alimenta el histograma `auth_stage_duration_seconds{stage}`; además, si la
+petición fue muestreada (TRACING_SAMPLE_RATE), se registra un span que se
+exporta en segundo plano con el formato JSON de OTLP (OpenTelemetry), a un
+archivo JSON Lines o a un colector en memoria.
+
+La decisión de muestreo se toma una vez por petición en `TracingMiddleware`,
+así que las peticiones no muestreadas solo pagan el coste del histograma.
+"""
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from app.core.config import settings
+from app.metrics.prometheus import AUTH_STAGE_SECONDS, TRACING_SPANS_DROPPED
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "unxchange-auth-service"
+
+
+class Span:
+    """Un span finalizado o en curso, con los campos de OTLP."""
+
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "start_ns", "end_ns", "attributes", "error")
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str], start_ns: int, attributes: Dict):
+        self.trace_id = trace_id
+        self.span_id = os.urandom(8).hex()
+        self.parent_span_id = parent_span_id
+        self.name = name
+        self.start_ns = start_ns
+        self.end_ns = start_ns
+        self.attributes = attributes
+        self.error: Optional[str] = None
+
+    def set_attribute(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 2 if self.parent_span_id is None else 1,  # SERVER para la raíz, INTERNAL para etapas
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [{"key": key, "value": _otlp_value(value)} for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def _otlp_value(value) -> dict:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def otlp_payload(spans: List[Span]) -> dict:
+    """Cuerpo `ExportTraceServiceRequest` de OTLP/JSON para un lote de spans."""
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": SERVICE_NAME}}]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}],
+        }]
+    }
+
+
+# --- Exportadores ---
+
+class InMemorySpanExporter:
+    """Guarda los spans exportados en memoria (útil para pruebas y depuración)."""
+
+    def __init__(self):
+        self._spans: List[Span] = []
+        self._lock = threading.Lock()
+
+    def export(self, spans: List[Span]) -> None:
+        with self._lock:
+            self._spans.extend(spans)
+
+    def get_finished_spans(self) -> List[Span]:
+        with self._lock:
+            return list(self._spans)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._spans.clear()
+
+
+class FileSpanExporter:
+    """
+    Escribe cada lote como una línea JSON de OTLP (`ExportTraceServiceRequest`),
+    el mismo formato que produce el exportador de archivos del OpenTelemetry Collector.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(otlp_payload(spans), separators=(",", ":")) + "\n")
+
+
+class BatchSpanProcessor:
+    """
+    Acumula los spans finalizados en una cola acotada y los exporta por lotes
+    desde un hilo de fondo, fuera del camino de la petición. Si la cola se llena,
+    los spans se descartan (`tracing_spans_dropped_total`).
+    """
+
+    def __init__(self, exporter, max_queue: int = 4096, batch_size: int = 512, interval: float = 1.0):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self.interval = interval
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_queue)
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def on_end(self, span: Span) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            TRACING_SPANS_DROPPED.inc()
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+                self._thread.start()
+
+    def _run(self) -> None:
+        while True:
+            batch = []
+            try:
+                batch.append(self._queue.get(timeout=self.interval))
+                while len(batch) < self.batch_size:
+                    batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                pass
+            if batch:
+                self._export(batch)
+
+    def _export(self, batch: List[Span]) -> None:
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            TRACING_SPANS_DROPPED.inc(len(batch))
+            logger.warning(f"Error exportando {len(batch)} spans: {e}")
+
+    def force_flush(self) -> None:
+        """Exporta de inmediato lo que haya en cola (p. ej. al apagar)."""
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        if batch:
+            self._export(batch)
+
+
+def _build_processor() -> Optional[BatchSpanProcessor]:
+    exporter = settings.TRACING_EXPORTER
+    if exporter == "file":
+        return BatchSpanProcessor(FileSpanExporter(settings.TRACING_FILE))
+    if exporter == "memory":
+        return BatchSpanProcessor(InMemorySpanExporter())
+    if exporter != "none":
+        raise ValueError(f"TRACING_EXPORTER no soportado: {exporter}")
+    return None
+
+# Procesador global; None si las trazas están desactivadas (solo histogramas)
+span_processor = _build_processor()
+
+
+# --- API de instrumentación ---
+
+# Span activo de la petición en curso (None si no está muestreada)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+class span:
+    """
+    Mide una etapa: `with span("auth.user_lookup"): ...`
+    Siempre observa el histograma de la etapa; crea un span solo si hay una traza activa.
+    """
+
+    __slots__ = ("name", "attributes", "_start", "_span", "_token")
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self._span = None
+
+    def __enter__(self) -> Optional[Span]:
+        parent = _current_span.get()
+        if parent is not None:
+            self._span = Span(self.name, parent.trace_id, parent.span_id, time.time_ns(), self.attributes)
+            self._token = _current_span.set(self._span)
+        self._start = time.perf_counter()
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        elapsed = time.perf_counter() - self._start
+        AUTH_STAGE_SECONDS.labels(stage=self.name).observe(elapsed)
+        if self._span is not None:
+            _current_span.reset(self._token)
+            self._span.end_ns = self._span.start_ns + int(elapsed * 1e9)
+            if exc is not None:
+                self._span.error = repr(exc)
+            span_processor.on_end(self._span)
+
+
+def record_stage(name: str, duration: float, **attributes) -> None:
+    """
+    Registra una etapa medida por otros medios (p. ej. la espera en la cola del
+    pool de hashing, que se mide dentro del worker) y que acaba de terminar.
+    """
+    AUTH_STAGE_SECONDS.labels(stage=name).observe(duration)
+    parent = _current_span.get()
+    if parent is not None:
+        end_ns = time.time_ns()
+        stage = Span(name, parent.trace_id, parent.span_id, end_ns - int(duration * 1e9), attributes)
+        stage.end_ns = end_ns
+        span_processor.on_end(stage)
+
+
+class TracingMiddleware:
+    """
+    Middleware ASGI que decide el muestreo de cada petición y abre su span raíz.
+    Solo se instala si TRACING_EXPORTER no es "none".
+    """
+
+    def __init__(self, app, sample_rate: float = 1.0):
+        self.app = app
+        self.sample_rate = sample_rate
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        root = Span(f"HTTP {scope['method']}", os.urandom(16).hex(), None, time.time_ns(), {
+            "http.method": scope["method"],
+        })
+        start = time.perf_counter()
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.set_attribute("http.status_code", message["status"])
+            await send(message)
+
+        token = _current_span.set(root)
+        try:
+            await self.app(scope, receive, send_wrapper)
+        except Exception as e:
+            root.error = repr(e)
+            raise
+        finally:
+            _current_span.reset(token)
+            route = getattr(scope.get("route"), "path", None)
+            if route is not None:
+                root.name = f"{root.name} {route}"
+                root.set_attribute("http.route", route)
+            root.end_ns = root.start_ns + int((time.perf_counter() - start) * 1e9)
+            span_processor.on_end(root)
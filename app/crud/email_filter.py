@@ -0,0 +1,222 @@
+# app/crud/email_filter.py
+"""
+Filtro de Bloom con los emails registrados, para el login.
+
+Un email que el filtro no contiene seguro que no existe: el login lo rechaza
+sin consultar la base de datos, así que una avalancha de intentos contra
+cuentas inexistentes no llega a la base de datos. Los falsos positivos (~1 %)
+solo cuestan la consulta de siempre. Como el índice único de la tabla, el
+filtro no distingue mayúsculas (guarda los emails con `normalize_email`).
+
+El filtro se construye en segundo plano al arrancar (hasta entonces todos los
+emails se consultan en la base de datos) y se mantiene al día:
+- con `added(email)` tras cada alta y `added_many(emails)` tras cada lote de una
+  importación, que se difunden a los demás workers por el canal de
+  invalidaciones de la caché compartida (CACHE_BACKEND=redis);
+- con una consulta incremental (`id > último id visto`, más los huecos
+  pendientes) cuando un email no aparece. Mientras llegan los avisos de los
+  demás workers basta con una cada EMAIL_FILTER_SYNC_SECONDS (cubre las
+  importaciones desde otro proceso); sin ese canal (CACHE_BACKEND=memory o
+  Redis caído), un alta en otro worker solo se ve en la tabla, así que el email
+  se descarta únicamente tras una consulta que empezó después de la petición.
+  Los fallos concurrentes comparten esa consulta: una avalancha de emails
+  inexistentes cuesta una consulta por el índice primario a la vez, no una por intento;
+- reconstruyéndolo desde toda la tabla cada EMAIL_FILTER_REBUILD_SECONDS, o con
+  el doble de capacidad cuando se llena.
+
+Huecos: con varios workers, un alta puede confirmarse después de otra con un id
+mayor. Los ids que faltan por debajo del último visto se vuelven a consultar en
+cada sincronización hasta que aparecen o pasan _GAP_SECONDS (un rollback o una
+baja dejan huecos definitivos); la reconstrucción periódica cubre lo que quede.
+"""
+import asyncio
+import logging
+import time
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import func, or_, select
+
+from app.core.bloom import BloomFilter
+from app.core.cache import ALL_CACHES, get_cache_backend
+from app.core.config import settings
+from app.db import models
+from app.db.database import AsyncSessionLocal
+
+logger = logging.getLogger(__name__)
+
+# Huecos pendientes: como mucho _MAX_GAPS ids (los más altos), durante _GAP_SECONDS
+_MAX_GAPS = 1000
+_GAP_SECONDS = 300.0
+_MIN_CAPACITY = 10000
+# Clave de la invalidación que pide a los demás workers una sincronización (importaciones)
+_SYNC = ""
+
+
+class KnownEmails:
+
+    name = "known_emails"
+
+    def __init__(self, fp_rate: float, sync_interval: float, rebuild_interval: float):
+        self.fp_rate = fp_rate
+        self.sync_interval = sync_interval
+        self.rebuild_interval = rebuild_interval
+        self._filter: Optional[BloomFilter] = None
+        self._max_id = 0
+        # id que faltaba -> momento en que se vio el hueco
+        self._gaps: Dict[int, float] = {}
+        self._synced_at = 0.0
+        self._built_at = 0.0
+        self._lock = asyncio.Lock()
+        self._task: Optional[asyncio.Task] = None
+        get_cache_backend().subscribe(self._on_invalidation)
+
+    @property
+    def ready(self) -> bool:
+        return self._filter is not None
+
+    def start(self) -> None:
+        """Construye el filtro en segundo plano, sin retrasar el arranque."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._initial_sync())
+
+    async def _initial_sync(self) -> None:
+        try:
+            await self.sync()
+            logger.info(
+                f"Filtro de emails construido: {self._filter.count} emails en {self._filter.nbytes // 1024} KiB"
+            )
+        except Exception as e:
+            logger.error(f"Error construyendo el filtro de emails; el login consultará la base de datos: {e}")
+
+    def added(self, email: str) -> None:
+        """Registra un alta en este worker y la difunde a los demás."""
+        self._add(email)
+        get_cache_backend().publish_invalidation(self.name, email)
+
+    async def added_async(self, email: str) -> None:
+        """Como `added`, sin bloquear el event loop con la caché compartida."""
+        self._add(email)
+        await get_cache_backend().publish_invalidation_async(self.name, email)
+
+    def added_many(self, emails: Iterable[str]) -> None:
+        """
+        Registra un lote de altas (importaciones) en este worker y pide a los demás
+        que sincronicen: un solo mensaje en lugar de uno por email.
+        """
+        for email in emails:
+            self._add(email)
+        get_cache_backend().publish_invalidation(self.name, _SYNC)
+
+    def _add(self, email: str) -> None:
+        email = models.normalize_email(email)
+        if self._filter is not None and not self._filter.might_contain(email):
+            self._filter.add(email)
+
+    def _on_invalidation(self, cache_name: str, key: str) -> None:
+        if cache_name == ALL_CACHES:
+            # Se perdieron avisos de altas en otros workers
+            self._synced_at = 0.0
+        elif cache_name == self.name:
+            if key == _SYNC:
+                # El próximo email que no aparezca sincroniza antes de descartarse
+                self._synced_at = 0.0
+            else:
+                self._add(key)
+
+    async def sync(self) -> None:
+        """
+        Añade los usuarios con id posterior al último visto; si el filtro no
+        existe o está lleno, lo reconstruye desde toda la tabla.
+        """
+        async with self._lock:
+            await self._sync_locked()
+
+    async def _sync_if_older(self, deadline: float) -> None:
+        """Sincroniza salvo que la última sincronización empezara después de `deadline`."""
+        async with self._lock:
+            # Las peticiones que esperaban el lock aprovechan la sincronización que acaba de terminar
+            if self._synced_at < deadline:
+                await self._sync_locked()
+
+    async def _sync_locked(self) -> None:
+        started_at = time.monotonic()
+        rebuild = (
+            self._filter is None
+            or self._filter.full
+            or started_at - self._built_at >= self.rebuild_interval
+        )
+        after_id = 0 if rebuild else self._max_id
+        gaps = {} if rebuild else {
+            gap_id: seen_at for gap_id, seen_at in self._gaps.items() if started_at - seen_at < _GAP_SECONDS
+        }
+        async with AsyncSessionLocal() as db:
+            if rebuild:
+                total = await db.scalar(select(func.count()).select_from(models.User)) or 0
+                bloom = BloomFilter(max(_MIN_CAPACITY, 2 * total), self.fp_rate)
+            else:
+                bloom = self._filter
+            condition = models.User.id > after_id
+            if gaps:
+                condition = or_(condition, models.User.id.in_(list(gaps)))
+            query = (
+                select(models.User.id, models.User.email)
+                .where(condition)
+                .order_by(models.User.id)
+                .execution_options(yield_per=5000)
+            )
+            max_id = after_id
+            async for user_id, email in await db.stream(query):
+                email = models.normalize_email(email)
+                if not bloom.might_contain(email):
+                    bloom.add(email)
+                if user_id <= after_id:
+                    gaps.pop(user_id, None)  # Alta confirmada tarde
+                    continue
+                # Ids que faltan entre el anterior y este: altas sin confirmar (o rollbacks)
+                for gap_id in range(max(max_id + 1, user_id - _MAX_GAPS), user_id):
+                    gaps[gap_id] = started_at
+                if len(gaps) > 2 * _MAX_GAPS:
+                    gaps = _newest_gaps(gaps)
+                max_id = user_id
+        self._filter = bloom
+        self._max_id = max_id
+        self._gaps = _newest_gaps(gaps)
+        self._synced_at = started_at
+        if rebuild:
+            self._built_at = started_at
+
+    async def might_exist(self, email: str) -> bool:
+        """
+        False si el email seguro que no está registrado; True si puede estarlo
+        (o si el filtro aún no está listo o está desactivado).
+        """
+        if not settings.EMAIL_FILTER_ENABLED or self._filter is None:
+            return True
+        email = models.normalize_email(email)
+        if self._filter.might_contain(email):
+            return True
+        # Antes de descartarlo, incorpora las altas recientes de otros workers
+        requested_at = time.monotonic()
+        if get_cache_backend().listening:
+            # Llegan por el canal de invalidaciones: basta con sincronizar una vez por intervalo
+            if requested_at - self._synced_at < self.sync_interval:
+                return False
+            await self._sync_if_older(requested_at - self.sync_interval)
+        else:
+            # Solo están en la tabla: hace falta una sincronización posterior a esta petición
+            await self._sync_if_older(requested_at)
+        return self._filter.might_contain(email)
+
+
+def _newest_gaps(gaps: Dict[int, float]) -> Dict[int, float]:
+    if len(gaps) <= _MAX_GAPS:
+        return gaps
+    return {gap_id: gaps[gap_id] for gap_id in sorted(gaps)[-_MAX_GAPS:]}
+
+
+# Instancia global del filtro
+known_emails = KnownEmails(
+    fp_rate=settings.EMAIL_FILTER_FP_RATE,
+    sync_interval=settings.EMAIL_FILTER_SYNC_SECONDS,
+    rebuild_interval=settings.EMAIL_FILTER_REBUILD_SECONDS,
+)
@@ -0,0 +1,174 @@
+# app/crud/refresh_token.py
+"""
+Tokens de refresco con rotación y detección de reutilización.
+
+`/login` emite un token de refresco junto al de acceso; `/refresh` lo canjea por
+un par nuevo sin verificar la contraseña, así que renovar una sesión cuesta una
+búsqueda por índice y un SHA-256 en lugar de un bcrypt.
+
+Cada token sirve una sola vez: al canjearlo se marca como revocado y se emite
+otro de la misma familia. Si se presenta un token ya canjeado (p. ej. robado y
+usado por dos clientes), se revoca la familia entera y ambos deben volver a
+iniciar sesión.
+"""
+import asyncio
+import hashlib
+import logging
+import secrets
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from sqlalchemy import delete, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.security import token_version
+from app.db import models
+from app.db.database import AsyncSessionLocal
+from app.metrics.prometheus import REFRESH_TOKENS
+
+logger = logging.getLogger(__name__)
+
+
+def hash_refresh_token(token: str) -> str:
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _new_refresh_token(db: AsyncSession, user, family_id: str, now: datetime) -> str:
+    token = secrets.token_urlsafe(32)
+    db.add(models.RefreshToken(
+        token_hash=hash_refresh_token(token),
+        user_id=user.id,
+        family_id=family_id,
+        token_version=token_version(user.credential_version, user.role),
+        expires_at=now + timedelta(days=settings.REFRESH_TOKEN_EXPIRE_DAYS),
+        created_at=now,
+    ))
+    return token
+
+
+async def create_refresh_token_async(db: AsyncSession, user) -> str:
+    """
+    Emite el primer token de una familia nueva (al iniciar sesión) y lo confirma.
+    Devuelve el token en claro; solo se guarda su hash.
+    """
+    token = _new_refresh_token(db, user, secrets.token_hex(16), datetime.utcnow())
+    await db.commit()
+    REFRESH_TOKENS.labels(outcome="issued").inc()
+    return token
+
+
+async def _revoke_family(db: AsyncSession, family_id: str, now: datetime) -> None:
+    await db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.family_id == family_id, models.RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    )
+    await db.commit()
+
+
+_USER_COLUMNS = (models.User.id, models.User.email, models.User.role, models.User.credential_version)
+
+
+async def rotate_refresh_token_async(db: AsyncSession, token: str) -> Optional[Tuple[object, str]]:
+    """
+    Canjea un token de refresco: lo revoca y emite su sucesor en la misma familia.
+    Devuelve (usuario con id, email, role y credential_version, nuevo token), o None
+    si el token no existe, caducó, fue revocado o las credenciales cambiaron.
+    """
+    now = datetime.utcnow()
+    result = await db.execute(
+        select(models.RefreshToken).where(models.RefreshToken.token_hash == hash_refresh_token(token))
+    )
+    row = result.scalars().first()
+    if row is None or row.expires_at <= now:
+        REFRESH_TOKENS.labels(outcome="rejected").inc()
+        return None
+
+    # Se marca como usado solo si nadie lo hizo antes: dos canjes simultáneos no pasan ambos
+    claimed = await db.execute(
+        update(models.RefreshToken)
+        .where(models.RefreshToken.id == row.id, models.RefreshToken.revoked_at.is_(None))
+        .values(revoked_at=now)
+    )
+    if claimed.rowcount == 0:
+        REFRESH_TOKENS.labels(outcome="reused").inc()
+        logger.warning(f"Reutilización del token de refresco {row.id} (familia {row.family_id}): se revoca la familia")
+        await _revoke_family(db, row.family_id, now)
+        return None
+
+    user = (await db.execute(select(*_USER_COLUMNS).where(models.User.id == row.user_id))).first()
+    if user is None or token_version(user.credential_version, user.role) != row.token_version:
+        # Cambió la contraseña o el rol: la sesión termina
+        REFRESH_TOKENS.labels(outcome="rejected").inc()
+        await _revoke_family(db, row.family_id, now)
+        return None
+
+    new_token = _new_refresh_token(db, user, row.family_id, now)
+    await db.commit()
+    REFRESH_TOKENS.labels(outcome="rotated").inc()
+    return user, new_token
+
+
+async def delete_expired_refresh_tokens_async(batch_size: int) -> int:
+    """
+    Borra los tokens caducados en lotes de `batch_size`, cada uno en su propia
+    transacción para no mantener bloqueos largos. Devuelve cuántos se borraron.
+    """
+    deleted = 0
+    while True:
+        async with AsyncSessionLocal() as db:
+            ids = select(models.RefreshToken.id).where(
+                models.RefreshToken.expires_at <= datetime.utcnow()
+            ).limit(batch_size)
+            result = await db.execute(
+                delete(models.RefreshToken).where(models.RefreshToken.id.in_(ids)).execution_options(
+                    synchronize_session=False
+                )
+            )
+            await db.commit()
+        deleted += result.rowcount
+        if result.rowcount < batch_size:
+            break
+    if deleted:
+        REFRESH_TOKENS.labels(outcome="expired_deleted").inc(deleted)
+    return deleted
+
+
+class RefreshTokenCleanup:
+    """Tarea de fondo que borra periódicamente los tokens de refresco caducados."""
+
+    def __init__(self, interval: float, batch_size: int):
+        self.interval = interval
+        self.batch_size = batch_size
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                deleted = await delete_expired_refresh_tokens_async(self.batch_size)
+                if deleted:
+                    logger.info(f"Tokens de refresco caducados borrados: {deleted}")
+            except Exception as e:
+                logger.error(f"Error borrando tokens de refresco caducados: {e}")
+            await asyncio.sleep(self.interval)
+
+
+# Instancia global de la limpieza
+refresh_token_cleanup = RefreshTokenCleanup(
+    interval=settings.REFRESH_TOKEN_CLEANUP_INTERVAL,
+    batch_size=settings.REFRESH_TOKEN_CLEANUP_BATCH,
+)
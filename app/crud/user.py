@@ -1,20 +1,137 @@
 # app/crud/user.py
+import asyncio
+from typing import List, Optional
+import logging
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from app.db import models
+from app.notifications.outbox import enqueue_welcome
 from app.api.v1 import schemas
-from app.core.security import get_password_hash, verify_password
+from app.core.cache import TTLCache, get_cache_backend
+from app.core.config import settings
+from app.core.tracing import span
+from app.crud.email_filter import known_emails
+from app.core.security import (
+    dummy_verify_password,
+    dummy_verify_password_async,
+    get_password_hash,
+    get_password_hash_async,
+    invalidate_principal,
+    invalidate_principal_async,
+    verify_and_update_password,
+    verify_and_update_password_async,
+)
+from app.metrics.prometheus import LOGIN_EMAIL_FILTER, PASSWORD_REHASHED
+
+logger = logging.getLogger(__name__)
+
+# Cada función tiene una versión síncrona (Session, usada por scripts y utilidades)
+# y una versión `_async` (AsyncSession, usada por los endpoints de la API).
+
+# Caché de usuarios por email y por ID. Guarda copias desvinculadas de la sesión
+# que las cargó, para poder compartirlas entre peticiones. Incluyen el hash de la
+# contraseña, así que no salen del proceso: con CACHE_BACKEND=redis solo se
+# difunden sus invalidaciones (los datos públicos se comparten en `user_out_cache`).
+# Cualquier función que modifique un usuario debe llamar a `invalidate_user`.
+_USER_FIELDS = ("id", "name", "email", "hashed_password", "role", "credential_version")
+
+def _detached_copy(user):
+    if user is None:
+        return None
+    return models.User(**{field: getattr(user, field) for field in _USER_FIELDS})
+
+user_cache = TTLCache(
+    maxsize=settings.USER_CACHE_SIZE,
+    ttl=settings.USER_CACHE_TTL,
+    name="user",
+    backend=get_cache_backend(),
+    share_values=False,
+)
+
+def _get_cached(key, load):
+    if not settings.USER_CACHE_TTL:
+        return load()
+    user = user_cache.get(key)
+    if user is None:
+        user = _detached_copy(load())
+        if user is not None:
+            user_cache.set(key, user)
+    return user
+
+async def _get_cached_async(key, load):
+    if not settings.USER_CACHE_TTL:
+        return await load()
+
+    async def _load():
+        return _detached_copy(await load())
+
+    return await user_cache.get_or_load(key, _load)
+
+def _invalidate_cached_user(email: str, user_id: Optional[int] = None):
+    key = f"email:{models.normalize_email(email)}"
+    user_cache.delete(key)
+    user_out_cache.delete(key)
+    if user_id is not None:
+        user_cache.delete(f"id:{user_id}")
+
+async def _invalidate_cached_user_async(email: str, user_id: Optional[int] = None):
+    key = f"email:{models.normalize_email(email)}"
+    deletes = [user_cache.delete_async(key), user_out_cache.delete_async(key)]
+    if user_id is not None:
+        deletes.append(user_cache.delete_async(f"id:{user_id}"))
+    await asyncio.gather(*deletes)
+
+def invalidate_user(email: str, user_id: Optional[int] = None):
+    """
+    Descarta al usuario de la caché de usuarios y de la caché de identidades.
+    """
+    _invalidate_cached_user(email, user_id)
+    invalidate_principal(email)
+
+async def invalidate_user_async(email: str, user_id: Optional[int] = None):
+    """
+    Como `invalidate_user`, para el código asíncrono: las operaciones en la caché
+    compartida van en paralelo y no bloquean el event loop.
+    """
+    await asyncio.gather(_invalidate_cached_user_async(email, user_id), invalidate_principal_async(email))
 
 def get_user(db: Session, user_id: int):
     """
     Obtiene un usuario por su ID.
     """
-    return db.query(models.User).filter(models.User.id == user_id).first()
+    return _get_cached(
+        f"id:{user_id}",
+        lambda: db.query(models.User).filter(models.User.id == user_id).first()
+    )
+
+async def get_user_async(db: AsyncSession, user_id: int):
+    """
+    Obtiene un usuario por su ID.
+    """
+    return await _get_cached_async(f"id:{user_id}", lambda: db.get(models.User, user_id))
 
 def get_user_by_email(db: Session, email: str):
     """
-    Obtiene un usuario por su dirección de email.
+    Obtiene un usuario por su dirección de email (sin distinguir mayúsculas).
     """
-    return db.query(models.User).filter(models.User.email == email).first()
+    email = models.normalize_email(email)
+    return _get_cached(
+        f"email:{email}",
+        lambda: db.query(models.User).filter(models.USER_EMAIL_KEY == email).first()
+    )
+
+async def get_user_by_email_async(db: AsyncSession, email: str):
+    """
+    Obtiene un usuario por su dirección de email (sin distinguir mayúsculas).
+    """
+    email = models.normalize_email(email)
+
+    async def load():
+        result = await db.execute(select(models.User).where(models.USER_EMAIL_KEY == email).limit(1))
+        return result.scalars().first()
+
+    return await _get_cached_async(f"email:{email}", load)
 
 def create_user(db: Session, user: schemas.UserCreate):
     """
@@ -30,25 +147,145 @@ def create_user(db: Session, user: schemas.UserCreate):
             role=user.role
         )
         db.add(db_user)
+        db.flush()
+        # La notificación de bienvenida se guarda en la misma transacción que el usuario
+        enqueue_welcome(db, db_user)
         db.commit()
         db.refresh(db_user)
     except Exception as e:
         db.rollback()
         print(f"Error creating user: {e}")
         return None
+    invalidate_user(db_user.email, db_user.id)
+    known_emails.added(db_user.email)
+    return db_user
+
+async def create_user_async(db: AsyncSession, user: schemas.UserCreate):
+    """
+    Crea un nuevo usuario en la base de datos.
+    El hash se calcula en el pool dedicado de hashing, sin bloquear el event loop.
+    """
+    with span("register.hash_password"):
+        hashed_password = await get_password_hash_async(user.password)
+    try:
+        db_user = models.User(
+            name=user.name,
+            email=user.email,
+            hashed_password=hashed_password,
+            role=user.role
+        )
+        with span("register.db_insert"):
+            db.add(db_user)
+            await db.flush()
+            # La notificación de bienvenida se guarda en la misma transacción que el usuario
+            enqueue_welcome(db, db_user)
+            await db.commit()
+            await db.refresh(db_user)
+    except Exception as e:
+        await db.rollback()
+        print(f"Error creating user: {e}")
+        return None
+    await asyncio.gather(
+        invalidate_user_async(db_user.email, db_user.id), known_emails.added_async(db_user.email)
+    )
     return db_user
 
+def _rehash_statement(user, new_hash: str):
+    # Solo si el hash no cambió desde que se leyó (p. ej. por un cambio de contraseña concurrente)
+    return (
+        update(models.User)
+        .where(models.User.id == user.id, models.User.hashed_password == user.hashed_password)
+        .values(hashed_password=new_hash)
+    )
+
+def _reload_statement(user):
+    # populate_existing: la sesión puede conservar la fila tal como se leyó antes del UPDATE
+    return (
+        select(models.User)
+        .where(models.User.id == user.id)
+        .execution_options(populate_existing=True)
+    )
+
+def _apply_rehash(user, new_hash: str):
+    # El llamador invalida solo las cachés de usuarios: la identidad y la versión de
+    # credenciales no cambian, así que los tokens ya emitidos siguen siendo válidos
+    PASSWORD_REHASHED.labels(scheme=settings.PASSWORD_HASH_SCHEME).inc()
+    user = _detached_copy(user)
+    user.hashed_password = new_hash
+    return user
+
 def authenticate_user(db: Session, email: str, password: str):
     """
     Autentica a un usuario.
     1. Busca al usuario por email.
     2. Si existe, verifica que la contraseña proporcionada coincida con la hasheada.
+    3. Si el hash usa un esquema o coste desactualizado, lo reemplaza por uno nuevo.
     """
     user = get_user_by_email(db, email)
     if not user:
+        # Mismo coste que una contraseña incorrecta: no revela si el email existe
+        dummy_verify_password()
         return None  # Usuario no encontrado
-    if not verify_password(password, user.hashed_password):
+    valid, new_hash = verify_and_update_password(password, user.hashed_password)
+    if not valid:
         return None  # Contraseña incorrecta
+    if new_hash is not None:
+        try:
+            updated = db.execute(_rehash_statement(user, new_hash)).rowcount
+            db.commit()
+            if updated:
+                _invalidate_cached_user(user.email, user.id)
+                user = _apply_rehash(user, new_hash)
+            else:
+                # Otro proceso cambió el hash entre la lectura y el UPDATE: se usa el guardado
+                _invalidate_cached_user(user.email, user.id)
+                user = _detached_copy(db.execute(_reload_statement(user)).scalars().first())
+        except Exception as e:
+            # El login no falla por esto: se reintentará en el próximo
+            db.rollback()
+            logger.error(f"Error actualizando el hash de {email}: {e}")
+    return user
+
+async def authenticate_user_async(db: AsyncSession, email: str, password: str):
+    """
+    Autentica a un usuario.
+    La verificación (y el re-hash, si el hash está desactualizado) se ejecuta
+    en el pool dedicado de hashing.
+    """
+    with span("auth.user_lookup"):
+        # Un email que el filtro de Bloom descarta no existe: no hace falta consultar
+        user = None
+        if await known_emails.might_exist(email):
+            user = await get_user_by_email_async(db, email)
+            LOGIN_EMAIL_FILTER.labels(result="found" if user else "false_positive").inc()
+        else:
+            LOGIN_EMAIL_FILTER.labels(result="absent").inc()
+    if not user:
+        # Mismo coste que una contraseña incorrecta: no revela si el email existe
+        with span("auth.verify_password"):
+            await dummy_verify_password_async()
+        return None  # Usuario no encontrado
+    with span("auth.verify_password"):
+        valid, new_hash = await verify_and_update_password_async(password, user.hashed_password)
+    if not valid:
+        return None  # Contraseña incorrecta
+    if new_hash is not None:
+        try:
+            with span("auth.rehash_password"):
+                updated = (await db.execute(_rehash_statement(user, new_hash))).rowcount
+                await db.commit()
+            if updated:
+                await _invalidate_cached_user_async(user.email, user.id)
+                user = _apply_rehash(user, new_hash)
+            else:
+                # Otro proceso cambió el hash entre la lectura y el UPDATE: se usa el guardado
+                await _invalidate_cached_user_async(user.email, user.id)
+                result = await db.execute(_reload_statement(user))
+                user = _detached_copy(result.scalars().first())
+        except Exception as e:
+            # El login no falla por esto: se reintentará en el próximo
+            await db.rollback()
+            logger.error(f"Error actualizando el hash de {email}: {e}")
     return user
 
 def get_all_users(db: Session):
@@ -56,3 +293,106 @@ def get_all_users(db: Session):
     Retorna todos los usuarios en la base de datos.
     """
     return db.query(models.User).all()
+
+async def get_all_users_async(db: AsyncSession):
+    """
+    Retorna todos los usuarios en la base de datos.
+    """
+    result = await db.execute(select(models.User))
+    return result.scalars().all()
+
+# --- Ruta de lectura proyectada para respuestas UserOut ---
+# Seleccionan solo id, name, email y role como filas ligeras (sin instanciar
+# modelos ORM ni leer hashed_password) y devuelven dicts listos para serializar
+# directamente a JSON.
+
+_USER_OUT_COLUMNS = (models.User.id, models.User.name, models.User.email, models.User.role)
+
+def _user_out(row) -> dict:
+    return {"id": row[0], "name": row[1], "email": row[2], "role": row[3]}
+
+# Caché de las filas proyectadas por email; se invalida junto con `user_cache`
+user_out_cache = TTLCache(
+    maxsize=settings.USER_CACHE_SIZE,
+    ttl=settings.USER_CACHE_TTL,
+    name="user_out",
+    backend=get_cache_backend(),
+)
+
+def get_user_out_by_email(db: Session, email: str) -> Optional[dict]:
+    """
+    Obtiene id, name, email y role de un usuario por su email (sin distinguir mayúsculas).
+    """
+    email = models.normalize_email(email)
+
+    def load():
+        row = db.execute(select(*_USER_OUT_COLUMNS).where(models.USER_EMAIL_KEY == email).limit(1)).first()
+        return _user_out(row) if row is not None else None
+
+    if not settings.USER_CACHE_TTL:
+        return load()
+    user = user_out_cache.get(f"email:{email}")
+    if user is None:
+        user = load()
+        if user is not None:
+            user_out_cache.set(f"email:{email}", user)
+    return user
+
+async def get_user_out_by_email_async(db: AsyncSession, email: str) -> Optional[dict]:
+    """
+    Obtiene id, name, email y role de un usuario por su email (sin distinguir mayúsculas).
+    """
+    email = models.normalize_email(email)
+
+    async def load():
+        result = await db.execute(select(*_USER_OUT_COLUMNS).where(models.USER_EMAIL_KEY == email).limit(1))
+        row = result.first()
+        return _user_out(row) if row is not None else None
+
+    if not settings.USER_CACHE_TTL:
+        return await load()
+    return await user_out_cache.get_or_load(f"email:{email}", load)
+
+def _users_page_query(after_id: Optional[int], role: Optional[str]):
+    """
+    Consulta paginada por keyset sobre `id`: cada página empieza donde terminó la
+    anterior, usando el índice de la clave primaria en lugar de OFFSET.
+    """
+    query = select(*_USER_OUT_COLUMNS).order_by(models.User.id)
+    if after_id is not None:
+        query = query.where(models.User.id > after_id)
+    if role is not None:
+        query = query.where(models.User.role == role)
+    return query
+
+def get_users_page(db: Session, after_id: Optional[int] = None, limit: int = 100, role: Optional[str] = None) -> List[dict]:
+    """
+    Retorna hasta `limit` usuarios con id mayor a `after_id`, opcionalmente filtrados por rol.
+    """
+    return [_user_out(row) for row in db.execute(_users_page_query(after_id, role).limit(limit))]
+
+async def get_users_page_async(db: AsyncSession, after_id: Optional[int] = None, limit: int = 100, role: Optional[str] = None) -> List[dict]:
+    """
+    Retorna hasta `limit` usuarios con id mayor a `after_id`, opcionalmente filtrados por rol.
+    """
+    result = await db.execute(_users_page_query(after_id, role).limit(limit))
+    return [_user_out(row) for row in result]
+
+def stream_users(db: Session, after_id: Optional[int] = None, role: Optional[str] = None, batch_size: int = 1000):
+    """
+    Itera sobre los usuarios en lotes de `batch_size` filas (cursor del lado del
+    servidor), sin cargar la tabla completa en memoria.
+    """
+    query = _users_page_query(after_id, role).execution_options(yield_per=batch_size)
+    for row in db.execute(query):
+        yield _user_out(row)
+
+async def stream_users_async(db: AsyncSession, after_id: Optional[int] = None, role: Optional[str] = None, batch_size: int = 1000):
+    """
+    Itera sobre los usuarios en lotes de `batch_size` filas (cursor del lado del
+    servidor), sin cargar la tabla completa en memoria.
+    """
+    query = _users_page_query(after_id, role).execution_options(yield_per=batch_size)
+    result = await db.stream(query)
+    async for row in result:
+        yield _user_out(row)
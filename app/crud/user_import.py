@@ -0,0 +1,248 @@
+# app/crud/user_import.py
+"""
+Importación masiva de usuarios desde CSV o NDJSON.
+
+Cada lote de filas se valida, se deduplica contra la base de datos con una
+sola consulta `IN`, se hashea en paralelo y se inserta en una única
+transacción: `COPY` en PostgreSQL y `executemany` en SQLite.
+Las filas que fallan se reportan individualmente sin detener la importación.
+
+El script `import_users.py` hashea con un pool de procesos propio en todos los
+núcleos; la API usa el pool de hashing compartido (`hash_passwords_async`) para
+no competir con `/login` por la CPU.
+"""
+import asyncio
+import csv
+import io
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager, nullcontext
+from itertools import islice
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+from pydantic import ValidationError
+from sqlalchemy import insert, select
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from app.api.v1 import schemas
+from app.core.config import settings
+from app.core.hashing import HashingOverloaded
+from app.core.security import get_password_hash, get_password_hash_async
+from app.crud.email_filter import known_emails
+from app.db import models
+
+# Misma regla de dominio que POST /register
+ALLOWED_EMAIL_DOMAIN = "@unal.edu.co"
+
+# Cada fila parseada es (número de fila, datos) o (número de fila, error de parseo)
+ParsedRow = Tuple[int, object]
+
+# Recibe las contraseñas de un lote y devuelve sus hashes en el mismo orden
+PasswordHasher = Callable[[List[str]], List[str]]
+
+# Reintento cuando la cola del pool de hashing está llena: los logins tienen prioridad
+_OVERLOADED_RETRY_SECONDS = 0.05
+
+
+def parse_rows(content: str, fmt: str) -> Iterator[ParsedRow]:
+    """
+    Parsea un archivo CSV (con cabecera name,email,password,role) o NDJSON.
+    """
+    if fmt == "csv":
+        # La fila 1 es la cabecera
+        for line_no, row in enumerate(csv.DictReader(io.StringIO(content)), start=2):
+            # Las celdas vacías (p. ej. sin rol) toman el valor por defecto de UserCreate
+            yield line_no, {key: value for key, value in row.items() if value not in (None, "")}
+    elif fmt == "ndjson":
+        for line_no, line in enumerate(content.splitlines(), start=1):
+            if not line.strip():
+                continue
+            try:
+                yield line_no, json.loads(line)
+            except ValueError as e:
+                yield line_no, e
+    else:
+        raise ValueError(f"Formato de importación no soportado: {fmt}")
+
+
+@contextmanager
+def _process_pool_hasher(workers: int) -> Iterator[PasswordHasher]:
+    """Pool de `workers` procesos propio de la importación (lo usa el script)."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        def hash_passwords(passwords: List[str]) -> List[str]:
+            chunksize = max(1, len(passwords) // (workers * 4))
+            return list(pool.map(get_password_hash, passwords, chunksize=chunksize))
+
+        yield hash_passwords
+
+
+async def hash_passwords_async(passwords: List[str]) -> List[str]:
+    """
+    Hashea en el pool de hashing compartido con la API, con como mucho la mitad
+    de sus workers a la vez: el resto queda libre para `/login` y `/register`.
+    Si la cola está llena, espera y reintenta en lugar de fallar la importación.
+    """
+    slots = asyncio.Semaphore(max(1, settings.PASSWORD_HASH_WORKERS // 2))
+
+    async def hash_one(password: str) -> str:
+        async with slots:
+            while True:
+                try:
+                    return await get_password_hash_async(password)
+                except HashingOverloaded:
+                    await asyncio.sleep(_OVERLOADED_RETRY_SECONDS)
+
+    return list(await asyncio.gather(*(hash_one(password) for password in passwords)))
+
+
+def _existing_emails(db: Session, emails: List[str]) -> set:
+    """Emails ya registrados, normalizados con `normalize_email`."""
+    if not emails:
+        return set()
+    result = db.execute(select(models.USER_EMAIL_KEY).where(models.USER_EMAIL_KEY.in_(emails)))
+    return set(result.scalars())
+
+
+def _uses_copy(db: Session) -> bool:
+    return db.get_bind().dialect.name == "postgresql"
+
+
+def _copy_rows(db: Session, rows: List[dict]) -> None:
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow((row["name"], row["email"], row["hashed_password"], row["role"]))
+    buffer.seek(0)
+    statement = "COPY users (name, email, hashed_password, role) FROM STDIN WITH (FORMAT csv)"
+    connection = db.connection()
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(statement, buffer)
+    except connection.dialect.loaded_dbapi.IntegrityError as e:
+        # El cursor del driver lanza su propia excepción (psycopg2.errors.UniqueViolation),
+        # que no es un IntegrityError de SQLAlchemy: se traduce para reintentar fila a fila
+        raise IntegrityError(statement, None, e) from e
+    finally:
+        cursor.close()
+
+
+def _insert_batch(db: Session, batch: List[Tuple[int, dict]], errors: List[schemas.ImportRowError]) -> List[str]:
+    """Inserta el lote y devuelve los emails que se crearon."""
+    rows = [row for _, row in batch]
+    try:
+        if _uses_copy(db):
+            _copy_rows(db, rows)
+        else:
+            db.execute(insert(models.User), rows)
+        db.commit()
+        return [row["email"] for row in rows]
+    except IntegrityError:
+        db.rollback()
+
+    # Un registro concurrente pudo ocupar algún email entre la deduplicación y la
+    # inserción: se reintenta fila a fila para aislar las que fallan
+    created = []
+    for line_no, row in batch:
+        try:
+            db.execute(insert(models.User), [row])
+            db.commit()
+            created.append(row["email"])
+        except IntegrityError:
+            db.rollback()
+            errors.append(schemas.ImportRowError(row=line_no, email=row["email"], error="Email already registered"))
+    return created
+
+
+def import_users(
+    db: Session,
+    rows: Iterable[ParsedRow],
+    batch_size: int = 1000,
+    workers: Optional[int] = None,
+    hash_passwords: Optional[PasswordHasher] = None,
+) -> schemas.ImportReport:
+    """
+    Importa usuarios por lotes y devuelve un reporte con los errores por fila.
+    Las contraseñas se hashean con `hash_passwords` o, si no se indica, con un pool
+    de `workers` procesos (por defecto, uno por núcleo).
+    """
+    start = time.perf_counter()
+    errors: List[schemas.ImportRowError] = []
+    seen = set()
+    total = 0
+    created = 0
+    rows = iter(rows)
+    workers = workers or os.cpu_count() or 1
+
+    # No hace falta invalidar las cachés de usuarios: nunca guardan búsquedas sin resultado
+    hasher = nullcontext(hash_passwords) if hash_passwords is not None else _process_pool_hasher(workers)
+    with hasher as hash_passwords:
+        while True:
+            batch = list(islice(rows, batch_size))
+            if not batch:
+                break
+            total += len(batch)
+
+            valid: List[Tuple[int, schemas.UserCreate]] = []
+            for line_no, data in batch:
+                if isinstance(data, Exception):
+                    errors.append(schemas.ImportRowError(row=line_no, error=f"Fila inválida: {data}"))
+                    continue
+                email = data.get("email") if isinstance(data, dict) else None
+                try:
+                    user = schemas.UserCreate(**data)
+                except ValidationError as e:
+                    detail = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+                    errors.append(schemas.ImportRowError(row=line_no, email=email, error=detail))
+                    continue
+                except TypeError:
+                    errors.append(schemas.ImportRowError(row=line_no, error="La fila debe ser un objeto JSON"))
+                    continue
+                if not user.email.lower().endswith(ALLOWED_EMAIL_DOMAIN):
+                    errors.append(schemas.ImportRowError(
+                        row=line_no, email=user.email, error="Solo se permiten correos con dominio @unal.edu.co"
+                    ))
+                    continue
+                email_key = models.normalize_email(user.email)
+                if email_key in seen:
+                    errors.append(schemas.ImportRowError(row=line_no, email=user.email, error="Email duplicado en el archivo"))
+                    continue
+                seen.add(email_key)
+                valid.append((line_no, user))
+
+            existing = _existing_emails(db, [models.normalize_email(user.email) for _, user in valid])
+            pending = []
+            for line_no, user in valid:
+                if models.normalize_email(user.email) in existing:
+                    errors.append(schemas.ImportRowError(row=line_no, email=user.email, error="Email already registered"))
+                else:
+                    pending.append((line_no, user))
+            if not pending:
+                continue
+
+            hashes = hash_passwords([user.password for _, user in pending])
+            to_insert = [
+                (line_no, {
+                    "name": user.name,
+                    "email": user.email,
+                    "hashed_password": hashed_password,
+                    "role": user.role.value,
+                })
+                for (line_no, user), hashed_password in zip(pending, hashes)
+            ]
+            inserted = _insert_batch(db, to_insert, errors)
+            # El login no puede descartar a los importados con el filtro de emails
+            known_emails.added_many(inserted)
+            created += len(inserted)
+
+    elapsed = time.perf_counter() - start
+    return schemas.ImportReport(
+        total=total,
+        created=created,
+        failed=len(errors),
+        errors=errors,
+        elapsed_seconds=round(elapsed, 3),
+        users_per_sec=round(created / elapsed, 1) if elapsed > 0 else 0.0,
+    )
@@ -1,21 +1,123 @@
 # app/db/database.py
-from sqlalchemy import create_engine
+import threading
+import time
+from sqlalchemy import create_engine, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from app.core.config import settings
+from app.metrics.prometheus import (
+    DB_POOL_CHECKED_OUT,
+    DB_POOL_CHECKOUT_SECONDS,
+    DB_POOL_OVERFLOW,
+    DB_POOL_TIMEOUTS,
+    set_gauge_function,
+)
 
-# Crea el motor de la base de datos usando la URL del archivo de configuración
-print("DATABASE_URL:", settings.DATABASE_URL)  # Para depuración, puedes eliminarlo después
 
-# Para SQLite, necesitamos agregar check_same_thread=False, para PostgreSQL no
-if settings.DATABASE_URL.startswith("sqlite"):
-    engine = create_engine(settings.DATABASE_URL, connect_args={"check_same_thread": False})
-else:
-    # PostgreSQL y otras bases de datos
-    engine = create_engine(settings.DATABASE_URL)
+# --- Pool de conexiones instrumentado ---
+
+class _InstrumentedPoolMixin:
+    """
+    Mide la latencia de cada checkout (espera, conexión nueva y pre-ping)
+    y cuenta los checkouts que agotan `pool_timeout`.
+    """
+    engine_label = "sync"
+
+    def connect(self):
+        start = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            DB_POOL_TIMEOUTS.labels(engine=self.engine_label).inc()
+            raise
+        finally:
+            DB_POOL_CHECKOUT_SECONDS.labels(engine=self.engine_label).observe(time.perf_counter() - start)
+
+class InstrumentedQueuePool(_InstrumentedPoolMixin, QueuePool):
+    engine_label = "sync"
+
+class InstrumentedAsyncQueuePool(_InstrumentedPoolMixin, AsyncAdaptedQueuePool):
+    engine_label = "async"
+
+def get_pool_options(url, poolclass) -> dict:
+    """
+    Argumentos de pool para `create_engine` a partir de la configuración.
+    """
+    url = make_url(url)
+    if url.get_backend_name() == "sqlite" and url.database in (None, "", ":memory:"):
+        return {}  # SQLite en memoria usa su propio pool de una sola conexión
+    return {
+        "poolclass": poolclass,
+        "pool_size": settings.DB_POOL_SIZE,
+        "max_overflow": settings.DB_MAX_OVERFLOW,
+        "pool_timeout": settings.DB_POOL_TIMEOUT,
+        "pool_recycle": settings.DB_POOL_RECYCLE,
+        "pool_pre_ping": settings.DB_POOL_PRE_PING,
+        "pool_use_lifo": settings.DB_POOL_USE_LIFO,
+    }
+
+def register_pool_gauges(label: str, sync_engine) -> None:
+    """
+    Expone el estado del pool del motor en los gauges de Prometheus.
+    Se lee `sync_engine.pool` en cada scrape porque `dispose()` reemplaza el pool.
+    """
+    def read(stat):
+        def _read():
+            fn = getattr(sync_engine.pool, stat, None)
+            return max(fn(), 0) if fn else 0
+        return _read
+
+    set_gauge_function(DB_POOL_CHECKED_OUT.labels(engine=label), read("checkedout"))
+    set_gauge_function(DB_POOL_OVERFLOW.labels(engine=label), read("overflow"))
+
+
+# --- Motores perezosos ---
+# Importar este módulo no crea motores, no carga el driver ni abre conexiones: el motor
+# asíncrono lo crea el lifespan de la aplicación y, fuera de ella (scripts, benchmarks),
+# cada motor se crea al abrir la primera sesión. El esquema lo gestionan las migraciones
+# (`python -m app.db.migrate`), no el arranque.
+
+_engine = None
+_async_engine = None
+_engine_lock = threading.Lock()
+
+class _LazySessionmaker(sessionmaker):
+    """sessionmaker que crea el motor síncrono al abrir la primera sesión."""
+    def __call__(self, **local_kw):
+        if self.kw["bind"] is None:
+            get_engine()
+        return super().__call__(**local_kw)
+
+class _LazyAsyncSessionmaker(async_sessionmaker):
+    """async_sessionmaker que crea el motor asíncrono al abrir la primera sesión."""
+    def __call__(self, **local_kw):
+        if self.kw["bind"] is None:
+            get_async_engine()
+        return super().__call__(**local_kw)
+
+def get_engine():
+    """Motor síncrono (scripts y utilidades); se crea en el primer uso."""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                # Para SQLite, necesitamos agregar check_same_thread=False, para PostgreSQL no
+                connect_args = {"check_same_thread": False} if settings.DATABASE_URL.startswith("sqlite") else {}
+                engine = create_engine(
+                    settings.DATABASE_URL,
+                    connect_args=connect_args,
+                    **get_pool_options(settings.DATABASE_URL, InstrumentedQueuePool),
+                )
+                register_pool_gauges("sync", engine)
+                SessionLocal.configure(bind=engine)
+                _engine = engine
+    return _engine
 
 # Crea una fábrica de sesiones (SessionLocal) que se usará para crear nuevas sesiones de DB
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+SessionLocal = _LazySessionmaker(autocommit=False, autoflush=False)
 
 # Base es una clase base para nuestros modelos ORM. Heredarán de ella.
 Base = declarative_base()
@@ -26,4 +128,70 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+# --- Motor asíncrono (asyncpg para PostgreSQL, aiosqlite para SQLite) ---
+# Lo usan los endpoints de la API; el motor síncrono queda para scripts y utilidades.
+
+def get_async_database_url(url: str):
+    """
+    Traduce la URL síncrona al driver asíncrono equivalente.
+    Devuelve la URL y los `connect_args` necesarios para el driver.
+    """
+    async_url = make_url(url)
+    connect_args = {}
+    if async_url.drivername.startswith("sqlite"):
+        async_url = async_url.set(drivername="sqlite+aiosqlite")
+    elif async_url.drivername.startswith("postgres"):
+        async_url = async_url.set(drivername="postgresql+asyncpg")
+        # asyncpg no entiende `sslmode` en la URL; se pasa como argumento de conexión
+        sslmode = async_url.query.get("sslmode")
+        if sslmode:
+            async_url = async_url.difference_update_query(["sslmode"])
+            connect_args["ssl"] = sslmode
+    return async_url, connect_args
+
+def get_async_engine():
+    """Motor asíncrono de los endpoints; lo crea el lifespan o la primera sesión."""
+    global _async_engine
+    if _async_engine is None:
+        with _engine_lock:
+            if _async_engine is None:
+                async_url, connect_args = get_async_database_url(
+                    settings.ASYNC_DATABASE_URL or settings.DATABASE_URL
+                )
+                engine = create_async_engine(
+                    async_url,
+                    connect_args=connect_args,
+                    **get_pool_options(async_url, InstrumentedAsyncQueuePool),
+                )
+                register_pool_gauges("async", engine.sync_engine)
+                AsyncSessionLocal.configure(bind=engine)
+                _async_engine = engine
+    return _async_engine
+
+async def dispose_engines() -> None:
+    """Cierra las conexiones de los motores creados (al apagar la aplicación)."""
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _engine is not None:
+        _engine.dispose()
+
+# expire_on_commit=False: los objetos siguen siendo legibles tras el commit sin
+# lanzar una carga perezosa, que en modo asíncrono no está permitida
+AsyncSessionLocal = _LazyAsyncSessionmaker(class_=AsyncSession, autoflush=False, expire_on_commit=False)
+
+# Función de dependencia para obtener una sesión asíncrona de la base de datos
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
+
+
+def __getattr__(name):
+    # `database.engine` y `database.async_engine` siguen disponibles para los scripts
+    if name == "engine":
+        return get_engine()
+    if name == "async_engine":
+        return get_async_engine()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,33 @@
+# app/db/migrate.py
+"""
+Aplica las migraciones pendientes del esquema (Alembic).
+
+Se ejecuta una sola vez por despliegue, antes de arrancar los workers (fase
+`release` del Procfile, servicio `migrate` de docker-compose); la aplicación
+no toca el esquema al arrancar.
+
+Uso:
+    python -m app.db.migrate             # hasta la última revisión
+    python -m app.db.migrate 0001        # hasta una revisión concreta
+"""
+import os
+import sys
+from typing import Optional
+
+from alembic import command
+from alembic.config import Config
+
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), "alembic.ini")
+
+
+def upgrade(revision: str = "head", database_url: Optional[str] = None) -> None:
+    """Migra la base de datos de `database_url` (por defecto DATABASE_URL) hasta `revision`."""
+    config = Config(ALEMBIC_INI)
+    if database_url:
+        # configparser interpreta "%": las contraseñas con caracteres escapados lo llevan
+        config.set_main_option("sqlalchemy.url", database_url.replace("%", "%%"))
+    command.upgrade(config, revision)
+
+
+if __name__ == "__main__":
+    upgrade(sys.argv[1] if len(sys.argv) > 1 else "head")
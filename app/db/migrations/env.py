@@ -0,0 +1,58 @@
+# app/db/migrations/env.py
+"""
+Entorno de Alembic: aplica las migraciones con DATABASE_URL y compara contra
+los modelos de app/db/models.py (`alembic revision --autogenerate`).
+"""
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import create_engine
+from sqlalchemy.pool import NullPool
+
+from app.core.config import settings
+from app.db import models
+
+config = context.config
+
+# disable_existing_loggers=False: al migrar desde un proceso que ya configuró sus loggers, no los silencia
+if config.config_file_name is not None:
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = models.Base.metadata
+
+
+def _database_url() -> str:
+    return config.get_main_option("sqlalchemy.url") or settings.DATABASE_URL
+
+
+def run_migrations_offline() -> None:
+    """Genera el SQL de las migraciones sin conectarse (`alembic upgrade head --sql`)."""
+    context.configure(
+        url=_database_url(),
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+def run_migrations_online() -> None:
+    # Una sola conexión, sin el pool instrumentado de la aplicación
+    engine = create_engine(_database_url(), poolclass=NullPool)
+    with engine.connect() as connection:
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            # SQLite no admite la mayoría de ALTER TABLE: Alembic recrea la tabla
+            render_as_batch=connection.dialect.name == "sqlite",
+        )
+        with context.begin_transaction():
+            context.run_migrations()
+    engine.dispose()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
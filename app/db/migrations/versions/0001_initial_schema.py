@@ -0,0 +1,77 @@
+"""Esquema inicial: users, notification_outbox y refresh_tokens
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+
+Las bases de datos creadas antes con `create_all` al arrancar ya tienen estas
+tablas: las que existen se dejan como están, así que esta revisión solo las
+registra en `alembic_version`.
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0001"
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    existing = set(sa.inspect(op.get_bind()).get_table_names())
+
+    if "users" not in existing:
+        op.create_table(
+            "users",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("name", sa.String(), nullable=False),
+            sa.Column("role", sa.String(), nullable=False),
+            sa.Column("email", sa.String(), nullable=False),
+            sa.Column("hashed_password", sa.String(), nullable=False),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_users_id", "users", ["id"])
+        op.create_index("ix_users_name", "users", ["name"])
+        op.create_index("ix_users_email", "users", ["email"], unique=True)
+
+    if "notification_outbox" not in existing:
+        op.create_table(
+            "notification_outbox",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("kind", sa.String(), nullable=False),
+            sa.Column("payload", sa.JSON(), nullable=False),
+            sa.Column("attempts", sa.Integer(), nullable=False),
+            sa.Column("next_attempt_at", sa.DateTime(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("last_error", sa.String(), nullable=True),
+            sa.PrimaryKeyConstraint("id"),
+        )
+        op.create_index("ix_notification_outbox_next_attempt_at", "notification_outbox", ["next_attempt_at"])
+
+    if "refresh_tokens" not in existing:
+        op.create_table(
+            "refresh_tokens",
+            sa.Column("id", sa.Integer(), nullable=False),
+            sa.Column("token_hash", sa.String(length=64), nullable=False),
+            sa.Column("user_id", sa.Integer(), nullable=False),
+            sa.Column("family_id", sa.String(length=32), nullable=False),
+            sa.Column("token_version", sa.String(length=16), nullable=False),
+            sa.Column("expires_at", sa.DateTime(), nullable=False),
+            sa.Column("revoked_at", sa.DateTime(), nullable=True),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.ForeignKeyConstraint(["user_id"], ["users.id"], ondelete="CASCADE"),
+            sa.PrimaryKeyConstraint("id"),
+            sa.UniqueConstraint("token_hash"),
+        )
+        op.create_index("ix_refresh_tokens_family_id", "refresh_tokens", ["family_id"])
+        op.create_index("ix_refresh_tokens_expires_at", "refresh_tokens", ["expires_at"])
+
+
+def downgrade() -> None:
+    op.drop_table("refresh_tokens")
+    op.drop_table("notification_outbox")
+    op.drop_table("users")
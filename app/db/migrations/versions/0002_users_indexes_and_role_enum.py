@@ -0,0 +1,87 @@
+"""users: índice único sobre lower(email), role como enum y sin índices redundantes
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+
+- ix_users_id duplicaba el índice de la clave primaria e ix_users_name no lo usa
+  ninguna consulta: solo encarecían las escrituras.
+- ix_users_email (único, distingue mayúsculas) se sustituye por
+  ix_users_email_lower, único sobre lower(email): el login y las búsquedas por
+  email no distinguen mayúsculas y siguen siendo una sola búsqueda por índice.
+- role pasa de VARCHAR libre al tipo nativo user_role en PostgreSQL (en
+  SQLite queda como VARCHAR(13), sin CHECK).
+
+Falla sin cambiar nada si hay emails que solo difieren en mayúsculas o roles
+desconocidos: hay que corregirlos antes de migrar.
+"""
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0002"
+down_revision: Union[str, None] = "0001"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+ROLES = ("estudiante", "profesional", "administrador")
+user_role = sa.Enum(*ROLES, name="user_role")
+
+
+def _check_data(bind) -> None:
+    duplicates = bind.execute(sa.text(
+        "SELECT lower(email) FROM users GROUP BY lower(email) HAVING count(*) > 1 LIMIT 10"
+    )).scalars().all()
+    if duplicates:
+        raise RuntimeError(f"Emails duplicados sin distinguir mayúsculas: {', '.join(duplicates)}")
+    roles = bind.execute(
+        sa.text("SELECT DISTINCT role FROM users WHERE role NOT IN :roles").bindparams(
+            sa.bindparam("roles", expanding=True)
+        ),
+        {"roles": list(ROLES)},
+    ).scalars().all()
+    if roles:
+        raise RuntimeError(f"Roles desconocidos en users: {', '.join(map(str, roles))}")
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    if not context.is_offline_mode():
+        _check_data(bind)
+
+    user_role.create(bind, checkfirst=True)  # solo PostgreSQL
+    # En SQLite recrea la tabla (y sus índices); por eso los índices se cambian después
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.alter_column(
+            "role",
+            existing_type=sa.String(),
+            type_=user_role,
+            existing_nullable=False,
+            postgresql_using="role::user_role",
+        )
+
+    op.drop_index("ix_users_id", table_name="users")
+    op.drop_index("ix_users_name", table_name="users")
+    op.drop_index("ix_users_email", table_name="users")
+    op.create_index("ix_users_email_lower", "users", [sa.text("lower(email)")], unique=True)
+
+
+def downgrade() -> None:
+    bind = op.get_bind()
+    op.drop_index("ix_users_email_lower", table_name="users")
+    op.create_index("ix_users_email", "users", ["email"], unique=True)
+    op.create_index("ix_users_name", "users", ["name"])
+    op.create_index("ix_users_id", "users", ["id"])
+
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.alter_column(
+            "role",
+            existing_type=user_role,
+            type_=sa.String(),
+            existing_nullable=False,
+            postgresql_using="role::text",
+        )
+    user_role.drop(bind, checkfirst=True)
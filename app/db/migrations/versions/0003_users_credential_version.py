@@ -0,0 +1,71 @@
+"""users.credential_version: la versión de credenciales ya no depende del hash
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+
+El claim `ver` de los tokens y refresh_tokens.token_version se calculaban a
+partir de hashed_password, así que el re-hash automático del login (cambio de
+coste o de esquema) cerraba todas las sesiones del usuario. Ahora se calculan
+a partir de credential_version, que solo cambia con la contraseña.
+
+Los tokens de refresco vigentes se recalculan con la nueva versión para que las
+sesiones abiertas sobrevivan a la migración (hace falta el mismo SECRET_KEY que
+la aplicación; en modo offline no se recalculan y esas sesiones terminan una vez).
+Los tokens de acceso anteriores se rechazan y los clientes los renuevan con su
+token de refresco.
+"""
+import hashlib
+import hmac
+from datetime import datetime
+from typing import Sequence, Union
+
+from alembic import context, op
+import sqlalchemy as sa
+
+from app.core.config import settings
+
+
+# revision identifiers, used by Alembic.
+revision: str = "0003"
+down_revision: Union[str, None] = "0002"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _version(value: str) -> str:
+    # Mismo cálculo que app.core.security.token_version, congelado para esta revisión
+    return hmac.new(settings.SECRET_KEY.encode(), value.encode(), hashlib.sha256).hexdigest()[:16]
+
+
+def _carry_over_refresh_tokens(bind) -> None:
+    rows = bind.execute(sa.text(
+        "SELECT r.id, r.token_version, u.hashed_password, u.role"
+        " FROM refresh_tokens r JOIN users u ON u.id = r.user_id"
+        " WHERE r.revoked_at IS NULL AND r.expires_at > :now"
+    ), {"now": datetime.utcnow()}).all()
+    updates = [
+        {"id": row.id, "version": _version(f"1:{row.role}")}
+        for row in rows
+        # Solo los emitidos con las credenciales actuales; los demás ya no eran válidos
+        if row.token_version == _version(f"{row.hashed_password}:{row.role}")
+    ]
+    if updates:
+        bind.execute(sa.text("UPDATE refresh_tokens SET token_version = :version WHERE id = :id"), updates)
+
+
+def upgrade() -> None:
+    op.add_column(
+        "users", sa.Column("credential_version", sa.Integer(), nullable=False, server_default="1")
+    )
+    if not context.is_offline_mode():
+        _carry_over_refresh_tokens(op.get_bind())
+
+
+def downgrade() -> None:
+    # Los tokens de refresco emitidos con esta versión dejan de ser válidos.
+    # En SQLite la tabla se recrea y la reflexión no conserva índices sobre expresiones
+    op.drop_index("ix_users_email_lower", table_name="users")
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("credential_version")
+    op.create_index("ix_users_email_lower", "users", [sa.text("lower(email)")], unique=True)
@@ -1,6 +1,7 @@
 # app/db/models.py
-from sqlalchemy import Column, Integer, String, Enum
+from sqlalchemy import Column, DateTime, ForeignKey, Index, Integer, JSON, String, Enum, func
 from .database import Base
+from datetime import datetime
 import enum
 
 class UserRole(str, enum.Enum):
@@ -8,13 +9,76 @@ class UserRole(str, enum.Enum):
     profesional = "profesional"
     administrador = "administrador"
 
+def normalize_email(email: str) -> str:
+    """Forma en que se comparan los emails: la unicidad y las búsquedas no distinguen mayúsculas."""
+    return email.strip().lower()
+
 class User(Base):
+    """
+    Índices: solo la clave primaria y el índice único sobre `lower(email)`, que
+    resuelve el login y las búsquedas por email con una sola búsqueda por índice.
+    El email se guarda tal como se registró; las búsquedas deben usar
+    `USER_EMAIL_KEY == normalize_email(email)` para aprovechar el índice.
+    """
     __tablename__ = "users"
 
-    id = Column(Integer, primary_key=True, index=True)
-    name = Column(String, index=True, nullable=False) # name prueba
-    role = Column(String, nullable=False, default=UserRole.estudiante.value)
-    email = Column(String, unique=True, index=True, nullable=False)
+    id = Column(Integer, primary_key=True)
+    name = Column(String, nullable=False)
+    # Enum nativo en PostgreSQL (4 bytes por fila, rechaza valores desconocidos); en SQLite,
+    # VARCHAR sin CHECK (duplicaba el coste de cada inserción; la API ya valida con UserRole).
+    # Se lee y se escribe como str, igual que antes.
+    role = Column(
+        Enum(*(role.value for role in UserRole), name="user_role"),
+        nullable=False,
+        default=UserRole.estudiante.value,
+    )
+    email = Column(String, nullable=False)
     hashed_password = Column(String, nullable=False)
-    # role = Column(Enum(UserRole), nullable=False, default=UserRole.estudiante)
-    # Podríamos añadir más campos como: full_name, is_active, etc.
\ No newline at end of file
+    # Versión de las credenciales (ver `token_version`): se incrementa al cambiar la contraseña.
+    # El re-hash automático del login no la toca, así que no cierra las sesiones del usuario.
+    credential_version = Column(Integer, nullable=False, default=1, server_default="1")
+    # Podríamos añadir más campos como: full_name, is_active, etc.
+
+    __table_args__ = (
+        Index("ix_users_email_lower", func.lower(email), unique=True),
+    )
+
+# Expresión indexada por ix_users_email_lower
+USER_EMAIL_KEY = func.lower(User.email)
+
+class NotificationOutbox(Base):
+    """
+    Notificaciones pendientes de enviar al microservicio de notificaciones.
+    Se escriben en la misma transacción que el cambio que las origina y las
+    envía en lotes el despachador de app/notifications/outbox.py.
+    """
+    __tablename__ = "notification_outbox"
+
+    id = Column(Integer, primary_key=True)
+    kind = Column(String, nullable=False)  # p. ej. "welcome"
+    payload = Column(JSON, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Próximo intento; NULL cuando se agotaron los reintentos
+    next_attempt_at = Column(DateTime, index=True, default=datetime.utcnow)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    last_error = Column(String, nullable=True)
+
+class RefreshToken(Base):
+    """
+    Tokens de refresco opacos. Solo se guarda su SHA-256: el token tiene 256 bits
+    aleatorios, así que un digest rápido basta y no hace falta bcrypt.
+    Cada uso lo rota: se marca como usado y se emite otro de la misma familia.
+    """
+    __tablename__ = "refresh_tokens"
+
+    id = Column(Integer, primary_key=True)
+    token_hash = Column(String(64), unique=True, nullable=False)
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    # Todos los tokens encadenados desde un mismo login; se revocan juntos si se reutiliza uno
+    family_id = Column(String(32), index=True, nullable=False)
+    # Versión de credenciales al emitirlo (ver `token_version`): un cambio de contraseña o rol lo invalida
+    token_version = Column(String(16), nullable=False)
+    expires_at = Column(DateTime, index=True, nullable=False)
+    # Momento en que se rotó o se revocó; NULL mientras se puede usar
+    revoked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
@@ -1,47 +1,100 @@
 # app/main.py
-from fastapi import FastAPI
-from app.api.v1.endpoints import auth
-from app.db import models, database
+import logging
+from contextlib import asynccontextmanager
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from app.api.v1.endpoints import auth, well_known
+from app.db import database
 from fastapi.openapi.utils import get_openapi
 from fastapi.security import OAuth2PasswordBearer
 from fastapi.middleware.cors import CORSMiddleware
 
 #metrics
-from app.metrics.prometheus import prometheus_middleware, prometheus_metrics
+from app.metrics.prometheus import PrometheusMiddleware, prometheus_metrics
+from app.core.hashing import HashingOverloaded, password_hash_executor
+from app.core.cache import get_cache_backend
+from app.core.config import settings
+from app.core.tracing import TracingMiddleware, span_processor
+from app.core.security import configure_password_hashing
+from app.notifications.outbox import outbox_dispatcher
+from app.crud.refresh_token import refresh_token_cleanup
+from app.crud.email_filter import known_emails
+
+logger = logging.getLogger(__name__)
 
 
-# Crea las tablas en la base de datos si no existen
-# Esto es útil para el desarrollo, pero para producción se recomienda usar herramientas de migración como Alembic.
-try:
-    models.Base.metadata.create_all(bind=database.engine)
-    print("Tablas de la base de datos creadas (si no existían).")
-except Exception as e:
-    print(f"Error al crear las tablas de la base de datos: {e}")
+# Arranque y apagado de cada worker. Importar este módulo no abre conexiones ni
+# toca el esquema: las migraciones se aplican aparte (`python -m app.db.migrate`).
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Crea el motor asíncrono (sin conectar: la primera conexión la abre la primera consulta)
+    database.get_async_engine()
+    # Fija el coste del hash de contraseñas (calibrado para esta máquina si no está configurado)
+    configure_password_hashing()
+    # Invalidaciones de caché de los demás workers; sin Redis el worker arranca igual
+    # y el hilo de escucha se reconecta solo
+    try:
+        get_cache_backend().start()
+    except Exception as e:
+        logger.error(f"No se pudo escuchar las invalidaciones de la caché compartida: {e}")
+    if settings.NOTIFICATION_OUTBOX_ENABLED:
+        outbox_dispatcher.start()
+    refresh_token_cleanup.start()
+    if settings.EMAIL_FILTER_ENABLED:
+        known_emails.start()
+    yield
+    await outbox_dispatcher.stop()
+    await refresh_token_cleanup.stop()
+    password_hash_executor.shutdown()
+    if span_processor is not None:
+        span_processor.force_flush()
+    get_cache_backend().close()
+    await database.dispose_engines()
 
 # Crea la instancia de la aplicación FastAPI
 app = FastAPI(
     title="UnxChange - Servicio de Autenticación",
     description="API para gestionar usuarios, roles y autenticación.",
-    version="0.1.0"
+    version="0.1.0",
+    lifespan=lifespan,
 )
 
-# Agregar el middleware
-app.middleware("http")(prometheus_middleware)
+# Agregar el middleware (ASGI puro, sin BaseHTTPMiddleware)
+app.add_middleware(PrometheusMiddleware)
+# El span raíz de cada petición muestreada envuelve también la medición de métricas
+if span_processor is not None:
+    app.add_middleware(TracingMiddleware, sample_rate=settings.TRACING_SAMPLE_RATE)
 
 
 # Incluye el router de autenticación con un prefijo
 # Todas las rutas en `auth.py` ahora comenzarán con /api/v1/auth
 app.include_router(auth.router, prefix="/api/v1/auth", tags=["Autenticación"])
+# JWKS con las claves públicas de firma (sin prefijo: ruta estándar /.well-known)
+app.include_router(well_known.router)
 
-# Configuración CORS para permitir solicitudes desde el frontend
-app.add_middleware(
-    CORSMiddleware,
-    allow_origins=["*"],  # Permitir todos los orígenes en desarrollo
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-    expose_headers=["*"],
-)
+# Configuración CORS para permitir solicitudes desde el frontend.
+# CORSMiddleware precalcula sus cabeceras al crearse a partir de la configuración;
+# en producción conviene listar los orígenes en CORS_ALLOW_ORIGINS en lugar de "*".
+if settings.CORS_ALLOW_ORIGINS:
+    app.add_middleware(
+        CORSMiddleware,
+        allow_origins=settings.CORS_ALLOW_ORIGINS,
+        allow_credentials=settings.CORS_ALLOW_CREDENTIALS,
+        allow_methods=settings.CORS_ALLOW_METHODS,
+        allow_headers=settings.CORS_ALLOW_HEADERS,
+        expose_headers=settings.CORS_EXPOSE_HEADERS,
+        max_age=settings.CORS_MAX_AGE,
+    )
+
+# Rechazo rápido cuando el pool de hashing de contraseñas está saturado
+@app.exception_handler(HashingOverloaded)
+async def hashing_overloaded_handler(request: Request, exc: HashingOverloaded):
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Servicio saturado, intente de nuevo en unos segundos"},
+        headers={"Retry-After": "1"},
+    )
 
 # Endpoint de bienvenida o de health check
 @app.get("/", tags=["Root"])
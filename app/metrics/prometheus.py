@@ -1,37 +1,195 @@
-from prometheus_client import Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
-from fastapi import Request, Response
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+from prometheus_client import multiprocess
+from fastapi import Response
+import logging
+import os
+import threading
 import time
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Modo multiproceso (gunicorn): gunicorn.conf.py define PROMETHEUS_MULTIPROC_DIR antes de
+# crear los workers; cada worker escribe sus métricas en archivos mmap de ese directorio
+# y /metrics las agrega todas. `multiprocess_mode` indica cómo se combinan los gauges.
+MULTIPROCESS = bool(os.environ.get("PROMETHEUS_MULTIPROC_DIR"))
 
 # Métricas
+# Buckets ajustados a la latencia del servicio: validaciones de token en milisegundos
+# y operaciones con bcrypt (login, registro) entre ~100 ms y unos pocos segundos
+AUTH_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 0.75, 1.0, 1.5, 2.5, 5.0, 10.0)
+
 REQUEST_COUNT = Counter("http_requests_total", "Total requests", ["method", "endpoint", "http_status"])
-REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency", ["endpoint"])
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Request latency", ["endpoint"], buckets=AUTH_LATENCY_BUCKETS)
 ERROR_COUNT = Counter("http_errors_total", "Errors per endpoint", ["endpoint", "status"])
 
+# Duración de cada etapa del camino crítico de autenticación (app/core/tracing.py)
+STAGE_LATENCY_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+AUTH_STAGE_SECONDS = Histogram("auth_stage_duration_seconds", "Duration of each auth request stage", ["stage"], buckets=STAGE_LATENCY_BUCKETS)
+TRACING_SPANS_DROPPED = Counter("tracing_spans_dropped_total", "Spans dropped because the export queue was full or export failed")
+
+# Métricas del ejecutor de hashing de contraseñas
+PASSWORD_HASH_QUEUE_DEPTH = Gauge("password_hash_queue_depth", "Password hash operations queued or running", multiprocess_mode="livesum")
+PASSWORD_HASH_WAIT_SECONDS = Histogram("password_hash_wait_seconds", "Time password hash operations wait for a worker")
+PASSWORD_HASH_COST = Gauge("password_hash_cost", "Configured password hash cost (bcrypt rounds or argon2 time cost)", ["scheme"], multiprocess_mode="livemax")
+PASSWORD_REHASHED = Counter("password_rehashed_total", "Stored password hashes upgraded on login", ["scheme"])
+PASSWORD_HASH_REJECTED = Counter("password_hash_rejected_total", "Password hash operations rejected because the queue was full")
+
+# Tokens de refresco (outcome: issued, rotated, reused, rejected, expired_deleted)
+REFRESH_TOKENS = Counter("refresh_tokens_total", "Refresh token operations", ["outcome"])
+
+# Limitadores de intentos (limiter: login_ip, login_email; decision: allowed, rejected)
+RATE_LIMIT_DECISIONS = Counter("rate_limit_decisions_total", "Rate limiter decisions", ["limiter", "decision"])
+
+# Filtro de emails del login (result: absent, found, false_positive)
+LOGIN_EMAIL_FILTER = Counter("login_email_filter_total", "Login email lookups by Bloom filter outcome", ["result"])
+
+# Métricas del pool de conexiones a la base de datos (label engine: "sync" o "async")
+DB_POOL_CHECKOUT_SECONDS = Histogram("db_pool_checkout_seconds", "Time to check out a connection from the pool", ["engine"])
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out from the pool", ["engine"], multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Overflow connections currently open beyond pool_size", ["engine"], multiprocess_mode="livesum")
+DB_POOL_TIMEOUTS = Counter("db_pool_timeouts_total", "Checkouts that timed out waiting for a connection", ["engine"])
+
+# Métricas de las cachés en memoria (label cache: nombre de la caché)
+CACHE_HITS = Counter("cache_hits_total", "Cache lookups served from memory", ["cache"])
+CACHE_MISSES = Counter("cache_misses_total", "Cache lookups that missed", ["cache"])
+CACHE_EVICTIONS = Counter("cache_evictions_total", "Entries removed from a cache", ["cache", "reason"])
+CACHE_BACKEND_ERRORS = Counter("cache_backend_errors_total", "Failed operations against the shared cache backend", ["operation"])
+
+# Métricas del outbox de notificaciones
+OUTBOX_BACKLOG = Gauge("notification_outbox_backlog", "Notifications waiting in the outbox", multiprocess_mode="livemax")
+OUTBOX_SENT = Counter("notification_outbox_sent_total", "Notifications delivered from the outbox")
+OUTBOX_FAILURES = Counter("notification_outbox_failures_total", "Failed notification deliveries", ["outcome"])
+OUTBOX_DELIVERY_SECONDS = Histogram(
+    "notification_outbox_delivery_seconds",
+    "Time from enqueue to successful delivery",
+    buckets=(0.1, 0.5, 1, 2.5, 5, 10, 30, 60, 300, 900, 3600),
+)
+
+# Métricas del cliente HTTP del microservicio de notificaciones (label upstream)
+NOTIFICATION_HTTP_REQUEST_SECONDS = Histogram(
+    "notification_http_request_seconds", "Latency of requests to the notifications service", ["upstream", "outcome"]
+)
+NOTIFICATION_HTTP_IN_FLIGHT = Gauge("notification_http_in_flight", "Requests to the notifications service in flight", ["upstream"], multiprocess_mode="livesum")
+NOTIFICATION_HTTP_CONNECTIONS = Gauge("notification_http_connections", "Open pooled connections to the notifications service", ["upstream"], multiprocess_mode="livesum")
+CIRCUIT_BREAKER_STATE = Gauge("circuit_breaker_state", "Circuit breaker state (0=closed, 1=half-open, 2=open)", ["upstream"], multiprocess_mode="livemax")
+CIRCUIT_BREAKER_REJECTED = Counter("circuit_breaker_rejected_total", "Calls rejected while the circuit breaker was open", ["upstream"])
+
 # Middleware
-async def prometheus_middleware(request: Request, call_next):
-    start_time = time.time()
-    endpoint = request.url.path
-    method = request.method
-
-    try:
-        response = await call_next(request)
-        status_code = response.status_code
-    except Exception:
+# El label `endpoint` es la plantilla de la ruta (p. ej. /api/v1/auth/user), nunca la
+# URL cruda: las peticiones que no coinciden con ninguna ruta se agrupan en "unmatched"
+# y, como tope adicional, a partir de METRICS_MAX_ENDPOINTS plantillas distintas el
+# resto se agrupa en "other". Así el número de series queda acotado aunque lleguen
+# escaneos con rutas aleatorias.
+UNMATCHED_ENDPOINT = "unmatched"
+OVERFLOW_ENDPOINT = "other"
+_KNOWN_METHODS = frozenset({"GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"})
+_endpoints = set()
+
+def _endpoint_label(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path is None:
+        return UNMATCHED_ENDPOINT
+    if path not in _endpoints:
+        if len(_endpoints) >= settings.METRICS_MAX_ENDPOINTS:
+            return OVERFLOW_ENDPOINT
+        _endpoints.add(path)
+    return path
+
+class PrometheusMiddleware:
+    """
+    Middleware ASGI puro: mide cada petición HTTP sin envolver la petición y la
+    respuesta en objetos intermedios ni tareas adicionales (a diferencia de
+    `app.middleware("http")`). El estado se lee del mensaje `http.response.start`.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start_time = time.perf_counter()
+        method = scope["method"] if scope["method"] in _KNOWN_METHODS else "OTHER"
         status_code = 500
-        ERROR_COUNT.labels(endpoint=endpoint, status=str(status_code)).inc()
-        raise
-    finally:
-        latency = time.time() - start_time
-        REQUEST_LATENCY.labels(endpoint=endpoint).observe(latency)
-        REQUEST_COUNT.labels(method=method, endpoint=endpoint, http_status=status_code).inc()
 
-        # ✅ Contar todos los errores >= 400 (4xx y 5xx)
-        if status_code >= 400:
-            ERROR_COUNT.labels(endpoint=endpoint, status=str(status_code)).inc()        
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            latency = time.perf_counter() - start_time
+            # El router guarda la ruta resuelta en el scope, por eso el label se calcula al final
+            endpoint = _endpoint_label(scope)
+            REQUEST_LATENCY.labels(endpoint=endpoint).observe(latency)
+            REQUEST_COUNT.labels(method=method, endpoint=endpoint, http_status=status_code).inc()
+
+            # ✅ Contar todos los errores >= 400 (4xx y 5xx)
+            if status_code >= 400:
+                ERROR_COUNT.labels(endpoint=endpoint, status=str(status_code)).inc()
+
+# Gauges calculados al vuelo (estado de pools). En modo multiproceso `set_function`
+# no llega a los archivos compartidos, así que un hilo copia el valor periódicamente.
+_GAUGE_REFRESH_SECONDS = 5.0
+_function_gauges = []
+_function_gauges_lock = threading.Lock()
+_gauge_refresher = None
+
+def set_gauge_function(gauge, fn) -> None:
+    """
+    Equivalente a `gauge.set_function(fn)` que también funciona con gunicorn.
+    """
+    global _gauge_refresher
+    if not MULTIPROCESS:
+        gauge.set_function(fn)
+        return
+    with _function_gauges_lock:
+        _function_gauges.append((gauge, fn))
+        if _gauge_refresher is None:
+            _gauge_refresher = threading.Thread(target=_refresh_function_gauges, name="metrics-gauges", daemon=True)
+            _gauge_refresher.start()
+
+def _refresh_function_gauges() -> None:
+    while True:
+        with _function_gauges_lock:
+            gauges = list(_function_gauges)
+        for gauge, fn in gauges:
+            try:
+                gauge.set(fn())
+            except Exception as e:
+                logger.warning(f"Error actualizando un gauge de métricas: {e}")
+        time.sleep(_GAUGE_REFRESH_SECONDS)
 
-    return response
 
 # Endpoint de métricas
+# La exposición se genera como mucho una vez cada METRICS_CACHE_SECONDS: los scrapes
+# frecuentes (o de varios Prometheus) reutilizan el mismo resultado en lugar de
+# recorrer todos los archivos de métricas en cada petición.
+_exposition = (0.0, b"")
+_exposition_lock = threading.Lock()
+
+def _generate_exposition() -> bytes:
+    if MULTIPROCESS:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry)
+    return generate_latest()
+
 def prometheus_metrics():
-    return Response(generate_latest(), media_type=CONTENT_TYPE_LATEST)
+    global _exposition
+    ttl = settings.METRICS_CACHE_SECONDS
+    with _exposition_lock:
+        generated_at, body = _exposition
+        now = time.monotonic()
+        if ttl <= 0 or now - generated_at >= ttl:
+            body = _generate_exposition()
+            _exposition = (now, body)
+    return Response(body, media_type=CONTENT_TYPE_LATEST)
 
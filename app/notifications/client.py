@@ -0,0 +1,218 @@
+# app/notifications/client.py
+"""
+Cliente asíncrono del microservicio de notificaciones.
+
+Mantiene un pool de conexiones keep-alive (HTTP/2 si está instalado `h2`),
+aplica un plazo máximo a cada llamada y protege al servicio con un circuit
+breaker: tras varios fallos seguidos deja de llamar al microservicio durante
+un tiempo y falla de inmediato, en lugar de esperar el timeout en cada intento.
+"""
+import asyncio
+import importlib.util
+import logging
+import time
+from typing import List, Optional
+
+import httpx
+
+from app.metrics.prometheus import (
+    CIRCUIT_BREAKER_REJECTED,
+    CIRCUIT_BREAKER_STATE,
+    NOTIFICATION_HTTP_CONNECTIONS,
+    NOTIFICATION_HTTP_IN_FLIGHT,
+    NOTIFICATION_HTTP_REQUEST_SECONDS,
+    set_gauge_function,
+)
+from notification_client import build_welcome_batch, parse_welcome_batch
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(Exception):
+    """El circuit breaker está abierto: la llamada se rechaza sin contactar al servicio."""
+
+
+class CircuitBreaker:
+    """
+    Circuit breaker de tres estados.
+
+    - closed: las llamadas pasan; `failure_threshold` fallos seguidos lo abren.
+    - open: las llamadas se rechazan durante `reset_timeout` segundos.
+    - half-open: pasa una única llamada de prueba; si tiene éxito se cierra,
+      si falla vuelve a abrirse.
+    """
+
+    CLOSED = "closed"
+    HALF_OPEN = "half-open"
+    OPEN = "open"
+    _STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self._state_gauge = CIRCUIT_BREAKER_STATE.labels(upstream=name)
+        self._rejected = CIRCUIT_BREAKER_REJECTED.labels(upstream=name)
+        self._set_state(self.CLOSED)
+
+    @property
+    def state(self) -> str:
+        if self._state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+            self._set_state(self.HALF_OPEN)
+        return self._state
+
+    def _set_state(self, state: str) -> None:
+        self._state = state
+        self._state_gauge.set(self._STATE_VALUES[state])
+
+    def before_call(self) -> None:
+        """Lanza `CircuitOpenError` si la llamada no debe intentarse."""
+        state = self.state
+        if state == self.OPEN or (state == self.HALF_OPEN and self._probing):
+            self._rejected.inc()
+            raise CircuitOpenError(f"Circuito {self.name} abierto")
+        if state == self.HALF_OPEN:
+            self._probing = True
+
+    def release(self) -> None:
+        """La llamada se abandonó sin resultado (p. ej. cancelada): libera la prueba en curso."""
+        self._probing = False
+
+    def record_success(self) -> None:
+        self._failures = 0
+        self._probing = False
+        if self._state != self.CLOSED:
+            logger.info(f"Circuito {self.name} cerrado")
+            self._set_state(self.CLOSED)
+
+    def record_failure(self) -> None:
+        self._failures += 1
+        self._probing = False
+        if self._state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+            if self._state != self.OPEN:
+                logger.warning(f"Circuito {self.name} abierto tras {self._failures} fallos")
+            self._opened_at = time.monotonic()
+            self._set_state(self.OPEN)
+
+
+def _http2_available() -> bool:
+    return importlib.util.find_spec("h2") is not None
+
+
+class AsyncNotificationClient:
+    """
+    Versión asíncrona de `AuthNotificationClient` para usar desde el event loop.
+    Debe cerrarse con `aclose()` al apagar la aplicación.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 10.0,
+        max_connections: int = 10,
+        http2: bool = True,
+        breaker: Optional[CircuitBreaker] = None,
+        upstream: str = "notifications",
+    ):
+        self.base_url = base_url
+        self.graphql_url = f"{base_url}/api/v1/notification/graphql"
+        self.timeout = timeout
+        self.max_connections = max_connections
+        self.upstream = upstream
+        self.breaker = breaker or CircuitBreaker(upstream)
+        if http2 and not _http2_available():
+            logger.info("Paquete `h2` no instalado: el cliente de notificaciones usará HTTP/1.1")
+            http2 = False
+        self.http2 = http2
+        self._client: Optional[httpx.AsyncClient] = None
+        self._transport: Optional[httpx.AsyncHTTPTransport] = None
+        self._latency_ok = NOTIFICATION_HTTP_REQUEST_SECONDS.labels(upstream=upstream, outcome="ok")
+        self._latency_error = NOTIFICATION_HTTP_REQUEST_SECONDS.labels(upstream=upstream, outcome="error")
+        self._in_flight = NOTIFICATION_HTTP_IN_FLIGHT.labels(upstream=upstream)
+        set_gauge_function(NOTIFICATION_HTTP_CONNECTIONS.labels(upstream=upstream), self._open_connections)
+
+    def _get_client(self) -> httpx.AsyncClient:
+        # Se crea perezosamente para que quede ligado al event loop que lo usa
+        if self._client is None:
+            limits = httpx.Limits(
+                max_connections=self.max_connections, max_keepalive_connections=self.max_connections
+            )
+            self._transport = httpx.AsyncHTTPTransport(http2=self.http2, limits=limits)
+            self._client = httpx.AsyncClient(
+                transport=self._transport,
+                timeout=self.timeout,
+                headers={"Content-Type": "application/json"},
+            )
+        return self._client
+
+    def _open_connections(self) -> int:
+        # httpx no expone el pool de httpcore; se lee de forma defensiva
+        pool = getattr(self._transport, "_pool", None)
+        return len(getattr(pool, "connections", ()))
+
+    async def _post(self, payload: dict, deadline: float) -> dict:
+        self.breaker.before_call()
+        client = self._get_client()
+        start = time.perf_counter()
+        self._in_flight.inc()
+        try:
+            # El plazo acota la llamada completa (conexión, envío y lectura), no cada fase
+            response = await asyncio.wait_for(
+                client.post(self.graphql_url, json=payload, timeout=deadline), timeout=deadline
+            )
+            response.raise_for_status()
+            result = response.json()
+        except httpx.HTTPStatusError as e:
+            self._latency_error.observe(time.perf_counter() - start)
+            # Un 4xx es un error de la petición, no un síntoma de que el servicio esté caído
+            if e.response.status_code >= 500:
+                self.breaker.record_failure()
+            else:
+                self.breaker.record_success()
+            raise
+        except (httpx.HTTPError, asyncio.TimeoutError, ValueError):
+            self._latency_error.observe(time.perf_counter() - start)
+            self.breaker.record_failure()
+            raise
+        except asyncio.CancelledError:
+            self.breaker.release()
+            raise
+        finally:
+            self._in_flight.dec()
+        self._latency_ok.observe(time.perf_counter() - start)
+        self.breaker.record_success()
+        return result
+
+    async def create_users_with_welcome(
+        self, users: List[dict], deadline: Optional[float] = None
+    ) -> List[Optional[str]]:
+        """
+        Igual que `AuthNotificationClient.create_users_with_welcome`: una entrada
+        por usuario, None si se notificó o el mensaje de error. `deadline` es el
+        plazo máximo de la llamada en segundos (por defecto, `timeout`).
+        """
+        if not users:
+            return []
+        try:
+            result = await self._post(build_welcome_batch(users), deadline or self.timeout)
+        except CircuitOpenError as e:
+            return [str(e)] * len(users)
+        except asyncio.TimeoutError:
+            logger.error(f"Plazo agotado al enviar lote de {len(users)} notificaciones")
+            return ["Plazo agotado"] * len(users)
+        except httpx.HTTPStatusError as e:
+            logger.error(f"El servicio de notificaciones respondió {e.response.status_code} a un lote de {len(users)}")
+            return [f"HTTP {e.response.status_code}"] * len(users)
+        except (httpx.HTTPError, ValueError) as e:
+            logger.error(f"Error al enviar lote de {len(users)} notificaciones: {e!r}")
+            return [str(e) or type(e).__name__] * len(users)
+        return parse_welcome_batch(result, len(users))
+
+    async def aclose(self) -> None:
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+            self._transport = None
@@ -0,0 +1,179 @@
+# app/notifications/outbox.py
+"""
+Outbox transaccional para las notificaciones de bienvenida.
+
+`enqueue_welcome` añade la notificación a la sesión del alta del usuario, de
+modo que se guarda en la misma transacción y no se pierde si el proceso se
+reinicia. `OutboxDispatcher` la envía en segundo plano: agrupa varias
+mutaciones por petición, reintenta con backoff exponencial y publica métricas
+de backlog, latencia y fallos.
+"""
+import asyncio
+import logging
+import random
+from datetime import datetime, timedelta
+from typing import List, Optional
+
+from sqlalchemy import delete, func, select, update
+
+from app.core.config import settings
+from app.db import models
+from app.db.database import AsyncSessionLocal
+from app.metrics.prometheus import (
+    OUTBOX_BACKLOG,
+    OUTBOX_DELIVERY_SECONDS,
+    OUTBOX_FAILURES,
+    OUTBOX_SENT,
+)
+from app.notifications.client import AsyncNotificationClient, CircuitBreaker
+
+logger = logging.getLogger(__name__)
+
+# Tiempo durante el que un lote reclamado no vuelve a reclamarse mientras se envía
+_CLAIM_LEASE = timedelta(seconds=60)
+
+
+def enqueue_welcome(db, user: models.User) -> None:
+    """
+    Agrega a la sesión la notificación de bienvenida de `user` (ya con id asignado).
+    Se confirma con el mismo commit que crea al usuario.
+    """
+    db.add(models.NotificationOutbox(
+        kind="welcome",
+        payload={"id": user.id, "name": user.name, "email": user.email, "role": user.role},
+    ))
+
+
+def retry_delay(attempts: int) -> float:
+    """Backoff exponencial con jitter, acotado a NOTIFICATION_RETRY_MAX_SECONDS."""
+    delay = min(settings.NOTIFICATION_RETRY_BASE_SECONDS * 2 ** attempts, settings.NOTIFICATION_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.8, 1.2)
+
+
+class OutboxDispatcher:
+    """
+    Tarea de fondo que vacía el outbox en lotes.
+    Con PostgreSQL, `FOR UPDATE SKIP LOCKED` evita que dos workers reclamen las mismas filas.
+    """
+
+    def __init__(self, client: AsyncNotificationClient, batch_size: int = 20, poll_interval: float = 2.0):
+        self.client = client
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._task: Optional[asyncio.Task] = None
+        self._wakeup = asyncio.Event()
+
+    def start(self) -> None:
+        if self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.client.aclose()
+
+    def wake(self) -> None:
+        """Despierta al despachador sin esperar al siguiente sondeo (p. ej. tras un alta)."""
+        self._wakeup.set()
+
+    async def _run(self) -> None:
+        while True:
+            try:
+                processed = await self.dispatch_once()
+            except Exception as e:
+                logger.error(f"Error despachando el outbox de notificaciones: {e}")
+                processed = 0
+            if processed < self.batch_size:
+                # No quedan más pendientes por ahora: esperar al sondeo o a un aviso
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+                self._wakeup.clear()
+
+    async def _claim_batch(self) -> List[models.NotificationOutbox]:
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            backlog = await db.scalar(
+                select(func.count()).select_from(models.NotificationOutbox)
+                .where(models.NotificationOutbox.next_attempt_at.is_not(None))
+            )
+            OUTBOX_BACKLOG.set(backlog or 0)
+
+            result = await db.execute(
+                select(models.NotificationOutbox)
+                .where(models.NotificationOutbox.next_attempt_at <= now)
+                .order_by(models.NotificationOutbox.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            )
+            rows = result.scalars().all()
+            for row in rows:
+                row.next_attempt_at = now + _CLAIM_LEASE
+            await db.commit()
+            return rows
+
+    async def dispatch_once(self) -> int:
+        """
+        Envía un lote de notificaciones pendientes. Devuelve cuántas se procesaron.
+        """
+        # Con el circuito abierto no se reclaman filas: fallarían sin gastar un intento útil
+        if self.client.breaker.state == CircuitBreaker.OPEN:
+            return 0
+        rows = await self._claim_batch()
+        if not rows:
+            return 0
+
+        outcomes = await self.client.create_users_with_welcome([row.payload for row in rows])
+
+        now = datetime.utcnow()
+        async with AsyncSessionLocal() as db:
+            delivered = [row.id for row, error in zip(rows, outcomes) if error is None]
+            if delivered:
+                await db.execute(
+                    delete(models.NotificationOutbox).where(models.NotificationOutbox.id.in_(delivered))
+                )
+            for row, error in zip(rows, outcomes):
+                if error is None:
+                    OUTBOX_SENT.inc()
+                    OUTBOX_DELIVERY_SECONDS.observe((now - row.created_at).total_seconds())
+                    continue
+                attempts = row.attempts + 1
+                if attempts >= settings.NOTIFICATION_MAX_ATTEMPTS:
+                    next_attempt_at = None
+                    OUTBOX_FAILURES.labels(outcome="dead").inc()
+                    logger.error(f"Notificación {row.id} descartada tras {attempts} intentos: {error}")
+                else:
+                    next_attempt_at = now + timedelta(seconds=retry_delay(attempts))
+                    OUTBOX_FAILURES.labels(outcome="retry").inc()
+                await db.execute(
+                    update(models.NotificationOutbox)
+                    .where(models.NotificationOutbox.id == row.id)
+                    .values(attempts=attempts, next_attempt_at=next_attempt_at, last_error=error[:500])
+                )
+            await db.commit()
+        return len(rows)
+
+
+# Instancia global del despachador
+outbox_dispatcher = OutboxDispatcher(
+    client=AsyncNotificationClient(
+        base_url=settings.NOTIFICATIONS_URL,
+        timeout=settings.NOTIFICATION_TIMEOUT,
+        max_connections=settings.NOTIFICATION_MAX_CONNECTIONS,
+        http2=settings.NOTIFICATION_HTTP2,
+        breaker=CircuitBreaker(
+            "notifications",
+            failure_threshold=settings.NOTIFICATION_BREAKER_FAILURES,
+            reset_timeout=settings.NOTIFICATION_BREAKER_RESET_SECONDS,
+        ),
+    ),
+    batch_size=settings.NOTIFICATION_BATCH_SIZE,
+    poll_interval=settings.NOTIFICATION_POLL_INTERVAL,
+)
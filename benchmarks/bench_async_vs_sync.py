@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+Benchmark: ruta de petición asíncrona vs. ruta síncrona.
+
+Lanza validaciones de token concurrentes contra `GET /api/v1/auth/user`:
+- "async": la aplicación real (AsyncSession + endpoints `async def`).
+- "sync":  una réplica de la ruta anterior (Session síncrona + endpoints `def`
+           que se ejecutan en el threadpool de Starlette).
+
+Las peticiones se envían en proceso mediante ASGI, sin red, para aislar el coste
+del propio servicio. Usa la DATABASE_URL configurada (SQLite o PostgreSQL).
+
+Uso:
+    python benchmarks/bench_async_vs_sync.py --requests 2000 --concurrency 100
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Agregar el directorio raíz al path para importar los módulos de la app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from fastapi import Depends, FastAPI, HTTPException
+from jose import JWTError
+from sqlalchemy.orm import Session
+
+from app.main import app as async_app
+from app.core import security
+from app.crud import user as crud_user
+from app.db import migrate
+from app.db.database import SessionLocal, dispose_engines, get_db
+from app.db.models import User, UserRole
+
+BENCH_EMAIL = "bench.user@unal.edu.co"
+
+
+def build_sync_app() -> FastAPI:
+    """Réplica de la ruta síncrona: sesión bloqueante y handlers en el threadpool."""
+    sync_app = FastAPI()
+
+    def current_user_sync(token: str = Depends(security.oauth2_scheme), db: Session = Depends(get_db)):
+        try:
+            payload = security.decode_access_token(token)
+        except JWTError:
+            raise HTTPException(status_code=401)
+        user = crud_user.get_user_by_email(db, payload.get("sub"))
+        if user is None:
+            raise HTTPException(status_code=401)
+        return user
+
+    @sync_app.get("/api/v1/auth/user")
+    def get_user_by_email(email: str, db: Session = Depends(get_db), current_user=Depends(current_user_sync)):
+        db_user = crud_user.get_user_by_email(db, email=email)
+        if not db_user:
+            raise HTTPException(status_code=404)
+        return {"id": db_user.id, "name": db_user.name, "email": db_user.email, "role": db_user.role}
+
+    return sync_app
+
+
+def ensure_bench_user() -> str:
+    """Crea el usuario de benchmark si no existe y devuelve un token para él."""
+    db = SessionLocal()
+    try:
+        if not crud_user.get_user_by_email(db, BENCH_EMAIL):
+            db.add(User(
+                name="Bench User",
+                email=BENCH_EMAIL,
+                hashed_password=security.get_password_hash("bench123456"),
+                role=UserRole.estudiante.value,
+            ))
+            db.commit()
+    finally:
+        db.close()
+    return security.create_access_token({"sub": BENCH_EMAIL, "role": UserRole.estudiante.value})
+
+
+async def run_load(app, token: str, total: int, concurrency: int) -> dict:
+    """Envía `total` peticiones con a lo sumo `concurrency` en vuelo."""
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(concurrency)
+    headers = {"Authorization": f"Bearer {token}"}
+    # Los errores de la aplicación (p. ej. agotamiento del pool) cuentan como respuestas 500
+    transport = httpx.ASGITransport(app=app, raise_app_exceptions=False)
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one():
+            nonlocal errors
+            async with semaphore:
+                start = time.perf_counter()
+                response = await client.get("/api/v1/auth/user", params={"email": BENCH_EMAIL}, headers=headers)
+                latencies.append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one() for _ in range(total)))
+        elapsed = time.perf_counter() - started
+    # Cada ejecución usa su propio bucle de eventos: el pool asíncrono no puede pasar de uno a otro
+    await dispose_engines()
+
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        "rps": total / elapsed,
+        "p50_ms": quantiles[49] * 1000,
+        "p99_ms": quantiles[98] * 1000,
+        "errors": errors,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la ruta async con la ruta sync")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=100)
+    args = parser.parse_args()
+
+    migrate.upgrade()  # Crea las tablas si la base de datos es nueva
+    token = ensure_bench_user()
+
+    print(f"🚀 {args.requests} peticiones, concurrencia {args.concurrency}")
+    print("=" * 60)
+    for name, app in (("sync", build_sync_app()), ("async", async_app)):
+        asyncio.run(run_load(app, token, min(100, args.requests), args.concurrency))  # calentamiento
+        result = asyncio.run(run_load(app, token, args.requests, args.concurrency))
+        print(
+            f"{name:>6}: {result['rps']:8.1f} req/s | p50 {result['p50_ms']:7.2f} ms"
+            f" | p99 {result['p99_ms']:7.2f} ms | errores {result['errors']}"
+        )
+    print("=" * 60)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+"""
+Benchmark: arranque en frío de un worker.
+
+Cada repetición usa un intérprete nuevo y mide:
+- import:    `import app.main` (sin conexiones a la base de datos),
+- startup:   el lifespan de la aplicación (motores, coste de hash, tareas de fondo),
+- first_db:  la primera petición que consulta la base de datos (abre la primera conexión),
+- ready:     de lanzar `uvicorn app.main:app` a la primera respuesta 200 de `/`,
+             lo que tarda un worker nuevo en recibir tráfico al escalar.
+
+Sale con código 1 si la mediana de `ready` supera `--budget-ms`.
+Con PASSWORD_HASH_COST sin definir, `startup` incluye la calibración de bcrypt.
+
+Antes de medir aplica las migraciones pendientes (como la fase release de un despliegue).
+
+Uso:
+    python benchmarks/bench_cold_start.py --runs 5 --budget-ms 2500
+"""
+
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Se ejecuta en un proceso nuevo por repetición: los módulos no están importados
+_CHILD = r"""
+import asyncio, json, time
+start = time.perf_counter()
+from app.main import app
+imported = time.perf_counter()
+
+import httpx
+from app.core.security import create_access_token
+
+async def main():
+    async with app.router.lifespan_context(app):
+        started = time.perf_counter()
+        token = create_access_token({"sub": "cold.start@unal.edu.co"})
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            # Usuario inexistente: 401 tras consultar la base de datos
+            response = await client.get(
+                "/api/v1/auth/user", params={"email": "cold.start@unal.edu.co"},
+                headers={"Authorization": f"Bearer {token}"},
+            )
+            assert response.status_code == 401, response.text
+        return started, time.perf_counter()
+
+started, first_db = asyncio.run(main())
+print(json.dumps({"import": imported - start, "startup": started - imported, "first_db": first_db - started}))
+"""
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def in_process_phases() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", _CHILD], cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def server_ready(timeout: float = 30.0) -> float:
+    port = _free_port()
+    start = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(port),
+         "--log-level", "warning"],
+        cwd=ROOT, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE,
+    )
+    try:
+        while time.perf_counter() - start < timeout:
+            if server.poll() is not None:
+                raise RuntimeError(f"El servidor terminó al arrancar:\n{server.stderr.read().decode()}")
+            try:
+                with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except OSError:
+                time.sleep(0.01)
+        raise RuntimeError("El servidor no respondió a tiempo")
+    finally:
+        server.terminate()
+        server.wait(timeout=10)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tiempo de arranque en frío de un worker")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=2500, help="Máximo para la mediana de 'ready'")
+    args = parser.parse_args()
+
+    subprocess.run([sys.executable, "-m", "app.db.migrate"], cwd=ROOT, check=True)
+    samples = {"import": [], "startup": [], "first_db": [], "ready": []}
+    for _ in range(args.runs):
+        for phase, seconds in in_process_phases().items():
+            samples[phase].append(seconds)
+        samples["ready"].append(server_ready())
+
+    print(f"🚀 {args.runs} arranques en frío (DATABASE_URL del entorno)")
+    print("=" * 44)
+    print(f"{'fase':<12}{'mediana ms':>16}{'máx ms':>16}")
+    for phase, values in samples.items():
+        print(f"{phase:<12}{statistics.median(values) * 1000:>16.1f}{max(values) * 1000:>16.1f}")
+    print("=" * 44)
+
+    ready_ms = statistics.median(samples["ready"]) * 1000
+    if ready_ms > args.budget_ms:
+        print(f"❌ 'ready' ({ready_ms:.0f} ms) supera el presupuesto de {args.budget_ms:.0f} ms")
+        sys.exit(1)
+    print(f"✅ 'ready' ({ready_ms:.0f} ms) dentro del presupuesto de {args.budget_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark: cardinalidad de las métricas HTTP bajo un escaneo de rutas aleatorias.
+
+Envía peticiones a URLs aleatorias (como haría un escáner) mezcladas con rutas
+reales y mide, por tandas, el número de series de `http_requests_total`, el
+tamaño de la exposición de `/metrics` y la memoria Python retenida
+(tracemalloc). Con etiquetas por plantilla de ruta las tres cifras deben
+quedarse planas; con la URL cruda crecían con cada ruta nueva.
+
+Las peticiones se envían en proceso mediante ASGI, sin red.
+
+Uso:
+    python benchmarks/bench_metrics_cardinality.py --requests 20000 --rounds 5
+"""
+
+import argparse
+import asyncio
+import gc
+import os
+import sys
+import tracemalloc
+import uuid
+
+# Agregar el directorio raíz al path para importar los módulos de la app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+from prometheus_client import REGISTRY, generate_latest
+
+from app.main import app
+
+
+def series_count(metric_name: str) -> int:
+    return sum(
+        1
+        for metric in REGISTRY.collect()
+        if metric.name == metric_name
+        for sample in metric.samples
+        if sample.name == f"{metric_name}_total"
+    )
+
+
+async def flood(client: httpx.AsyncClient, requests: int, concurrency: int) -> None:
+    paths = iter(range(requests))
+
+    async def worker():
+        for i in paths:
+            if i % 10 == 0:
+                await client.get("/")
+            else:
+                # Ruta desconocida distinta en cada petición
+                await client.get(f"/wp-admin/{uuid.uuid4().hex}/{i}.php")
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def main_async(args) -> bool:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        # Calentamiento: crea las series de las rutas reales y de "unmatched"
+        await flood(client, 100, args.concurrency)
+        gc.collect()
+        tracemalloc.start()
+        baseline_memory = tracemalloc.get_traced_memory()[0]
+
+        print(f"{'tanda':>6}{'peticiones':>12}{'series':>8}{'/metrics KiB':>14}{'memoria KiB':>13}")
+        memories = []
+        for round_no in range(1, args.rounds + 1):
+            await flood(client, args.requests, args.concurrency)
+            gc.collect()
+            memory = (tracemalloc.get_traced_memory()[0] - baseline_memory) / 1024
+            memories.append(memory)
+            exposition = len(generate_latest()) / 1024
+            print(
+                f"{round_no:>6}{round_no * args.requests:>12}{series_count('http_requests'):>8}"
+                f"{exposition:>14.1f}{memory:>13.1f}"
+            )
+        tracemalloc.stop()
+
+    # Memoria plana: la última tanda no retiene mucho más que la primera
+    growth = memories[-1] - memories[0]
+    flat = growth < args.max_growth_kib
+    print(f"\nCrecimiento entre la primera y la última tanda: {growth:.1f} KiB "
+          f"({'plano' if flat else 'CRECE'}, umbral {args.max_growth_kib} KiB)")
+    return flat
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cardinalidad de métricas bajo rutas aleatorias")
+    parser.add_argument("--requests", type=int, default=5000, help="Peticiones por tanda")
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--max-growth-kib", type=float, default=256.0)
+    args = parser.parse_args()
+    if not asyncio.run(main_async(args)):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
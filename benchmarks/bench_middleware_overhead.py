@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+"""
+Benchmark: coste por petición de la pila de middlewares.
+
+Compara, sobre las mismas rutas:
+- "anterior": middleware de métricas con `app.middleware("http")`
+              (BaseHTTPMiddleware) y CORS con comodines en todo.
+- "actual":   la aplicación real, con `PrometheusMiddleware` ASGI puro y CORS
+              construido desde la configuración.
+
+Las peticiones se envían en serie llamando directamente a la aplicación ASGI
+(sin red ni cliente HTTP), con cabecera Origin para que CORS intervenga, en
+`/` y en `/api/v1/auth/user` (token validado).
+
+Uso:
+    python benchmarks/bench_middleware_overhead.py --requests 5000
+"""
+
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+# Agregar el directorio raíz al path para importar los módulos de la app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import FastAPI, Request
+from fastapi.middleware.cors import CORSMiddleware
+
+from app.main import app as current_app
+from app.core import security
+from app.crud import user as crud_user
+from app.db import migrate
+from app.db.database import SessionLocal
+from app.db.models import User, UserRole
+from app.metrics.prometheus import ERROR_COUNT, REQUEST_COUNT, REQUEST_LATENCY, _endpoint_label
+
+BENCH_EMAIL = "bench.user@unal.edu.co"
+
+
+def build_previous_app() -> FastAPI:
+    """Las mismas rutas y manejadores con la pila de middlewares anterior."""
+    previous_app = FastAPI()
+    previous_app.router.routes.extend(current_app.router.routes)
+    previous_app.exception_handlers.update(current_app.exception_handlers)
+
+    async def prometheus_middleware(request: Request, call_next):
+        start_time = time.perf_counter()
+        status_code = 500
+        try:
+            response = await call_next(request)
+            status_code = response.status_code
+        finally:
+            endpoint = _endpoint_label(request.scope)
+            REQUEST_LATENCY.labels(endpoint=endpoint).observe(time.perf_counter() - start_time)
+            REQUEST_COUNT.labels(method=request.method, endpoint=endpoint, http_status=status_code).inc()
+            if status_code >= 400:
+                ERROR_COUNT.labels(endpoint=endpoint, status=str(status_code)).inc()
+        return response
+
+    previous_app.middleware("http")(prometheus_middleware)
+    previous_app.add_middleware(
+        CORSMiddleware,
+        allow_origins=["*"],
+        allow_credentials=True,
+        allow_methods=["*"],
+        allow_headers=["*"],
+        expose_headers=["*"],
+    )
+    return previous_app
+
+
+def ensure_bench_user() -> str:
+    """Crea el usuario de benchmark si no existe y devuelve un token para él."""
+    db = SessionLocal()
+    try:
+        if not crud_user.get_user_by_email(db, BENCH_EMAIL):
+            db.add(User(
+                name="Bench User",
+                email=BENCH_EMAIL,
+                hashed_password=security.get_password_hash("bench123456"),
+                role=UserRole.estudiante.value,
+            ))
+            db.commit()
+    finally:
+        db.close()
+    return security.create_access_token({"sub": BENCH_EMAIL, "role": UserRole.estudiante.value})
+
+
+async def call(app, path: str, query: bytes, headers: list) -> int:
+    """Ejecuta una petición GET directamente sobre la aplicación ASGI."""
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": path, "raw_path": path.encode(), "root_path": "",
+        "query_string": query, "headers": headers, "client": ("127.0.0.1", 50000),
+        "server": ("bench", 80),
+    }
+    status = 0
+    request_sent = False
+    response_done = asyncio.Event()
+
+    async def receive():
+        nonlocal request_sent
+        if not request_sent:
+            request_sent = True
+            return {"type": "http.request", "body": b"", "more_body": False}
+        # Como un servidor real: la desconexión solo llega tras terminar la respuesta
+        await response_done.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+        elif message["type"] == "http.response.body" and not message.get("more_body", False):
+            response_done.set()
+
+    await app(scope, receive, send)
+    return status
+
+
+async def measure(app, path: str, query: bytes, headers: list, requests: int) -> list:
+    latencies = []
+    for _ in range(requests):
+        start = time.perf_counter()
+        status = await call(app, path, query, headers)
+        latencies.append(time.perf_counter() - start)
+        if status != 200:
+            raise RuntimeError(f"{path} respondió {status}")
+    return latencies
+
+
+async def main_async(args) -> None:
+    token = ensure_bench_user()
+    origin = [(b"origin", b"https://unxchange.example")]
+    cases = [
+        ("/", b"", origin),
+        ("/api/v1/auth/user", f"email={BENCH_EMAIL}".encode(), origin + [(b"authorization", f"Bearer {token}".encode())]),
+    ]
+    apps = [("anterior", build_previous_app()), ("actual", current_app)]
+
+    print(f"🚀 {args.requests} peticiones en serie por caso")
+    print("=" * 72)
+    print(f"{'ruta':<22}{'pila':<10}{'media µs':>12}{'p50 µs':>12}{'p99 µs':>12}")
+    for path, query, headers in cases:
+        means = {}
+        for name, app in apps:
+            await measure(app, path, query, headers, min(500, args.requests))  # calentamiento
+            latencies = await measure(app, path, query, headers, args.requests)
+            quantiles = statistics.quantiles(latencies, n=100)
+            means[name] = statistics.fmean(latencies)
+            print(
+                f"{path:<22}{name:<10}{means[name] * 1e6:>12.1f}"
+                f"{quantiles[49] * 1e6:>12.1f}{quantiles[98] * 1e6:>12.1f}"
+            )
+        saved = means["anterior"] - means["actual"]
+        print(f"{'':<22}{'ahorro':<10}{saved * 1e6:>12.1f} µs/petición ({saved / means['anterior']:.1%})")
+    print("=" * 72)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coste por petición de la pila de middlewares")
+    parser.add_argument("--requests", type=int, default=5000)
+    args = parser.parse_args()
+
+    migrate.upgrade()  # Crea las tablas si la base de datos es nueva
+    asyncio.run(main_async(args))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark: coste de verificar un token de acceso.
+
+Compara, con el algoritmo configurado (ALGORITHM, JWT_KEYS_DIR):
+- python-jose sin caché (el comportamiento anterior),
+- PyJWT sin caché (JWT_BACKEND=pyjwt), si está instalado,
+- `decode_access_token` con la caché de tokens verificados caliente,
+- `decode_access_token` con un token inválido (caché negativa).
+
+Cada token se verifica en serie en el mismo proceso, sin HTTP.
+
+Uso:
+    python benchmarks/bench_token_verify.py --iterations 20000
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import time
+
+# Agregar el directorio raíz al path para importar los módulos de la app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from datetime import timedelta
+
+from jose import JWTError
+
+from app.core import security
+from app.core.config import settings
+from app.core.jwt_backend import JoseBackend, PyJWTBackend
+from app.core.keys import key_ring
+
+
+def measure(fn, iterations: int) -> list:
+    latencies = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        fn()
+        latencies.append(time.perf_counter() - start)
+    return latencies
+
+
+def uncached(backend, token: str):
+    def verify():
+        key = key_ring.verification_key(backend.get_unverified_header(token).get("kid"))
+        backend.decode(token, key, settings.ALGORITHM)
+    return verify
+
+
+def rejected(token: str):
+    def verify():
+        try:
+            security.decode_access_token(token)
+        except JWTError:
+            pass
+    return verify
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coste de verificar un token de acceso")
+    parser.add_argument("--iterations", type=int, default=20000)
+    args = parser.parse_args()
+
+    token = security.create_access_token(
+        {"sub": "bench.user@unal.edu.co", "role": "estudiante", "uid": 1, "ver": "0" * 16},
+        expires_delta=timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES),
+    )
+    cases = [("python-jose", uncached(JoseBackend(), token))]
+    try:
+        cases.append(("PyJWT", uncached(PyJWTBackend(), token)))
+    except RuntimeError as e:
+        print(f"⚠️  {e}: se omite")
+    if security.token_cache is not None:
+        cases.append(("caché (acierto)", lambda: security.decode_access_token(token)))
+        cases.append(("caché (negativa)", rejected(token[:-4] + "AAAA")))
+    else:
+        print("⚠️  TOKEN_CACHE_SIZE=0: se omite la caché")
+
+    print(f"🚀 {args.iterations} verificaciones por caso, {settings.ALGORITHM}")
+    print("=" * 64)
+    print(f"{'caso':<20}{'media µs':>12}{'p50 µs':>12}{'p99 µs':>12}{'x':>8}")
+    reference = None
+    for name, fn in cases:
+        measure(fn, min(1000, args.iterations))  # calentamiento
+        latencies = measure(fn, args.iterations)
+        quantiles = statistics.quantiles(latencies, n=100)
+        mean = statistics.fmean(latencies)
+        reference = reference or mean
+        print(
+            f"{name:<20}{mean * 1e6:>12.1f}{quantiles[49] * 1e6:>12.1f}"
+            f"{quantiles[98] * 1e6:>12.1f}{reference / mean:>8.1f}"
+        )
+    print("=" * 64)
+
+
+if __name__ == "__main__":
+    main()
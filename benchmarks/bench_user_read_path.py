@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark de la ruta de lectura de usuarios.
+
+Compara, para una página de N usuarios:
+- "orm":        carga modelos User completos, valida cada uno con UserOut y
+                serializa con json (lo que hacía FastAPI con response_model).
+- "proyectada": selecciona solo id, name, email y role como filas ligeras y
+                serializa directamente a bytes con orjson (app/crud/user.py).
+
+Usa una base SQLite en memoria propia para medir solo el coste en Python.
+Reporta filas/segundo y el pico de memoria asignada (tracemalloc).
+
+Uso:
+    python benchmarks/bench_user_read_path.py --rows 50000
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+# Agregar el directorio raíz al path para importar los módulos de la app
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import orjson
+from sqlalchemy import create_engine, insert, select
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import StaticPool
+
+from app.api.v1 import schemas
+from app.crud import user as crud_user
+from app.db.database import Base
+from app.db.models import User, UserRole
+
+
+def build_session(rows: int) -> Session:
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(bind=engine)
+    roles = [role.value for role in UserRole]
+    with engine.begin() as conn:
+        conn.execute(insert(User), [
+            {
+                "name": f"Usuario {i}",
+                "email": f"usuario{i}@unal.edu.co",
+                "hashed_password": "$2b$12$" + "x" * 53,
+                "role": roles[i % len(roles)],
+            }
+            for i in range(rows)
+        ])
+    return Session(bind=engine)
+
+
+def orm_path(db: Session, rows: int) -> bytes:
+    users = db.execute(select(User).limit(rows)).scalars().all()
+    payload = [schemas.UserOut.model_validate(user).model_dump(mode="json") for user in users]
+    db.expunge_all()
+    return json.dumps(payload).encode()
+
+
+def projected_path(db: Session, rows: int) -> bytes:
+    return orjson.dumps(crud_user.get_users_page(db, limit=rows))
+
+
+def measure(fn, db: Session, rows: int, repeat: int) -> dict:
+    fn(db, rows)  # calentamiento
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(db, rows)
+        best = min(best, time.perf_counter() - start)
+
+    tracemalloc.start()
+    fn(db, rows)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"rows_per_sec": rows / best, "peak_kib": peak / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compara la lectura ORM con la lectura proyectada")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    db = build_session(args.rows)
+    print(f"🚀 {args.rows} filas, mejor de {args.repeat} repeticiones")
+    print("=" * 60)
+    results = {}
+    for name, fn in (("orm", orm_path), ("proyectada", projected_path)):
+        results[name] = measure(fn, db, args.rows, args.repeat)
+        print(
+            f"{name:>11}: {results[name]['rows_per_sec']:12.0f} filas/s"
+            f" | pico de memoria {results[name]['peak_kib']:10.0f} KiB"
+        )
+    print("=" * 60)
+    speedup = results["proyectada"]["rows_per_sec"] / results["orm"]["rows_per_sec"]
+    memory = results["orm"]["peak_kib"] / results["proyectada"]["peak_kib"]
+    print(f"📊 Proyectada: {speedup:.1f}x más filas/s y {memory:.1f}x menos memoria pico")
+
+
+if __name__ == "__main__":
+    main()
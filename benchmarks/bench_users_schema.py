@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+Esquema de la tabla users: planes de consulta y coste de escritura.
+
+Migra dos bases SQLite temporales, una hasta la revisión 0001 (índices sobre
+id, name y email, más las columnas que se añadieron después) y otra hasta la
+última, y en cada una:
+- inserta N usuarios por lotes y mide filas/segundo y tamaño en disco,
+- ejecuta las búsquedas por email de la aplicación (login, perfil, identidad
+  del token, introspección por lotes, deduplicación de la importación),
+  captura el SQL que emiten y muestra su plan (EXPLAIN QUERY PLAN) y su latencia.
+
+En 0001 las mismas consultas (que no distinguen mayúsculas) no tienen índice
+y recorren la tabla. Con el esquema actual cada búsqueda debe ser una sola
+búsqueda en ix_users_email_lower; si no, sale con código 1.
+
+Uso:
+    python benchmarks/bench_users_schema.py --rows 50000
+"""
+
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(ROOT)
+
+INDEX = "ix_users_email_lower"
+ROLES = ("estudiante", "profesional", "administrador")
+
+
+def seed(path: str, rows: int, batch_size: int = 5000) -> float:
+    """Inserta `rows` usuarios y devuelve filas/segundo."""
+    conn = sqlite3.connect(path)
+    start = time.perf_counter()
+    for first in range(0, rows, batch_size):
+        conn.executemany(
+            "INSERT INTO users (name, email, hashed_password, role) VALUES (?, ?, ?, ?)",
+            [
+                (f"Usuario {i}", f"Usuario.{i}@unal.edu.co", "$2b$12$" + "x" * 53, ROLES[i % len(ROLES)])
+                for i in range(first, min(rows, first + batch_size))
+            ],
+        )
+        conn.commit()
+    elapsed = time.perf_counter() - start
+    conn.close()
+    return rows / elapsed
+
+
+async def capture_lookups(emails: list) -> list:
+    """Ejecuta las búsquedas por email de la aplicación y devuelve (nombre, sql, parámetros)."""
+    from sqlalchemy import event
+
+    from app.core import security
+    from app.crud import user as crud_user
+    from app.crud import user_import
+    from app.db import database, models
+
+    captured = []
+
+    def record(conn, cursor, statement, parameters, context, executemany):
+        captured.append((statement, parameters))
+
+    event.listen(database.get_engine(), "before_cursor_execute", record)
+    event.listen(database.get_async_engine().sync_engine, "before_cursor_execute", record)
+
+    queries = []
+
+    def take(name):
+        statement, parameters = captured[-1]
+        queries.append((name, statement, parameters))
+
+    async with database.AsyncSessionLocal() as db:
+        await crud_user.get_user_by_email_async(db, emails[0].upper())
+        take("login")
+        await crud_user.get_user_out_by_email_async(db, emails[1])
+        take("perfil (/user)")
+        await security._load_principal(db, emails[2])
+        take("identidad del token")
+        await security._load_principals(db, emails[:50])
+        take("introspección (50)")
+    with database.SessionLocal() as db:
+        user_import._existing_emails(db, [models.normalize_email(email) for email in emails[:50]])
+        take("importación (50)")
+    await database.dispose_engines()
+    return queries
+
+
+def explain(path: str, statement: str, parameters) -> list:
+    conn = sqlite3.connect(path)
+    try:
+        return [row[3] for row in conn.execute("EXPLAIN QUERY PLAN " + statement, parameters)]
+    finally:
+        conn.close()
+
+
+def latency(path: str, statement: str, parameters, iterations: int) -> float:
+    conn = sqlite3.connect(path)
+    try:
+        latencies = []
+        for _ in range(iterations):
+            start = time.perf_counter()
+            conn.execute(statement, parameters).fetchall()
+            latencies.append(time.perf_counter() - start)
+        return statistics.median(latencies)
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Planes de consulta y coste de escritura de la tabla users")
+    parser.add_argument("--rows", type=int, default=50000)
+    parser.add_argument("--iterations", type=int, default=200, help="Repeticiones por búsqueda")
+    args = parser.parse_args()
+
+    tmpdir = tempfile.mkdtemp(prefix="bench-users-")
+    paths = {revision: os.path.join(tmpdir, f"{revision}.db") for revision in ("0001", "head")}
+    # La aplicación usa la base de datos con el esquema actual, sin cachés de usuarios
+    os.environ["DATABASE_URL"] = f"sqlite:///{paths['head']}"
+    os.environ.setdefault("SECRET_KEY", "bench-users-schema")
+    os.environ["USER_CACHE_TTL"] = "0"
+
+    from app.db import migrate
+
+    print(f"🚀 {args.rows} usuarios por esquema")
+    print("=" * 72)
+    print(f"{'esquema':<10}{'índices':>10}{'inserción filas/s':>22}{'tamaño KiB':>14}")
+    for revision, path in paths.items():
+        migrate.upgrade(revision, f"sqlite:///{path}")
+        if revision != "head":
+            # Columnas posteriores que las consultas de la aplicación leen pero que no tienen índice
+            with sqlite3.connect(path) as conn:
+                conn.execute("ALTER TABLE users ADD COLUMN credential_version INTEGER NOT NULL DEFAULT 1")
+        rate = seed(path, args.rows)
+        with sqlite3.connect(path) as conn:
+            indexes = conn.execute(
+                "SELECT count(*) FROM sqlite_master WHERE type = 'index' AND tbl_name = 'users'"
+            ).fetchone()[0]
+        print(f"{revision:<10}{indexes + 1:>10}{rate:>22.0f}{os.path.getsize(path) // 1024:>14}")
+
+    # Del final de la tabla hacia atrás: sin índice, un recorrido completo hasta encontrarlos
+    emails = [f"Usuario.{i}@unal.edu.co" for i in range(args.rows - 1, -1, -max(1, args.rows // 60))]
+    queries = asyncio.run(capture_lookups(emails))
+
+    failures = []
+    print("=" * 72)
+    for name, statement, parameters in queries:
+        print(f"{name}")
+        for revision, path in paths.items():
+            plan = explain(path, statement, parameters)
+            seconds = latency(path, statement, parameters, args.iterations)
+            print(f"  {revision:<8}{seconds * 1e6:>10.1f} µs  {' | '.join(plan)}")
+            if revision == "head" and (len(plan) != 1 or INDEX not in plan[0] or plan[0].startswith("SCAN")):
+                failures.append(name)
+    print("=" * 72)
+
+    if failures:
+        print(f"❌ Búsquedas que no usan solo {INDEX}: {', '.join(failures)}")
+        sys.exit(1)
+    print(f"✅ Todas las búsquedas por email son una sola búsqueda en {INDEX}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# gunicorn.conf.py
+"""
+Configuración de gunicorn (la carga el Procfile).
+
+Activa el modo multiproceso de prometheus_client: cada worker escribe sus
+métricas en archivos mmap de PROMETHEUS_MULTIPROC_DIR y `/metrics` devuelve el
+agregado de todos los workers, sin importar cuál atienda el scrape.
+
+Si PASSWORD_HASH_COST no está definido, el maestro calibra el coste del hash de
+contraseñas una vez al arrancar y todos los workers lo heredan.
+"""
+import os
+import shutil
+import tempfile
+
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Proxies de confianza (IPs separadas por comas, o "*"): solo de ellos se acepta
+# X-Forwarded-For, así `request.client.host` (y el límite de login por IP) es la IP
+# del cliente y no la del proxy. uvicorn sin gunicorn lee la misma variable.
+forwarded_allow_ips = os.environ.get("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+# Debe definirse antes de que los workers importen prometheus_client.
+# No usar preload_app: la aplicación tiene que importarse en cada worker.
+multiproc_dir = os.environ.setdefault(
+    "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "unxchange-auth-metrics")
+)
+
+
+def on_starting(server):
+    # Descarta las métricas de una ejecución anterior: los contadores empiezan en cero
+    shutil.rmtree(multiproc_dir, ignore_errors=True)
+    os.makedirs(multiproc_dir, exist_ok=True)
+    _calibrate_password_cost(server)
+
+
+def _calibrate_password_cost(server):
+    # Una sola calibración por despliegue (en el maestro, antes de crear los workers):
+    # todos los workers, también los que se reinician, usan el mismo coste y no pagan
+    # la calibración al arrancar. Con PASSWORD_HASH_COST definido no hace nada.
+    from app.core.config import settings
+
+    if settings.PASSWORD_HASH_COST is not None:
+        return
+    from app.core.password_cost import calibrate_password_cost
+
+    cost = calibrate_password_cost(settings.PASSWORD_HASH_SCHEME, settings.PASSWORD_HASH_TARGET_MS / 1000)
+    # Los workers heredan tanto el entorno como el módulo de configuración ya importado
+    os.environ["PASSWORD_HASH_COST"] = str(cost)
+    settings.PASSWORD_HASH_COST = cost
+    server.log.info(f"Coste de {settings.PASSWORD_HASH_SCHEME} calibrado en {cost} para todos los workers")
+
+
+def child_exit(server, worker):
+    # Los gauges "live*" dejan de incluir al worker terminado
+    from prometheus_client import multiprocess
+
+    multiprocess.mark_process_dead(worker.pid)
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Script para importar usuarios de forma masiva desde un archivo CSV o NDJSON.
+
+CSV: cabecera `name,email,password,role` (role es opcional).
+NDJSON: un objeto JSON por línea con los mismos campos.
+
+Uso:
+    python import_users.py usuarios.csv
+    python import_users.py usuarios.ndjson --batch-size 2000 --workers 8
+"""
+
+import argparse
+import os
+import sys
+
+# Agregar el directorio raíz al path para importar los módulos de la app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.core.security import configure_password_hashing
+from app.db.database import SessionLocal
+from app.crud.user_import import import_users, parse_rows
+
+
+def main():
+    """Función principal del script."""
+    parser = argparse.ArgumentParser(description="Importación masiva de usuarios")
+    parser.add_argument("file", help="Archivo CSV o NDJSON")
+    parser.add_argument("--format", choices=["csv", "ndjson"], help="Por defecto se deduce de la extensión")
+    parser.add_argument("--batch-size", type=int, default=1000, help="Filas por transacción")
+    parser.add_argument("--workers", type=int, default=None, help="Procesos para hashear (por defecto, uno por núcleo)")
+    args = parser.parse_args()
+
+    fmt = args.format or ("ndjson" if args.file.endswith((".ndjson", ".jsonl")) else "csv")
+    with open(args.file, encoding="utf-8-sig") as f:
+        content = f.read()
+
+    print(f"🚀 Importando usuarios desde {args.file} ({fmt})...")
+    print("=" * 50)
+
+    # Mismo coste de hash que la API (calibrado o PASSWORD_HASH_COST); los procesos del pool lo heredan
+    configure_password_hashing()
+    db = SessionLocal()
+    try:
+        report = import_users(db, parse_rows(content, fmt), batch_size=args.batch_size, workers=args.workers)
+    except Exception as e:
+        print(f"❌ Error fatal: {e}")
+        sys.exit(1)
+    finally:
+        db.close()
+
+    for error in report.errors:
+        print(f"   ⚠️  Fila {error.row} ({error.email or '-'}): {error.error}")
+    print(f"✅ Creados: {report.created} de {report.total} | ❌ Con error: {report.failed}")
+    print(f"⏱️  {report.elapsed_seconds:.2f} s | 📊 {report.users_per_sec:.1f} usuarios/s")
+    print("=" * 50)
+
+
+if __name__ == "__main__":
+    main()
@@ -6,14 +6,18 @@ Este archivo debe ser agregado al microservicio de autenticación (backend-auth-
 
 import requests
 import logging
-from typing import Optional
+from typing import List, Optional
 
 logger = logging.getLogger(__name__)
 
 class AuthNotificationClient:
-    def __init__(self, base_url: str = "http://backend-notifications:8001"):
+    def __init__(self, base_url: str = "http://backend-notifications:8001", timeout: float = 30):
         self.base_url = base_url
         self.graphql_url = f"{base_url}/api/v1/notification/graphql"
+        self.timeout = timeout
+        # Sesión con pool de conexiones keep-alive, reutilizada entre peticiones
+        self.session = requests.Session()
+        self.session.headers.update({"Content-Type": "application/json"})
     
     def create_user_with_welcome(self, user_id: int, user_name: str, user_email: str, user_role: str = "estudiante") -> Optional[dict]:
         """
@@ -66,12 +70,7 @@ class AuthNotificationClient:
         try:
             logger.info(f"Enviando notificación GraphQL para usuario ID {user_id}: {user_email}")
             
-            response = requests.post(
-                self.graphql_url,
-                json=payload,
-                timeout=30,
-                headers={"Content-Type": "application/json"}
-            )
+            response = self.session.post(self.graphql_url, json=payload, timeout=self.timeout)
             
             response.raise_for_status()
             result = response.json()
@@ -92,6 +91,75 @@ class AuthNotificationClient:
             logger.error(f"Error inesperado al notificar creación de usuario {user_email}: {e}")
             return None
 
+    def create_users_with_welcome(self, users: List[dict]) -> List[Optional[str]]:
+        """
+        Envía varias mutaciones createUserWithWelcome en una sola petición GraphQL,
+        usando un alias por usuario.
+
+        Args:
+            users: Lista de dicts con id, name, email y role
+
+        Returns:
+            Una entrada por usuario: None si se notificó, o el mensaje de error
+        """
+        if not users:
+            return []
+
+        try:
+            response = self.session.post(self.graphql_url, json=build_welcome_batch(users), timeout=self.timeout)
+            response.raise_for_status()
+            result = response.json()
+        except (requests.exceptions.RequestException, ValueError) as e:
+            logger.error(f"Error al enviar lote de {len(users)} notificaciones: {e}")
+            return [str(e)] * len(users)
+        return parse_welcome_batch(result, len(users))
+
+
+def build_welcome_batch(users: List[dict]) -> dict:
+    """
+    Construye el cuerpo de una petición GraphQL con una mutación
+    createUserWithWelcome por usuario, con alias u0, u1, ...
+    """
+    variables = {}
+    declarations = []
+    fields = []
+    for i, user in enumerate(users):
+        variables[f"input{i}"] = {
+            "id": user["id"],
+            "name": user["name"],
+            "email": user["email"],
+            "role": user.get("role", "estudiante").upper()
+        }
+        declarations.append(f"$input{i}: UserInput!")
+        fields.append(
+            f"u{i}: createUserWithWelcome(input: $input{i}) {{ welcomeEmail {{ success message }} }}"
+        )
+    mutation = f"mutation CreateUsersWithWelcome({', '.join(declarations)}) {{ {' '.join(fields)} }}"
+    return {"query": mutation, "variables": variables}
+
+
+def parse_welcome_batch(result: dict, count: int) -> List[Optional[str]]:
+    """
+    Traduce la respuesta de `build_welcome_batch` a una entrada por usuario:
+    None si se notificó, o el mensaje de error.
+    """
+    # Los errores GraphQL indican en `path` el alias de la mutación que falló
+    errors_by_alias = {}
+    for error in result.get("errors") or []:
+        path = error.get("path") or []
+        alias = path[0] if path else None
+        errors_by_alias[alias] = error.get("message", "Error GraphQL")
+
+    data = result.get("data") or {}
+    outcomes = []
+    for i in range(count):
+        alias = f"u{i}"
+        if data.get(alias) is not None and alias not in errors_by_alias:
+            outcomes.append(None)
+        else:
+            outcomes.append(errors_by_alias.get(alias) or errors_by_alias.get(None) or "Sin respuesta")
+    return outcomes
+
 # Instancia global del cliente
 auth_notification_client = AuthNotificationClient()
 
@@ -264,18 +264,9 @@ class DatabaseManager:
         print("\n📋 Creando tablas y datos de prueba...")
         
         try:
-            # Ejecutar el backend brevemente para crear tablas
-            print("   Iniciando backend para crear tablas...")
-            process = subprocess.Popen([
-                sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", "8081"
-            ], stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-            
-            # Esperar unos segundos para que se inicialice
-            time.sleep(5)
-            
-            # Terminar el proceso
-            process.terminate()
-            process.wait(timeout=5)
+            # Aplicar las migraciones (la aplicación ya no crea las tablas al arrancar)
+            print("   Aplicando migraciones...")
+            subprocess.run([sys.executable, "-m", "app.db.migrate"], check=True, timeout=60)
             
             print("   ✅ Tablas creadas")
             
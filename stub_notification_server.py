@@ -0,0 +1,91 @@
+# stub_notification_server.py
+"""
+Servidor GraphQL de prueba que imita al microservicio de notificaciones.
+
+Responde a las mutaciones createUserWithWelcome (sueltas o en lote con alias)
+sin enviar correos, y permite simular latencia, errores y caídas para probar
+el outbox, los timeouts y el circuit breaker sin levantar backend-notifications.
+
+Uso:
+    python stub_notification_server.py --port 8001
+    python stub_notification_server.py --port 8001 --latency 0.2 --fail-rate 0.3
+    python stub_notification_server.py --port 8001 --status 503
+
+Luego arranca la API con NOTIFICATIONS_URL=http://localhost:8001.
+"""
+import argparse
+import json
+import random
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+GRAPHQL_PATH = "/api/v1/notification/graphql"
+
+
+def make_handler(latency: float, fail_rate: float, status: int, verbose: bool):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # Mantiene las conexiones keep-alive como el servicio real
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if self.path != GRAPHQL_PATH:
+                return self._reply(404, {"detail": "Not Found"})
+            if latency:
+                time.sleep(latency)
+            if status != 200:
+                return self._reply(status, {"detail": "Servicio no disponible (simulado)"})
+
+            variables = json.loads(body).get("variables") or {}
+            data, errors = {}, []
+            # Lote: input0, input1, ... con alias u0, u1, ...; mutación suelta: input
+            inputs = {f"u{key[5:]}" if key != "input" else "createUserWithWelcome": value
+                      for key, value in variables.items() if key.startswith("input")}
+            for alias, user in inputs.items():
+                if random.random() < fail_rate:
+                    data[alias] = None
+                    errors.append({"message": f"Fallo simulado para {user.get('email')}", "path": [alias]})
+                else:
+                    data[alias] = {
+                        "user": user,
+                        "welcomeEmail": {"success": True, "message": "Correo simulado", "timestamp": time.time()},
+                        "totalUsers": 0,
+                    }
+            if verbose:
+                print(f"Lote de {len(inputs)} notificaciones, {len(errors)} fallidas", flush=True)
+            self._reply(200, {"data": data, "errors": errors} if errors else {"data": data})
+
+        def _reply(self, code: int, payload: dict):
+            out = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(out)))
+            self.end_headers()
+            self.wfile.write(out)
+
+        def log_message(self, format, *args):
+            pass
+
+    return StubHandler
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor GraphQL de prueba para las notificaciones")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8001)
+    parser.add_argument("--latency", type=float, default=0.0, help="Segundos de espera por petición")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fracción de mutaciones que fallan (0-1)")
+    parser.add_argument("--status", type=int, default=200, help="Código HTTP fijo, p. ej. 503 para simular una caída")
+    parser.add_argument("--quiet", action="store_true")
+    args = parser.parse_args()
+
+    handler = make_handler(args.latency, args.fail_rate, args.status, not args.quiet)
+    server = ThreadingHTTPServer((args.host, args.port), handler)
+    print(f"Stub de notificaciones escuchando en http://{args.host}:{args.port}{GRAPHQL_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
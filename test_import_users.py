@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Pruebas de la importación masiva ante un registro concurrente.
+
+Un alta por la API puede ocupar un email entre la deduplicación de un lote y su
+inserción. El lote debe fallar entero, deshacerse y reintentarse fila a fila:
+solo la fila duplicada se reporta como error.
+
+- test_copy_duplicate_falls_back: fuerza la rama COPY con un cursor que se
+  comporta como el de psycopg2 (confirma el duplicado desde otra sesión y lanza
+  psycopg2.errors.UniqueViolation); funciona con cualquier DATABASE_URL.
+- test_copy_duplicate_postgresql: lo mismo con COPY real; solo con PostgreSQL.
+
+Uso:
+    python test_import_users.py
+    python -m pytest test_import_users.py
+"""
+
+import os
+import sys
+import tempfile
+import uuid
+
+# Agregar el directorio raíz al path para importar los módulos de la app
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("DATABASE_URL", f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'import.db')}")
+os.environ.setdefault("SECRET_KEY", "test-import-users")
+os.environ.setdefault("PASSWORD_HASH_COST", "10")
+
+import psycopg2
+import psycopg2.errors
+
+from app.crud import user_import
+from app.db import migrate, models
+from app.db.database import SessionLocal
+
+migrate.upgrade()
+
+
+def _rows(prefix: str, count: int = 3):
+    return [
+        (line_no, {"name": f"Usuario {line_no}", "email": f"{prefix}.{line_no}@unal.edu.co", "password": "clave123456"})
+        for line_no in range(1, count + 1)
+    ]
+
+
+def _register(email: str) -> None:
+    """Alta desde otra sesión, como un registro concurrente por la API."""
+    with SessionLocal() as other:
+        other.add(models.User(name="Concurrente", email=email, hashed_password="x", role="estudiante"))
+        other.commit()
+
+
+def _hash_passwords(passwords):
+    return [f"hash-{password}" for password in passwords]
+
+
+def _check_report(db, report, prefix: str) -> None:
+    assert report.created == 2, report
+    assert [(error.row, error.error) for error in report.errors] == [(2, "Email already registered")], report
+    emails = {
+        email for (email,) in db.query(models.User.email).filter(models.User.email.like(f"{prefix}.%"))
+    }
+    assert emails == {f"{prefix}.1@unal.edu.co", f"{prefix}.2@unal.edu.co", f"{prefix}.3@unal.edu.co"}, emails
+
+
+class _CopyCursor:
+    """Cursor de psycopg2 simulado: COPY choca con el registro concurrente."""
+
+    def __init__(self, duplicate: str):
+        self.duplicate = duplicate
+
+    def copy_expert(self, statement, buffer):
+        _register(self.duplicate)
+        raise psycopg2.errors.UniqueViolation(
+            'duplicate key value violates unique constraint "ix_users_email_lower"'
+        )
+
+    def close(self):
+        pass
+
+
+class _CopyConnection:
+    def __init__(self, duplicate: str):
+        self.connection = self
+        self.dialect = self
+        self.loaded_dbapi = psycopg2
+        self._duplicate = duplicate
+
+    def cursor(self):
+        return _CopyCursor(self._duplicate)
+
+
+def test_copy_duplicate_falls_back():
+    prefix = f"copy-{uuid.uuid4().hex[:8]}"
+    duplicate = f"{prefix}.2@unal.edu.co"
+    original = user_import._uses_copy
+    user_import._uses_copy = lambda db: True
+    try:
+        with SessionLocal() as db:
+            # Solo la inserción del lote pasa por el cursor simulado; el reintento fila a fila usa la sesión
+            db.connection = lambda: _CopyConnection(duplicate)
+            report = user_import.import_users(db, _rows(prefix), hash_passwords=_hash_passwords)
+            del db.connection
+            _check_report(db, report, prefix)
+    finally:
+        user_import._uses_copy = original
+
+
+def test_copy_duplicate_postgresql():
+    if not os.environ["DATABASE_URL"].startswith("postgresql"):
+        if "pytest" in sys.modules:
+            sys.modules["pytest"].skip("Requiere DATABASE_URL de PostgreSQL")
+        print("   ⏭️  Requiere DATABASE_URL de PostgreSQL")
+        return
+
+    prefix = f"copy-pg-{uuid.uuid4().hex[:8]}"
+    original = user_import._existing_emails
+
+    def existing_then_register(db, emails):
+        existing = original(db, emails)
+        _register(f"{prefix}.2@unal.edu.co")  # Entre la deduplicación y el COPY
+        return existing
+
+    user_import._existing_emails = existing_then_register
+    try:
+        with SessionLocal() as db:
+            report = user_import.import_users(db, _rows(prefix), hash_passwords=_hash_passwords)
+            _check_report(db, report, prefix)
+    finally:
+        user_import._existing_emails = original
+
+
+if __name__ == "__main__":
+    print("🧪 Importación con un registro concurrente")
+    print("=" * 50)
+    for test in (test_copy_duplicate_falls_back, test_copy_duplicate_postgresql):
+        test()
+        print(f"✅ {test.__name__}")
+    print("=" * 50)
@@ -13,7 +13,7 @@ from sqlalchemy.exc import IntegrityError
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.db.database import SessionLocal
-from app.db.models import User, UserRole
+from app.db.models import USER_EMAIL_KEY, User, UserRole, normalize_email
 from app.core.security import get_password_hash
 
 def create_test_users():
@@ -61,7 +61,7 @@ def create_test_users():
         
         for user_data in test_users:
             # Verificar si el usuario ya existe
-            existing_user = db.query(User).filter(User.email == user_data["email"]).first()
+            existing_user = db.query(User).filter(USER_EMAIL_KEY == normalize_email(user_data["email"])).first()
             
             if existing_user:
                 print(f"⚠️  Usuario {user_data['email']} ya existe. Saltando...")
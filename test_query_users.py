@@ -13,7 +13,7 @@ from sqlalchemy import func
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from app.db.database import SessionLocal
-from app.db.models import User, UserRole
+from app.db.models import USER_EMAIL_KEY, User, UserRole, normalize_email
 from app.core.security import verify_password
 
 def test_user_queries():
@@ -57,7 +57,7 @@ def test_user_queries():
         # 4. Buscar usuario específico por email
         print(f"\n🔎 BÚSQUEDA POR EMAIL:")
         test_email = "ana.garcia@unxchange.com"
-        user_found = db.query(User).filter(User.email == test_email).first()
+        user_found = db.query(User).filter(USER_EMAIL_KEY == normalize_email(test_email)).first()
         
         if user_found:
             print(f"   ✅ Usuario encontrado: {user_found.name}")
@@ -75,7 +75,7 @@ def test_user_queries():
         ]
         
         for cred in test_credentials:
-            user = db.query(User).filter(User.email == cred["email"]).first()
+            user = db.query(User).filter(USER_EMAIL_KEY == normalize_email(cred["email"])).first()
             if user:
                 is_valid = verify_password(cred["password"], user.hashed_password)
                 status = "✅ VÁLIDA" if is_valid else "❌ INVÁLIDA"
@@ -133,7 +133,7 @@ def test_authentication_simulation():
             print(f"\n🔐 Intento de login: {attempt['email']}")
             
             # Buscar usuario
-            user = db.query(User).filter(User.email == attempt['email']).first()
+            user = db.query(User).filter(USER_EMAIL_KEY == normalize_email(attempt["email"])).first()
             
             if not user:
                 print(f"   ❌ Usuario no encontrado")